@@ -0,0 +1,324 @@
+from enum import Enum
+import numpy as np
+import scipy.sparse
+from .readBG import conserved_moieties
+
+"""
+=================
+Bond graph module
+=================
+The bgmodule module simulates a mass-action bond graph directly from its stoichiometry,
+without generating the CellML model (buildBG), analysing it and generating its python code.
+
+The bond graph is given by the forward and reverse stoichiometric matrices N_f and N_r
+(load_matrix), the reaction rate constants kappa and the thermodynamic constants K
+(kinetic2BGparams) and the initial molar quantities q_init of the species.
+The chemical potentials and the reaction fluxes are
+    mu = R*T*log(K*q)
+    v = kappa*(exp(N_f^T mu/RT) - exp(N_r^T mu/RT))
+and the species evolve as dq/dt = (N_r - N_f) v.
+All the reactions are evaluated at once using sparse matrix products.
+The conserved moieties (e.g., the pools of transporters) are detected from the left nullspace of N_r - N_f,
+and only the independent species are integrated; each dependent species is reconstructed as
+q_d = q_tot_d - sum_i L[i,d]*q_i, where the total q_tot_d of its moiety is computed at the first evaluation
+of the rates or variables from the initial states (including the modified initial states) and q_init of the dependent species.
+The reduction is enabled by reduce_moieties=True.
+
+The variables are named as in the model generated by to_cellmlV1_models,
+i.e., q_X, q_init_X, K_X, mu_X and v_X for a species X,
+kappa_Y, A_f_Y, A_r_Y and v_Y for a reaction Y, R, T and t, all in the component BG,
+and q_tot_X for the total of the moiety of a dependent species X.
+A BGModule object has the same interface as the python module generated by libCellML (version 0.5.0),
+so that it can be simulated by the solver and simulator modules in place of the generated module.
+
+The bgmodule module provides the following classes:
+    * VariableType - the types of the variables, as in the generated module.
+    * BGModule - a mass-action bond graph with the interface of a generated module.
+"""
+
+class VariableType(Enum):
+    VARIABLE_OF_INTEGRATION = 0
+    STATE = 1
+    CONSTANT = 2
+    COMPUTED_CONSTANT = 3
+    ALGEBRAIC = 4
+
+VARIABLE_TYPES = {VariableType.VARIABLE_OF_INTEGRATION: 'variable_of_integration',
+                  VariableType.STATE: 'state',
+                  VariableType.CONSTANT: 'constant',
+                  VariableType.COMPUTED_CONSTANT: 'computed_constant',
+                  VariableType.ALGEBRAIC: 'algebraic',
+                  }
+
+class BGModule:
+    """ A mass-action bond graph with the interface of the python module generated by libCellML.
+
+    The constants kappa, K, q_init, R and T are read from the variables array at each evaluation,
+    so that they can be modified as the constants of a generated module.
+    The totals of the conserved moieties are computed at the first evaluation of the rates or variables
+    after initialise_variables, when the states are the initial states including their modifications:
+    the states are written into the q_init slots of the independent species and q_tot = L^T q_init.
+    All the values are kept in the states and variables arrays, so that a BGModule object can be shared
+    by several simulations as a generated module.
+
+    Attributes
+    ----------
+    N_f : scipy.sparse.csr_matrix
+        The forward stoichiometric matrix, species x reactions.
+    N_r : scipy.sparse.csr_matrix
+        The reverse stoichiometric matrix, species x reactions.
+    N : scipy.sparse.csr_matrix
+        The stoichiometric matrix N_r - N_f.
+    L : numpy.ndarray
+        The conserved moieties as columns, see readBG.conserved_moieties.
+    independent : numpy.ndarray
+        The indices of the species that are states.
+    dependent : numpy.ndarray
+        The indices of the species reconstructed from the conserved moieties.
+    STATE_COUNT : int
+        The number of states, i.e., the number of independent species.
+    VARIABLE_COUNT : int
+        The number of variables.
+    VOI_INFO : dict
+        The information of the variable of integration.
+    STATE_INFO : list
+        The information of the states.
+    VARIABLE_INFO : list
+        The information of the variables.
+    """
+
+    def __init__(self, N_f, N_r, kappa, K, q_init, CompName=None, ReName=None, R=8.31, T=293, component='BG', reduce_moieties=False):
+        """
+        Parameters
+        ----------
+        N_f : numpy.ndarray or scipy.sparse matrix
+            The forward stoichiometric matrix, species x reactions.
+        N_r : numpy.ndarray or scipy.sparse matrix
+            The reverse stoichiometric matrix, species x reactions.
+        kappa : numpy.ndarray
+            The reaction rate constants, one per reaction.
+        K : numpy.ndarray
+            The thermodynamic constants, one per species.
+        q_init : numpy.ndarray
+            The initial molar quantities, one per species.
+        CompName : list, optional
+            The names of the species. Default is X0, X1, ...
+        ReName : list, optional
+            The names of the reactions. Default is R0, R1, ...
+        R : float, optional
+            The universal gas constant. Default is 8.31.
+        T : float, optional
+            The temperature. Default is 293.
+        component : str, optional
+            The name of the component of the variables. Default is 'BG'.
+        reduce_moieties : bool, optional
+            If True, the dependent species of the conserved moieties are not integrated.
+            Default is False.
+
+        Raises
+        ------
+        ValueError
+            If the sizes of the stoichiometric matrices and the parameters do not match.
+        """
+        self.N_f = scipy.sparse.csr_matrix(N_f, dtype=float)
+        self.N_r = scipy.sparse.csr_matrix(N_r, dtype=float)
+        if self.N_f.shape != self.N_r.shape:
+            raise ValueError('N_f and N_r must have the same shape.')
+        self.N = (self.N_r - self.N_f).tocsr()
+        n_species, n_reactions = self.N_f.shape
+        self.kappa = np.ravel(kappa).astype(float)
+        self.K = np.ravel(K).astype(float)
+        self.q_init = np.ravel(q_init).astype(float)
+        if len(self.kappa) != n_reactions:
+            raise ValueError('The number of kappa must be the number of reactions.')
+        if len(self.K) != n_species or len(self.q_init) != n_species:
+            raise ValueError('The number of K and q_init must be the number of species.')
+        self.R = R
+        self.T = T
+        CompName = list(CompName) if CompName is not None else ['X{}'.format(i) for i in range(n_species)]
+        ReName = list(ReName) if ReName is not None else ['R{}'.format(j) for j in range(n_reactions)]
+        if len(CompName) != n_species or len(ReName) != n_reactions:
+            raise ValueError('The names must match the shape of the stoichiometric matrices.')
+        # the nonzero entries of the transposed matrices, reactions x species, for the Jacobian
+        self._N_fT = self.N_f.T.tocoo()
+        self._N_rT = self.N_r.T.tocoo()
+        if reduce_moieties:
+            self.L, self.independent, self.dependent = conserved_moieties(self.N)
+        else:
+            self.L, self.independent, self.dependent = np.zeros((n_species,0)), np.arange(n_species), np.zeros(0,dtype=int)
+        # the derivatives of the species with respect to the states
+        dependent_rows = -self.L[self.independent,:].T
+        self._E = scipy.sparse.vstack([scipy.sparse.identity(len(self.independent)),
+                                       scipy.sparse.csr_matrix(dependent_rows)]).tocsr()[
+                                       np.argsort(np.concatenate([self.independent, self.dependent]))]
+        self._L_independent = scipy.sparse.csr_matrix(dependent_rows)
+
+        self.STATE_COUNT = len(self.independent)
+        self.VOI_INFO = {"name": "t", "units": "second", "component": component, "type": VariableType.VARIABLE_OF_INTEGRATION}
+        self.STATE_INFO = [{"name": "q_{}".format(name), "units": "fmol", "component": component, "type": VariableType.STATE}
+                           for name in np.array(CompName, dtype=object)[self.independent]]
+        self.VARIABLE_INFO = []
+        self._slices = {}
+        def add_variables(key, names, units, vtype):
+            start = len(self.VARIABLE_INFO)
+            self.VARIABLE_INFO += [{"name": name, "units": units, "component": component, "type": vtype} for name in names]
+            self._slices[key] = slice(start, len(self.VARIABLE_INFO))
+        add_variables('kappa', ['kappa_{}'.format(name) for name in ReName], 'fmol_per_s', VariableType.CONSTANT)
+        add_variables('K', ['K_{}'.format(name) for name in CompName], 'per_fmol', VariableType.CONSTANT)
+        add_variables('q_init', ['q_init_{}'.format(name) for name in CompName], 'fmol', VariableType.CONSTANT)
+        add_variables('R', ['R'], 'J_per_K_mol', VariableType.CONSTANT)
+        add_variables('T', ['T'], 'kelvin', VariableType.CONSTANT)
+        dependent_names = [CompName[d] for d in self.dependent]
+        add_variables('q_tot', ['q_tot_{}'.format(name) for name in dependent_names], 'fmol', VariableType.COMPUTED_CONSTANT)
+        add_variables('q_dependent', ['q_{}'.format(name) for name in dependent_names], 'fmol', VariableType.ALGEBRAIC)
+        add_variables('mu', ['mu_{}'.format(name) for name in CompName], 'J_per_mol', VariableType.ALGEBRAIC)
+        add_variables('v_species', ['v_{}'.format(name) for name in CompName], 'fmol_per_s', VariableType.ALGEBRAIC)
+        add_variables('A_f', ['A_f_{}'.format(name) for name in ReName], 'J_per_mol', VariableType.ALGEBRAIC)
+        add_variables('A_r', ['A_r_{}'.format(name) for name in ReName], 'J_per_mol', VariableType.ALGEBRAIC)
+        add_variables('v', ['v_{}'.format(name) for name in ReName], 'fmol_per_s', VariableType.ALGEBRAIC)
+        self.VARIABLE_COUNT = len(self.VARIABLE_INFO)
+
+    def create_states_array(self):
+        return np.full(self.STATE_COUNT, np.nan)
+
+    def create_variables_array(self):
+        return np.full(self.VARIABLE_COUNT, np.nan)
+
+    def initialise_variables(self, states, rates, variables):
+        variables[self._slices['kappa']] = self.kappa
+        variables[self._slices['K']] = self.K
+        variables[self._slices['q_init']] = self.q_init
+        variables[self._slices['R']] = self.R
+        variables[self._slices['T']] = self.T
+        states[:] = self.q_init[self.independent]
+        # the initial states may be modified after initialise_variables (see solver.initialize_module),
+        # hence the totals are computed from the states at the first evaluation, see _species
+        variables[self._slices['q_tot']] = np.nan
+
+    def compute_computed_constants(self, variables):
+        # the totals of the conserved moieties depend on the initial states, see _species
+        pass
+
+    def _species(self, states, variables):
+        # the molar quantities of all the species from the states
+        q_tot = variables[self._slices['q_tot']]
+        if np.isnan(q_tot).any():
+            # the first evaluation after initialise_variables, the states are the initial states
+            q_init = np.array(variables[self._slices['q_init']], dtype=float)
+            q_init[self.independent] = states
+            variables[self._slices['q_init']] = q_init
+            variables[self._slices['q_tot']] = self.L.T @ q_init
+        q = np.empty(self.N.shape[0])
+        q[self.independent] = states
+        q[self.dependent] = variables[self._slices['q_tot']] + self._L_independent @ np.asarray(states, dtype=float)
+        return q
+
+    def _log_activities(self, q, variables):
+        # log(K*q); log(0) = -inf gives a zero mass-action term,
+        # the products with the stoichiometric matrices only visit their nonzero entries
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(variables[self._slices['K']]*q)
+
+    def _fluxes(self, q, variables):
+        log_x = self._log_activities(q, variables)
+        log_f = self.N_f.T @ log_x
+        log_r = self.N_r.T @ log_x
+        v = variables[self._slices['kappa']]*(np.exp(log_f) - np.exp(log_r))
+        return log_x, log_f, log_r, v
+
+    def compute_rates(self, voi, states, rates, variables):
+        rates[:] = (self.N @ self._fluxes(self._species(states, variables), variables)[3])[self.independent]
+
+    def compute_variables(self, voi, states, rates, variables):
+        q = self._species(states, variables)
+        variables[self._slices['q_dependent']] = q[self.dependent]
+        log_x, log_f, log_r, v = self._fluxes(q, variables)
+        RT = variables[self._slices['R']][0]*variables[self._slices['T']][0]
+        variables[self._slices['mu']] = RT*log_x
+        variables[self._slices['A_f']] = RT*log_f
+        variables[self._slices['A_r']] = RT*log_r
+        variables[self._slices['v']] = v
+        variables[self._slices['v_species']] = self.N @ v
+
+    def _mass_action_derivatives(self, NT, x, K):
+        """ The derivatives of the mass-action terms prod_i x_i^NT[j,i] with respect to q_i,
+        for the nonzero entries of NT, reactions x species.
+        The product over the other species is evaluated without dividing by x_i,
+        so that the derivatives are exact when some of the species are zero.
+        """
+        j, i, n = NT.row, NT.col, NT.data
+        n_reactions = NT.shape[0]
+        positive = x[i] > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_x = np.where(positive, np.log(np.where(positive, x[i], 1.0)), 0.0)
+        # the sum of the logarithms of the nonzero factors and the number of zero factors of each reaction
+        log_sum = np.bincount(j, weights=n*log_x, minlength=n_reactions)
+        zeros = np.bincount(j, weights=(~positive).astype(float), minlength=n_reactions)
+        others = np.where(positive,
+                          np.where(zeros[j] == 0, np.exp(log_sum[j] - n*log_x), 0.0),
+                          np.where(zeros[j] == 1, np.exp(log_sum[j]), 0.0))
+        return others*n*K[i]*x[i]**(n - 1)
+
+    def compute_jacobian(self, voi, states, variables):
+        """ The Jacobian of the rates with respect to the states.
+
+        Parameters
+        ----------
+        voi : float
+            The current value of the variable of integration.
+        states : list
+            The current states.
+        variables : list
+            The current variables.
+
+        Returns
+        -------
+        numpy.ndarray
+            The Jacobian d(rates)/d(states), of shape (STATE_COUNT, STATE_COUNT).
+        """
+        K = variables[self._slices['K']]
+        kappa = variables[self._slices['kappa']]
+        x = K*self._species(states, variables)
+        d_f = self._mass_action_derivatives(self._N_fT, x, K)
+        d_r = self._mass_action_derivatives(self._N_rT, x, K)
+        shape = self._N_fT.shape
+        dv = scipy.sparse.coo_matrix((np.concatenate([d_f, -d_r]),
+                                      (np.concatenate([self._N_fT.row, self._N_rT.row]),
+                                       np.concatenate([self._N_fT.col, self._N_rT.col]))), shape=shape).tocsr()
+        dv = scipy.sparse.diags(kappa) @ dv
+        return (self.N[self.independent] @ dv @ self._E).toarray()
+
+    def get_observables(self, variables_info):
+        """ Get the observables information for the simulation
+        based on variables_info {id:{'component': , 'name': }}.
+
+        Parameters
+        ----------
+        variables_info : dict
+            The variables to be observed,
+            in the format of {id:{'component': , 'name': }}.
+
+        Raises
+        ------
+        ValueError
+            If a variable is not found in the bond graph.
+
+        Returns
+        -------
+        dict
+            The observables of the simulation,
+            in the format of {id:{'name': , 'component': , 'index': , 'type': }}.
+        """
+        indices = {(self.VOI_INFO['component'], self.VOI_INFO['name']): (0, self.VOI_INFO['type'])}
+        for info_list in (self.STATE_INFO, self.VARIABLE_INFO):
+            for index, info in enumerate(info_list):
+                indices.setdefault((info['component'], info['name']), (index, info['type']))
+        observables = {}
+        for key, variable_info in variables_info.items():
+            try:
+                index, vtype = indices[(variable_info['component'], variable_info['name'])]
+            except KeyError:
+                raise ValueError('Variable {} not found in component {}!'.format(variable_info['name'], variable_info['component']))
+            observables[key] = {'name': variable_info['name'], 'component': variable_info['component'],
+                                'index': index, 'type': VARIABLE_TYPES[vtype]}
+        return observables
@@ -1,18 +1,19 @@
 from .BG_components import e_components_units, biochem_components_units,m_components_units
-from .readBG import load_matrix,kinetic2BGparams
+from .readBG import load_matrix,kinetic2BGparams,conserved_moieties
 import pandas as pd
 import copy
 import numpy as np
+import scipy.sparse
 
 defUnit=["ampere","becquerel","candela","celsius","coulomb","dimensionless","farad","gram","gray","henry",
     "hertz","joule","katal","kelvin","kilogram","liter","litre","lumen","lux","meter","metre","mole",
     "newton","ohm","pascal","radian","second","siemens","sievert","steradian","tesla","volt","watt","weber"]
 params_common=['R','T','F']
-def buildBG(fmatrix,rmatrix,file_path='./'):
+def buildBG(fmatrix,rmatrix,file_path='./',reduce_moieties=False):
     e_components=e_components_units()['components']
     biochem_components=biochem_components_units()['components']
     m_components=m_components_units()['components']
-    CompName,CompType,ReName,ReType,N_f,N_r=load_matrix(file_path+fmatrix,file_path+rmatrix)
+    CompName,CompType,ReName,ReType,N_f,N_r=load_matrix(file_path+fmatrix,file_path+rmatrix,sparse=True)
     compNames=CompName+ReName
     compTypes=CompType+ReType
     n_zeros=len(CompName)
@@ -64,36 +65,125 @@ def buildBG(fmatrix,rmatrix,file_path='./'):
         else:
             print('The component type is not found in the e_components or biochem_components or m_components')
 
-    for j in range(len(ReName)):
+    # Only the nonzero entries of N_f and N_r contribute to the ports,
+    # visited by reaction and then by species as in the dense matrices
+    for j, i, n_f, n_r in _nonzero_entries(N_f,N_r):
         # The e_0 of the R component is the sum of the e_0 of each C component in the column of N_f[i,:]
         # The e_1 of the R component is the sum of the e_0 of each C component in the column of N_r[i,:]
         reIndex=ReName[j]
-        for i in range(len(CompName)):
-            compIndex=CompName[i]
-            # 0 node to 1 node on port 0; 
-            if N_f[i,j]!=0:
-                comp_dict[reIndex]['ports']['0']['in']+=[compIndex+f':{N_f[i,j]}']
-            # 0 node to 1 node on port 1; 
-            if N_r[i,j]!=0:
-                comp_dict[reIndex]['ports']['1']['in']+=[compIndex+f':{-N_r[i,j]}']
-            # 1 node to 0 node on port 0; 
-            if  'f_0' in comp_dict[compIndex]['vars'].keys() and comp_dict[compIndex]['vars']['f_0']['IOType']=='in':
-                if N_f[i,j]!=0:
-                    comp_dict[compIndex]['ports']['0']['in']+=[reIndex+f':{-N_f[i,j]}']
+        compIndex=CompName[i]
+        # 0 node to 1 node on port 0; 
+        if n_f!=0:
+            comp_dict[reIndex]['ports']['0']['in']+=[compIndex+f':{n_f}']
+        # 0 node to 1 node on port 1; 
+        if n_r!=0:
+            comp_dict[reIndex]['ports']['1']['in']+=[compIndex+f':{-n_r}']
+        # 1 node to 0 node on port 0; 
+        if  'f_0' in comp_dict[compIndex]['vars'].keys() and comp_dict[compIndex]['vars']['f_0']['IOType']=='in':
+            if n_f!=0:
+                comp_dict[compIndex]['ports']['0']['in']+=[reIndex+f':{-n_f}']
 
-                if N_r[i,j]!=0:
-                    comp_dict[compIndex]['ports']['0']['in']+=[reIndex+f':{N_r[i,j]}']
-            # 1 node to 0 node on port 1;
-            if 'f_1' in comp_dict[compIndex]['vars'].keys() and comp_dict[compIndex]['vars']['f_1']['IOType']=='in':
-                if N_f[i,j]!=0:
-                    comp_dict[compIndex]['ports']['1']['in']+=[reIndex+f':{-N_f[i,j]}']
+            if n_r!=0:
+                comp_dict[compIndex]['ports']['0']['in']+=[reIndex+f':{n_r}']
+        # 1 node to 0 node on port 1;
+        if 'f_1' in comp_dict[compIndex]['vars'].keys() and comp_dict[compIndex]['vars']['f_1']['IOType']=='in':
+            if n_f!=0:
+                comp_dict[compIndex]['ports']['1']['in']+=[reIndex+f':{-n_f}']
 
-                if N_r[i,j]!=0:
-                    comp_dict[compIndex]['ports']['1']['in']+=[reIndex+f':{N_r[i,j]}']
+            if n_r!=0:
+                comp_dict[compIndex]['ports']['1']['in']+=[reIndex+f':{n_r}']
 
     update_eqn(comp_dict)
+    if reduce_moieties:
+        eliminate_moieties(comp_dict,N_f,N_r,CompName)
     return comp_dict
 
+def _nonzero_entries(N_f,N_r):
+    """
+    Get the nonzero entries of the forward and reverse stoichiometric matrices
+
+    Parameters
+    ----------
+    N_f : numpy.ndarray or scipy.sparse matrix
+        The forward stoichiometric matrix
+    N_r : numpy.ndarray or scipy.sparse matrix
+        The reverse stoichiometric matrix
+
+    Returns
+    -------
+    list
+        A list of (j, i, N_f[i,j], N_r[i,j]) for the entries where N_f or N_r is nonzero,
+        sorted by the reaction index j and then the species index i
+    """
+    entries={}
+    for k, N in enumerate([N_f,N_r]):
+        N=scipy.sparse.coo_matrix(N)
+        for i, j, value in zip(N.row, N.col, N.data):
+            if value!=0:
+                entries.setdefault((int(j),int(i)),[0,0])[k]=int(value)
+    return [(j, i, n_f, n_r) for (j, i), (n_f, n_r) in sorted(entries.items())]
+
+def eliminate_moieties(comp_dict,N_f,N_r,CompName):
+    """
+    Eliminate the dependent states of the conserved moieties of the Ce components
+
+    The conserved moieties are detected from the rows of N_r - N_f of the Ce components.
+    The ODE of each dependent species d is replaced by the algebraic reconstruction
+    q_d = q_init_d + sum_i L[i,d]*(q_init_i - q_i) over the other species i of its moiety,
+    so that the model handed to the integrator has one state less per moiety.
+    The coefficients are written with repr, so that they are the exact values of L.
+    It is called by buildBG(..., reduce_moieties=True) after update_eqn.
+    The totals are given by the q_init parameters,
+    so the initial amounts of the species should be modified through q_init rather than the states.
+
+    Parameters
+    ----------
+    comp_dict : dict
+        The components returned by buildBG, modified in place
+    N_f : numpy.ndarray or scipy.sparse matrix
+        The forward stoichiometric matrix
+    N_r : numpy.ndarray or scipy.sparse matrix
+        The reverse stoichiometric matrix
+    CompName : list
+        The names of the species, in the order of the rows of N_f and N_r
+
+    Returns
+    -------
+    list
+        The names of the species that are no longer states
+    """
+    rows=[i for i, name in enumerate(CompName) if comp_dict[name]['type']=='Ce' and 'q_0' in comp_dict[name].get('state_vars',{})]
+    if not rows:
+        return []
+    N=scipy.sparse.csr_matrix(N_r)-scipy.sparse.csr_matrix(N_f)
+    L, independent, dependent = conserved_moieties(N[rows])
+    reduced=[]
+    for k, d in enumerate(dependent):
+        comp=comp_dict[CompName[rows[d]]]
+        q_symbol=comp['state_vars']['q_0']['symbol']
+        terms=[]
+        for i in independent:
+            if L[i,k]==0:
+                continue
+            other=comp_dict[CompName[rows[i]]]
+            difference=f"({other['params']['q_init']['symbol']} - {other['state_vars']['q_0']['symbol']})"
+            if L[i,k]==1:
+                terms+=[f"+{difference}"]
+            elif L[i,k]==-1:
+                terms+=[f"-{difference}"]
+            elif L[i,k]>0:
+                terms+=[f"+{float(L[i,k])!r}{{dimensionless}}*{difference}"]
+            else:
+                terms+=[f"-{float(-L[i,k])!r}{{dimensionless}}*{difference}"]
+        reconstruction=' '.join([comp['params']['q_init']['symbol']]+terms)
+        comp['constitutive_relations']=[relation for relation in comp['constitutive_relations'] if not relation.startswith(f"ode({q_symbol},")]
+        comp['constitutive_relations']+=[f"{q_symbol} = {reconstruction}"]
+        comp['vars']['q_0']=comp['state_vars'].pop('q_0')
+        if not comp['state_vars']:
+            comp.pop('state_vars')
+        reduced+=[CompName[rows[d]]]
+    return reduced
+
 def update_params(comp_dict,n_zeros, kappa, K, q_init_all, csv='params_BG.csv'):
     # assume that the kappa and K are in the same order as the components in the comp_dict
     # Create a pd frame with the columns: Parameter, Value, and Unit
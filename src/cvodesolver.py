@@ -0,0 +1,182 @@
+from sundials import cvode, cvode_ls, sundials_context, nvector_serial, sunmatrix_dense, sunlinsol_dense
+import numpy as np
+import functools
+from .solver import _update_rates, _append_current_results
+
+try:
+    from sundials import sunmatrix_band, sunlinsol_band
+except ImportError:
+    sunmatrix_band = None
+    sunlinsol_band = None
+
+"""
+============
+CVODE solver
+============
+The cvodesolver module integrates the ODEs of a python module generated from a CellML model
+using CVODE (SUNDIALS). The SUNDIALS bindings are the same as the ones used by the nlasolver module.
+The CVODE memory is created once per call and kept alive across all the output points,
+so that the step size and the order are not reset at each output point.
+
+The cvodesolver module provides the following functions:
+    * solve_cvode - CVODE solver.
+"""
+
+CVODE_STATS = {'number_of_steps': 'CVodeGetNumSteps',
+               'number_of_rhs_evaluations': 'CVodeGetNumRhsEvals',
+               'number_of_linear_solver_setups': 'CVodeGetNumLinSolvSetups',
+               'number_of_error_test_failures': 'CVodeGetNumErrTestFails',
+               'number_of_nonlinear_iterations': 'CVodeGetNumNonlinSolvIters',
+               'number_of_nonlinear_convergence_failures': 'CVodeGetNumNonlinSolvConvFails',
+               }
+
+# int rhs(realtype voi, N_Vector y, N_Vector yDot, void *userData)
+# {
+#     UserOdeData *realUserData = (UserOdeData *) userData;
+#
+#     realUserData->computeRates(voi, N_VGetArrayPointer_Serial(y), N_VGetArrayPointer_Serial(yDot), realUserData->data);
+#
+#     return 0;
+# }
+
+def rhs(_voi, _y, _ydot, _user_data):
+    y_ = nvector_serial.N_VConvertArray_Serial(_y)
+    ydot_ = nvector_serial.N_VConvertArray_Serial(_ydot)
+
+    try:
+        _user_data["rhs"](_voi, y_, ydot_)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return 1 # recoverable error, CVODE retries with a smaller step
+
+    nvector_serial.N_VUpdate_Serial(_ydot, ydot_)
+
+    return 0
+
+def solve_cvode(module, current_state, observables, output_times, integrator_parameters, external_module=None, stats=None):
+    """ CVODE solver.
+
+    Parameters
+    ----------
+    module : object
+        The module to solve.
+    current_state : tuple
+        The current state of the module.
+        The format is (voi, states, rates, variables, current_index, sed_results).
+    observables : dict
+        The dictionary of the observables.
+    output_times : list
+        The output time points, in increasing order.
+        The results at output_times[0] are saved at current_index,
+        the results at the following time points are saved at the following indices.
+    integrator_parameters : dict
+        The parameters of the integrator. The supported parameters are
+        'rtol', 'atol', 'method' ('BDF' or 'Adams'), 'nsteps', 'max_step', 'min_step', 'order',
+        'linear_solver' ('dense' or 'band'), 'upper_bandwidth' and 'lower_bandwidth'.
+    external_module : object, optional
+        The External_module_varies object instance for the model. Default is None.
+    stats : dict, optional
+        If given, the statistics of the integration are added to it, see CVODE_STATS.
+
+    Raises
+    ------
+    RuntimeError
+        If CVODE failed, a RuntimeError will be raised.
+    ValueError
+        If output_times is not valid or the integrator parameters are not supported.
+
+    Returns
+    -------
+    tuple
+        The current state of the module.
+        The format is (voi, states, rates, variables, current_index, sed_results).
+    """
+    voi, states, rates, variables, current_index, sed_results = current_state
+    output_times = np.asarray(output_times, dtype=float)
+    if output_times.ndim != 1 or len(output_times) == 0:
+        raise ValueError('output_times must be a non-empty 1D array.')
+    if voi > output_times[0]:
+        raise ValueError('The current value of the independent variable is greater than output_start_time.')
+    if np.any(np.diff(output_times) < 0):
+        raise ValueError('output_times must be in increasing order.')
+
+    result_index = [current_index]
+    def compute_rates(t, y, ydot):
+        external_variable = None
+        if external_module:
+            external_variable = functools.partial(external_module.external_variable_ode, result_index=result_index[0])
+            module.compute_rates(t, y, ydot, variables, external_variable)
+        else:
+            module.compute_rates(t, y, ydot, variables)
+
+    n = len(states)
+    context_ptr = sundials_context.SUNContext_Define()
+    sundials_context.SUNContext_Create(None, context_ptr)
+    context = sundials_context.SUNContext_Context(context_ptr)
+
+    # Create our CVODE solver.
+    method = integrator_parameters.get('method', 'BDF')
+    if method.upper() == 'BDF':
+        solver = cvode.CVodeCreate(cvode.CV_BDF, context)
+    elif method.upper() == 'ADAMS':
+        solver = cvode.CVodeCreate(cvode.CV_ADAMS, context)
+    else:
+        raise ValueError('The integration method {} is not supported by CVODE!'.format(method))
+
+    # Initialise our CVODE solver.
+    y = nvector_serial.N_VMake_Serial(n, np.array(states, dtype=float), context)
+    cvode.CVodeInit(solver, rhs, voi, y)
+
+    # Set our user data.
+    user_data = {"rhs": compute_rates}
+    cvode.CVodeSetUserData(solver, user_data)
+
+    # Set our tolerances and step controls.
+    cvode.CVodeSStolerances(solver, integrator_parameters.get('rtol', 1e-7), integrator_parameters.get('atol', 1e-7))
+    cvode.CVodeSetMaxNumSteps(solver, integrator_parameters.get('nsteps', 99999))
+    if 'max_step' in integrator_parameters:
+        cvode.CVodeSetMaxStep(solver, integrator_parameters['max_step'])
+    if 'min_step' in integrator_parameters:
+        cvode.CVodeSetMinStep(solver, integrator_parameters['min_step'])
+    if 'order' in integrator_parameters:
+        cvode.CVodeSetMaxOrd(solver, integrator_parameters['order'])
+
+    # Set our linear solver.
+    linear_solver = integrator_parameters.get('linear_solver', 'dense')
+    if linear_solver == 'dense':
+        matrix = sunmatrix_dense.SUNDenseMatrix(n, n, context)
+        linearSolver = sunlinsol_dense.SUNLinSol_Dense(y, matrix, context)
+    elif linear_solver == 'band':
+        if sunmatrix_band is None:
+            raise ValueError('The banded linear solver is not available in the SUNDIALS bindings!')
+        upper_bandwidth = integrator_parameters.get('upper_bandwidth', n-1)
+        lower_bandwidth = integrator_parameters.get('lower_bandwidth', n-1)
+        matrix = sunmatrix_band.SUNBandMatrix(n, upper_bandwidth, lower_bandwidth, context)
+        linearSolver = sunlinsol_band.SUNLinSol_Band(y, matrix, context)
+    else:
+        raise ValueError('The linear solver {} is not supported by CVODE!'.format(linear_solver))
+    cvode_ls.CVodeSetLinearSolver(solver, linearSolver, matrix)
+
+    # Integrate to each output point, keeping the CVODE memory alive.
+    t = voi
+    for i, output_time in enumerate(output_times):
+        if i > 0:
+            current_index = current_index + 1
+            result_index[0] = current_index
+        if output_time > t:
+            flag, t = cvode.CVode(solver, output_time, y, cvode.CV_NORMAL)
+            if flag < 0:
+                raise RuntimeError('CVODE failed with flag {} at t = {}.'.format(flag, t))
+        states = nvector_serial.N_VConvertArray_Serial(y)
+        external_variable = None
+        if external_module:
+            external_variable = functools.partial(external_module.external_variable_ode, result_index=current_index)
+        _update_rates(t, states, rates, variables, module, external_variable)
+        # save observables
+        _append_current_results(sed_results, current_index, observables, t, states, variables)
+
+    if stats is not None:
+        for key, getter in CVODE_STATS.items():
+            flag, value = getattr(cvode, getter)(solver)
+            stats[key] = stats.get(key, 0) + value
+
+    return (t, np.array(states), rates, variables, current_index, sed_results)
@@ -0,0 +1,132 @@
+import numpy as np
+import functools
+import inspect
+import re
+
+"""
+==========
+DAE system
+==========
+The daesystem module evaluates the residuals of the DAEs of a python module generated from a CellML model,
+as integrated by the idasolver module. It does not depend on the SUNDIALS bindings.
+
+The python module is assumed to be generated using libCellML (version 0.5.0),
+where each algebraic loop (non-linear system) is solved by a function find_root_N,
+which calls nla_solve on the function objective_function_N.
+The unknowns of the non-linear systems are integrated together with the states, i.e.,
+y = [states, unknowns] and the residuals are
+F(t, y, y') = [y'[states] - rates, objective_function_N(unknowns)].
+
+The daesystem module provides the following functions:
+    * get_nla_systems - get the unknowns of the non-linear systems of a module.
+"""
+
+def get_nla_systems(module):
+    """ Get the unknowns of the non-linear systems of a module.
+
+    Parameters
+    ----------
+    module : object
+        The module generated by libCellML.
+
+    Raises
+    ------
+    ValueError
+        If the source of the module is not available.
+
+    Returns
+    -------
+    dict
+        The indices of the unknowns in the variables array, in the format of {N: [index, ...]},
+        where N is the number of the non-linear system (find_root_N).
+        Only the systems solved by compute_rates or compute_variables are included,
+        the systems solved by compute_computed_constants are constant during the integration.
+    """
+    try:
+        source = inspect.getsource(module)
+    except (OSError, TypeError) as e:
+        raise ValueError('The source of the module is not available!') from e
+
+    functions = {match.group(1): match.group(2)
+                 for match in re.finditer(r'^def (\w+)\(.*?\):\n(.*?)(?=^\S|\Z)', source, re.MULTILINE | re.DOTALL)}
+    solved = set()
+    for name in ('compute_rates', 'compute_variables'):
+        solved.update(int(n) for n in re.findall(r'\bfind_root_(\d+)\(', functions.get(name, '')))
+    nla_systems = {}
+    for match in re.finditer(r'^def find_root_(\d+)\(.*?\):\n(.*?)(?=^\S|\Z)', source, re.MULTILINE | re.DOTALL):
+        if int(match.group(1)) not in solved:
+            continue
+        body = match.group(2).split('nla_solve')[0]
+        indices = [int(index) for _, index in re.findall(r'u\[(\d+)\] = variables\[(\d+)\]', body)]
+        nla_systems[int(match.group(1))] = indices
+    return nla_systems
+
+class _DaeResiduals:
+    """ Evaluate the residuals of the DAEs of a module,
+    replacing the functions find_root_N of the module by functions that evaluate
+    the residuals of the non-linear systems at the current unknowns.
+
+    Attributes
+    ----------
+    module : object
+        The module generated by libCellML.
+    nla_systems : dict
+        The indices of the unknowns in the variables array, in the format of {N: [index, ...]}
+    state_count : int
+        The number of states.
+    residuals : dict
+        The residuals of the non-linear systems at the last evaluation, in the format of {N: [value, ...]}
+    """
+
+    def __init__(self, module, nla_systems, state_count, rates, variables):
+        self.module = module
+        self.nla_systems = nla_systems
+        self.state_count = state_count
+        self.rates = rates
+        self.variables = variables
+        self.residuals = {}
+        self.external_variable = None
+        self._find_roots = {}
+
+    def __enter__(self):
+        for n in self.nla_systems:
+            self._find_roots[n] = getattr(self.module, 'find_root_{}'.format(n))
+            setattr(self.module, 'find_root_{}'.format(n), functools.partial(self._evaluate_nla_system, n))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for n, find_root in self._find_roots.items():
+            setattr(self.module, 'find_root_{}'.format(n), find_root)
+
+    def _evaluate_nla_system(self, n, voi, states, rates, variables):
+        u = [variables[index] for index in self.nla_systems[n]]
+        f = [np.nan]*len(u)
+        getattr(self.module, 'objective_function_{}'.format(n))(u, f, [voi, states, rates, variables])
+        self.residuals[n] = f
+
+    def set_unknowns(self, yy):
+        i = self.state_count
+        for n, indices in self.nla_systems.items():
+            for index in indices:
+                self.variables[index] = yy[i]
+                i = i + 1
+
+    def get_unknowns(self):
+        return [self.variables[index] for indices in self.nla_systems.values() for index in indices]
+
+    def compute(self, voi, yy, yp, rr):
+        states = yy[:self.state_count]
+        self.set_unknowns(yy)
+        if self.external_variable:
+            self.module.compute_rates(voi, states, self.rates, self.variables, self.external_variable)
+            self.module.compute_variables(voi, states, self.rates, self.variables, self.external_variable)
+        else:
+            self.module.compute_rates(voi, states, self.rates, self.variables)
+            self.module.compute_variables(voi, states, self.rates, self.variables)
+        for i in range(self.state_count):
+            rr[i] = yp[i] - self.rates[i]
+        i = self.state_count
+        for n in self.nla_systems:
+            for value in self.residuals[n]:
+                rr[i] = value
+                i = i + 1
@@ -0,0 +1,181 @@
+from sundials import ida, ida_ls, sundials_context, nvector_serial, sunmatrix_dense, sunlinsol_dense
+import numpy as np
+import functools
+from .solver import _append_current_results
+from .daesystem import get_nla_systems, _DaeResiduals
+
+"""
+==========
+IDA solver
+==========
+The idasolver module integrates the DAEs of a python module generated from a CellML model
+using IDA (SUNDIALS). The SUNDIALS bindings are the same as the ones used by the nlasolver module.
+
+The python module is assumed to be generated using libCellML (version 0.5.0),
+where each algebraic loop (non-linear system) is solved by a function find_root_N,
+which calls nla_solve on the function objective_function_N.
+Instead of solving the non-linear systems at each evaluation of the rates,
+the unknowns of the non-linear systems are integrated together with the states, i.e.,
+y = [states, unknowns] and the residuals are
+F(t, y, y') = [y'[states] - rates, objective_function_N(unknowns)].
+
+The residuals are evaluated by the daesystem module, which does not depend on the SUNDIALS bindings.
+
+The idasolver module provides the following functions:
+    * get_nla_systems - get the unknowns of the non-linear systems of a module (see daesystem).
+    * solve_ida - IDA solver.
+"""
+
+IDA_STATS = {'number_of_steps': 'IDAGetNumSteps',
+             'number_of_residual_evaluations': 'IDAGetNumResEvals',
+             'number_of_linear_solver_setups': 'IDAGetNumLinSolvSetups',
+             'number_of_error_test_failures': 'IDAGetNumErrTestFails',
+             'number_of_nonlinear_iterations': 'IDAGetNumNonlinSolvIters',
+             'number_of_nonlinear_convergence_failures': 'IDAGetNumNonlinSolvConvFails',
+             }
+
+# int residuals(realtype voi, N_Vector yy, N_Vector yp, N_Vector rr, void *userData)
+# {
+#     UserDaeData *realUserData = (UserDaeData *) userData;
+#
+#     realUserData->computeResiduals(voi, N_VGetArrayPointer_Serial(yy), N_VGetArrayPointer_Serial(yp),
+#                                    N_VGetArrayPointer_Serial(rr), realUserData->data);
+#
+#     return 0;
+# }
+
+def res(_voi, _yy, _yp, _rr, _user_data):
+    yy_ = nvector_serial.N_VConvertArray_Serial(_yy)
+    yp_ = nvector_serial.N_VConvertArray_Serial(_yp)
+    rr_ = nvector_serial.N_VConvertArray_Serial(_rr)
+
+    try:
+        _user_data["res"](_voi, yy_, yp_, rr_)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return 1 # recoverable error, IDA retries with a smaller step
+
+    nvector_serial.N_VUpdate_Serial(_rr, rr_)
+
+    return 0
+
+def solve_ida(module, current_state, observables, output_times, integrator_parameters, external_module=None, stats=None):
+    """ IDA solver.
+
+    Parameters
+    ----------
+    module : object
+        The module to solve.
+    current_state : tuple
+        The current state of the module.
+        The format is (voi, states, rates, variables, current_index, sed_results).
+    observables : dict
+        The dictionary of the observables.
+    output_times : list
+        The output time points, in increasing order.
+        The results at output_times[0] are saved at current_index,
+        the results at the following time points are saved at the following indices.
+    integrator_parameters : dict
+        The parameters of the integrator. The supported parameters are
+        'rtol', 'atol', 'nsteps', 'max_step', 'order'.
+    external_module : object, optional
+        The External_module_varies object instance for the model. Default is None.
+    stats : dict, optional
+        If given, the statistics of the integration are added to it, see IDA_STATS.
+
+    Raises
+    ------
+    RuntimeError
+        If IDA failed, a RuntimeError will be raised.
+    ValueError
+        If output_times is not valid or the non-linear systems of the module cannot be identified.
+
+    Returns
+    -------
+    tuple
+        The current state of the module.
+        The format is (voi, states, rates, variables, current_index, sed_results).
+    """
+    voi, states, rates, variables, current_index, sed_results = current_state
+    output_times = np.asarray(output_times, dtype=float)
+    if output_times.ndim != 1 or len(output_times) == 0:
+        raise ValueError('output_times must be a non-empty 1D array.')
+    if voi > output_times[0]:
+        raise ValueError('The current value of the independent variable is greater than output_start_time.')
+    if np.any(np.diff(output_times) < 0):
+        raise ValueError('output_times must be in increasing order.')
+
+    nla_systems = get_nla_systems(module)
+    state_count = len(states)
+    external_variable = None
+    if external_module:
+        external_variable = functools.partial(external_module.external_variable_ode, result_index=current_index)
+
+    # consistent initial conditions: solve the non-linear systems with the original find_root_N
+    if external_variable:
+        module.compute_rates(voi, states, rates, variables, external_variable)
+        module.compute_variables(voi, states, rates, variables, external_variable)
+    else:
+        module.compute_rates(voi, states, rates, variables)
+        module.compute_variables(voi, states, rates, variables)
+
+    with _DaeResiduals(module, nla_systems, state_count, rates, variables) as dae:
+        dae.external_variable = external_variable
+        unknowns = dae.get_unknowns()
+        n = state_count + len(unknowns)
+        yy_ = np.array(list(states) + unknowns, dtype=float)
+        yp_ = np.array(list(rates) + [0.0]*len(unknowns), dtype=float)
+        id_ = np.array([1.0]*state_count + [0.0]*len(unknowns)) # differential (1) or algebraic (0)
+
+        context_ptr = sundials_context.SUNContext_Define()
+        sundials_context.SUNContext_Create(None, context_ptr)
+        context = sundials_context.SUNContext_Context(context_ptr)
+
+        # Create and initialise our IDA solver.
+        solver = ida.IDACreate(context)
+        yy = nvector_serial.N_VMake_Serial(n, yy_, context)
+        yp = nvector_serial.N_VMake_Serial(n, yp_, context)
+        ida.IDAInit(solver, res, voi, yy, yp)
+
+        # Set our user data.
+        user_data = {"res": dae.compute}
+        ida.IDASetUserData(solver, user_data)
+
+        # Set our tolerances and step controls.
+        ida.IDASStolerances(solver, integrator_parameters.get('rtol', 1e-7), integrator_parameters.get('atol', 1e-7))
+        ida.IDASetMaxNumSteps(solver, integrator_parameters.get('nsteps', 99999))
+        if 'max_step' in integrator_parameters:
+            ida.IDASetMaxStep(solver, integrator_parameters['max_step'])
+        if 'order' in integrator_parameters:
+            ida.IDASetMaxOrd(solver, integrator_parameters['order'])
+        ids = nvector_serial.N_VMake_Serial(n, id_, context)
+        ida.IDASetId(solver, ids)
+
+        # Set our linear solver.
+        matrix = sunmatrix_dense.SUNDenseMatrix(n, n, context)
+        linearSolver = sunlinsol_dense.SUNLinSol_Dense(yy, matrix, context)
+        ida_ls.IDASetLinearSolver(solver, linearSolver, matrix)
+
+        # Integrate to each output point, keeping the IDA memory alive.
+        t = voi
+        for i, output_time in enumerate(output_times):
+            if i > 0:
+                current_index = current_index + 1
+                if external_module:
+                    dae.external_variable = functools.partial(external_module.external_variable_ode, result_index=current_index)
+            if output_time > t:
+                flag, t = ida.IDASolve(solver, output_time, yy, yp, ida.IDA_NORMAL)
+                if flag < 0:
+                    raise RuntimeError('IDA failed with flag {} at t = {}.'.format(flag, t))
+            yy_ = nvector_serial.N_VConvertArray_Serial(yy)
+            yp_ = nvector_serial.N_VConvertArray_Serial(yp)
+            dae.compute(t, yy_, yp_, [0.0]*n) # update the rates and variables at the current point
+            states = list(yy_[:state_count])
+            # save observables
+            _append_current_results(sed_results, current_index, observables, t, states, variables)
+
+        if stats is not None:
+            for key, getter in IDA_STATS.items():
+                flag, value = getattr(ida, getter)(solver)
+                stats[key] = stats.get(key, 0) + value
+
+    return (t, np.array(states), rates, variables, current_index, sed_results)
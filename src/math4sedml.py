@@ -1,4 +1,5 @@
 import evalidate
+import functools
 import math
 import mpmath
 import numpy
@@ -99,6 +100,82 @@ MATHEMATICAL_FUNCTIONS = {
     'piecewise': piecewise,
 }
 
+def log_vectorized(*args):
+    """ Evaluate a logarithm element-wise
+
+    Args:
+        *args (:obj:`list` of :obj:`numpy.ndarray`): values optional proceeded by a base; otherwise the logarithm
+            is calculated in base 10
+
+    Returns:
+        :obj:`numpy.ndarray`
+    """
+    value = args[-1]
+    if len(args) > 1:
+        return numpy.log(value) / numpy.log(args[0])
+
+    return numpy.log10(value)
+
+
+def piecewise_vectorized(*args):
+    """ Evaluate a MathML piecewise function element-wise
+
+    Args:
+        *args (:obj:`list` of :obj:`numpy.ndarray`): pairs of values and conditions followed by a default value
+
+    Returns:
+        :obj:`numpy.ndarray`
+    """
+    if len(args) % 2 == 0:
+        pieces = args
+        otherwise = math.nan
+
+    else:
+        pieces = args[0:-1]
+        otherwise = args[-1]
+
+    return numpy.select([numpy.asarray(condition, dtype=bool) for condition in pieces[1::2]], pieces[0::2], default=otherwise)
+
+
+VECTORIZED_MATHEMATICAL_FUNCTIONS = {
+    'root': lambda x, n: numpy.power(x, 1 / numpy.asarray(n, dtype=float)),
+    'abs': numpy.abs,
+    'exp': numpy.exp,
+    'ln': numpy.log,
+    'log': log_vectorized,
+    'floor': numpy.floor,
+    'ceiling': numpy.ceil,
+    'sin': numpy.sin,
+    'cos': numpy.cos,
+    'tan': numpy.tan,
+    'sec': lambda x: 1 / numpy.cos(x),
+    'csc': lambda x: 1 / numpy.sin(x),
+    'cot': lambda x: 1 / numpy.tan(x),
+    'sinh': numpy.sinh,
+    'cosh': numpy.cosh,
+    'tanh': numpy.tanh,
+    'sech': lambda x: 1 / numpy.cosh(x),
+    'csch': lambda x: 1 / numpy.sinh(x),
+    'coth': lambda x: 1 / numpy.tanh(x),
+    'arcsin': numpy.arcsin,
+    'arccos': numpy.arccos,
+    'arctan': numpy.arctan,
+    'arcsec': lambda x: numpy.arccos(1 / x),
+    'arccsc': lambda x: numpy.arcsin(1 / x),
+    'arccot': lambda x: numpy.arctan(1 / x),
+    'arcsinh': numpy.arcsinh,
+    'arccosh': numpy.arccosh,
+    'arctanh': numpy.arctanh,
+    'arcsech': lambda x: numpy.arccosh(1 / x),
+    'arccsch': lambda x: numpy.arcsinh(1 / x),
+    'arccoth': lambda x: numpy.arctanh(1 / x),
+    'piecewise': piecewise_vectorized,
+}
+""" Element-wise equivalents of :obj:`MATHEMATICAL_FUNCTIONS`; 
+aggregate functions, ``factorial`` and random number generators are not included since 
+they cannot be evaluated element-wise.
+"""
+
 RESERVED_MATHEMATICAL_SYMBOLS = {
     'true': True,
     'false': False,
@@ -143,6 +220,7 @@ VALID_MATH_EXPRESSION_NODES = [
 ]
 
 
+@functools.lru_cache(maxsize=None)
 def compile_math(math):
     """ Compile a mathematical expression
 
@@ -196,3 +274,32 @@ def eval_math(math, compiled_math, workspace):
 
 
     
+
+
+def eval_math_vectorized(math, compiled_math, workspace):
+    """ Evaluate a mathematical expression element-wise over arrays of values
+
+    Args:
+        math (:obj:`str`): mathematical expression
+        compiled_math (:obj:`_ast.Expression`): compiled expression
+        workspace (:obj:`dict`): values (scalars or :obj:`numpy.ndarray`) to use for the symbols in the expression
+
+    Returns:
+        :obj:`numpy.ndarray`: result of the expression
+
+    Raises:
+        :obj:`ValueError`: if the expression could not be evaluated element-wise, e.g., because
+            it uses an aggregate function or a boolean operator (``and``, ``or``, ``not``)
+    """
+    invalid_symbols = set(RESERVED_MATHEMATICAL_SYMBOLS.keys()).intersection(set(workspace.keys()))
+    if invalid_symbols:
+        raise ValueError('Variables for mathematical expressions cannot have ids equal to the following reserved symbols:\n  - {}'.format(
+            '\n  - '.join('`' + symbol + '`' for symbol in sorted(invalid_symbols))))
+
+    try:
+        with numpy.errstate(all='ignore'):
+            # no built-ins, so that e.g. `sum` or `max` is not evaluated as a reduction of the arrays
+            return numpy.asarray(eval(compiled_math, dict(VECTORIZED_MATHEMATICAL_FUNCTIONS, __builtins__={}),
+                                      dict(**RESERVED_MATHEMATICAL_SYMBOLS, **workspace)))
+    except Exception as exception:
+        raise ValueError('Expression `{}` could not be evaluated element-wise:\n\n  {}'.format(math, str(exception)))
@@ -0,0 +1,751 @@
+from .simulator import SCIPY_SOLVERS, SUNDIALS_SOLVERS
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy
+import copy
+import math
+import json
+import time
+from collections import OrderedDict
+
+"""
+==========
+Objectives
+==========
+The objectives module provides the layers wrapped around the objective function of a parameter estimation task
+(see sedTasker.exec_parameterEstimationTask): the concurrent evaluation of the fit experiments, 
+the trace of the simulations, the best-so-far bound, the checkpoint, the cache and the tolerance schedule.
+Each layer is called as the objective function it wraps, function(param_vals, external_variables_values, *args).
+
+The objectives module provides the following functions:
+    * load_evaluation_trace - load a trace saved by a parameter estimation task.
+"""
+
+class CostLowerBound(float):
+    """ The value returned by the objective function (see sedTasker.objective_function) when the evaluation was stopped 
+    because the accumulated cost exceeded the bound.
+    The value is the accumulated cost, which is a lower bound of the cost since the costs are non-negative.
+    """
+    is_lower_bound=True
+
+class _BoundedObjective:
+    """ Evaluate an objective function accepting a bound (see sedTasker.objective_function) with the bound set to the best complete cost found so far times a slack factor,
+    so that the candidates which are clearly worse than the best one are not simulated to completion.
+    A stopped evaluation is returned as inf, since its CostLowerBound understates the cost;
+    the bound is therefore only used by the optimisers that compare the costs for selection.
+
+    Attributes
+    ----------
+    function: callable
+        The objective function, called as function(param_vals, external_variables_values, *args, bound=bound).
+    slack: float
+        The bound is slack times the best cost found so far.
+    best: float
+        The best complete cost found so far.
+    number_of_aborted_evaluations: int
+        The number of evaluations stopped by the bound.
+    """
+
+    def __init__(self, function, slack=2.0):
+        self.function=function
+        self.slack=slack
+        self.best=math.inf
+        self.number_of_aborted_evaluations=0
+
+    def __call__(self, param_vals, external_variables_values, *args):
+        bound=None if math.isinf(self.best) or math.isinf(self.slack) else self.best*self.slack
+        value=self.function(param_vals, external_variables_values, *args, bound=bound)
+        if isinstance(value, CostLowerBound):
+            # the lower bound understates the cost, the optimiser only learns that the candidate lost
+            self.number_of_aborted_evaluations+=1
+            return math.inf
+        if value<self.best:
+            self.best=value
+        return value
+
+def _get_bounded_objective(function, slack=None):
+    """ Get the objective function, evaluated with the best-so-far bound if slack is given.
+
+    Parameters
+    ----------
+    function: callable
+        The objective function accepting a bound, see sedTasker.objective_function.
+    slack: float, optional
+        The bound is slack times the best cost found so far. Default: None, no bound is used.
+
+    Returns
+    -------
+    callable
+        The objective function, or an instance of _BoundedObjective if slack is given.
+    """
+    if slack is None:
+        return function
+    return _BoundedObjective(function, slack)
+
+def _get_cached_objective(function, maxsize=None):
+    """ Put a least recently used cache in front of an objective function.
+
+    Parameters
+    ----------
+    function: callable
+        The objective function, called as function(param_vals, external_variables_values, *args).
+    maxsize: int, optional
+        The maximum number of cached values. Default: None, no cache is used.
+
+    Returns
+    -------
+    callable
+        The objective function, or an instance of _ObjectiveCache if maxsize is given.
+    """
+    if not maxsize:
+        return function
+    return _ObjectiveCache(function, maxsize)
+
+class _ObjectiveCache:
+    """ A bounded least recently used cache in front of an objective function.
+    The values are keyed by the exact bytes of the parameter vector and of the values of the
+    external variables, so the finite difference steps of the local optimisers are not answered
+    from the cache.
+
+    Attributes
+    ----------
+    function: callable
+        The objective function, called as function(param_vals, external_variables_values, *args).
+    maxsize: int
+        The maximum number of cached values.
+    hits: int
+        The number of calls answered by the cache.
+    misses: int
+        The number of calls evaluating the objective function.
+    """
+
+    def __init__(self, function, maxsize=128):
+        self.function=function
+        self.maxsize=maxsize
+        self.hits=0
+        self.misses=0
+        self._values=OrderedDict()
+
+    def _key(self, param_vals, external_variables_values):
+        params=numpy.asarray(param_vals, dtype=float).tobytes()
+        externals=tuple(numpy.asarray(value, dtype=float).tobytes() for value in external_variables_values)
+        return params, externals
+
+    def __call__(self, param_vals, external_variables_values, *args):
+        key=self._key(param_vals, external_variables_values)
+        if key in self._values:
+            self.hits+=1
+            self._values.move_to_end(key)
+            return self._values[key]
+        self.misses+=1
+        value=self.function(param_vals, external_variables_values, *args)
+        self._values[key]=value
+        if len(self._values)>self.maxsize:
+            self._values.popitem(last=False)
+        return value
+
+    def clear(self):
+        """ Remove the cached values, e.g., when the tolerances of the integrators are changed. """
+        self._values.clear()
+
+    def info(self):
+        """ The statistics of the cache.
+
+        Returns
+        -------
+        dict
+            {'hits': int, 'misses': int, 'maxsize': int, 'currsize': int}
+        """
+        return {'hits':self.hits,'misses':self.misses,'maxsize':self.maxsize,'currsize':len(self._values)}
+
+class _ParallelObjective:
+    """ Evaluate the fit experiments concurrently and combine their results.
+    With a process pool, each worker process has its own copies of the fit experiments (see _init_fit_experiment_worker);
+    with a thread pool, the fit experiments are shared, which is safe since the generated modules do not keep a state
+    (except when solved by IDA, see _shares_module_with_ida).
+    The functions evaluating the fit experiments are the ones of sedTasker, see sedTasker._get_parallel_objective.
+
+    Attributes
+    ----------
+    kind: str
+        'cost', 'residuals' or 'sensitivity', see _evaluate_fit_experiment.
+    executor: :obj:`concurrent.futures.Executor`
+        The executor returned by _get_fit_experiment_executor.
+    evaluate: callable
+        Evaluates one fit experiment in a thread, see _evaluate_fit_experiment.
+    evaluate_worker: callable
+        Evaluates one fit experiment in a worker process, see _evaluate_fit_experiment_worker.
+    combine: callable
+        Combines the results of the fit experiments, see _combine_fit_experiment_results.
+    """
+
+    def __init__(self, kind, executor, evaluate, evaluate_worker, combine):
+        self.kind=kind
+        self.executor=executor
+        self.evaluate=evaluate
+        self.evaluate_worker=evaluate_worker
+        self.combine=combine
+
+    def __call__(self, param_vals, external_variables_values, fitExperiments, doc, ss_time, cost_type=None, bound=None, experiment_costs=None):
+        # the bound is not used, since all the fit experiments are evaluated at the same time
+        if isinstance(self.executor, ProcessPoolExecutor):
+            # the integrator parameters are sent with the parameters, since they may be changed by _ToleranceSchedule
+            futures=[self.executor.submit(self.evaluate_worker, 
+                                          (self.kind, list(param_vals), external_variables_values, fitid, ss_time, cost_type,
+                                           fitExperiment['sim_setting'].integrator_parameters))
+                     for fitid,fitExperiment in fitExperiments.items()]
+        else:
+            futures=[self.executor.submit(self.evaluate, self.kind, param_vals, external_variables_values, 
+                                          fitid, fitExperiment, doc, ss_time, cost_type)
+                     for fitid,fitExperiment in fitExperiments.items()]
+        results=[future.result() for future in futures]
+        return self.combine(self.kind, results, fitExperiments, len(param_vals), experiment_costs)
+
+def _get_checkpointed_objective(function, checkpoint=None):
+    """ Record the evaluations of an objective function in a checkpoint.
+
+    Parameters
+    ----------
+    function: callable
+        The objective function.
+    checkpoint: :obj:`_Checkpoint`, optional
+        The checkpoint. Default: None
+
+    Returns
+    -------
+    callable
+        The objective function, or the checkpoint wrapping it if checkpoint is given.
+    """
+    if checkpoint is None:
+        return function
+    return checkpoint.wrap(function)
+
+class _Checkpoint:
+    """ Record the evaluations of the objective function of a parameter estimation task
+    and save them periodically to a npz file, together with the best point, 
+    the chains of the sampling algorithms and the initial state of the random number generator.
+    Only the parameter values and the cost of each evaluation are kept, 
+    the residuals and the Jacobians returned to least_squares are not.
+
+    The optimisation is resumed by restarting the optimiser with the saved initial state of the random number generator:
+    the costs recorded in the checkpoint are replayed without simulating, 
+    so that the optimiser follows the same path until the point of interruption and then continues,
+    e.g., the population of the evolutionary algorithm is rebuilt by replaying its evaluations.
+    If the optimiser proposes a point which is not recorded (e.g., the surrogate-based optimization algorithm
+    is not reproducible bitwise), the point is simulated and the remaining recorded evaluations are used only if proposed again.
+    The evaluations of least_squares cannot be replayed from their costs, 
+    the local optimization algorithms are restarted from the best point instead (see replayable).
+    The starts of the multi-start local optimization algorithm run in worker processes are not recorded.
+
+    Attributes
+    ----------
+    path: str
+        The path of the checkpoint file.
+    method: str
+        The optimisation method.
+    function: callable
+        The objective function, see wrap.
+    interval: float
+        The minimum time in seconds between two checkpoints.
+    replayable: bool
+        False if an evaluation returned the residuals, which are not recorded.
+    best_x: numpy.ndarray
+        The parameter values of the best evaluation, None if no evaluation is recorded.
+    number_of_replayed_evaluations: int
+        The number of evaluations replayed from the checkpoint.
+    """
+
+    def __init__(self, path, method, rng, interval=60, resume=False):
+        self.path=path
+        self.method=method
+        self.function=None
+        self.interval=interval
+        self.x=[]
+        self.costs=[]
+        self.replayable=True
+        self.best_x=None
+        self.best_cost=math.inf
+        self.chain=[]
+        self.chain_log_probability=[]
+        self.number_of_replayed_evaluations=0
+        self._replay={}
+        if resume and os.path.isfile(path):
+            self._load(rng)
+        self.rng_state=copy.deepcopy(rng.bit_generator.state)
+        self._last_save=time.time()
+
+    def wrap(self, function):
+        """ Record the evaluations of function.
+
+        Parameters
+        ----------
+        function: callable
+            The objective function.
+
+        Returns
+        -------
+        :obj:`_Checkpoint`
+            The checkpoint, which is called as the objective function.
+        """
+        self.function=function
+        return self
+
+    def __call__(self, param_vals, *args, **kwargs):
+        key=numpy.asarray(param_vals, dtype=float).tobytes()
+        if self._replay.get(key):
+            value=self._replay[key].pop(0)
+            self.number_of_replayed_evaluations+=1
+        else:
+            value=self.function(param_vals, *args, **kwargs)
+        self._record(param_vals, value)
+        return value
+
+    def wrap_map(self, map_function):
+        """ Record the evaluations of a function evaluating a list of points, see surrogate_minimize.
+
+        Parameters
+        ----------
+        map_function: callable
+            Evaluates a list of points and returns the list of the values.
+
+        Returns
+        -------
+        callable
+            The function evaluating a list of points, replaying the evaluations recorded in the checkpoint.
+        """
+        def recorded_map_function(points):
+            values=[None]*len(points)
+            new_points=[]
+            for i, point in enumerate(points):
+                key=numpy.asarray(point, dtype=float).tobytes()
+                if self._replay.get(key):
+                    values[i]=self._replay[key].pop(0)
+                    self.number_of_replayed_evaluations+=1
+                else:
+                    new_points.append(i)
+            for i, value in zip(new_points, map_function([points[i] for i in new_points])):
+                values[i]=value
+            for point, value in zip(points, values):
+                self._record(point, value)
+            return values
+        return recorded_map_function
+
+    def sample_callback(self, i, positions, log_probabilities):
+        """ Record the samples of the walkers, called by ensemble_sample and adaptive_metropolis after each sample.
+
+        Parameters
+        ----------
+        i: int
+            The index of the sample.
+        positions: numpy.ndarray
+            The positions of the walkers, the shape is (number of walkers, number of parameters).
+        log_probabilities: numpy.ndarray
+            The log probabilities of the walkers.
+        """
+        self.chain.append(positions)
+        self.chain_log_probability.append(log_probabilities)
+
+    def _record(self, param_vals, value):
+        if isinstance(value, tuple): # the residuals and their Jacobian
+            cost=float(numpy.sum(value[0]**2))
+            self.replayable=False
+        elif numpy.ndim(value)>0: # the residuals
+            cost=float(numpy.sum(numpy.asarray(value)**2))
+            self.replayable=False
+        else:
+            cost=float(value)
+        self.x.append(numpy.array(param_vals, dtype=float))
+        self.costs.append(cost)
+        if cost<self.best_cost:
+            self.best_cost=cost
+            self.best_x=self.x[-1]
+        if time.time()-self._last_save>self.interval:
+            self.save()
+
+    def save(self):
+        """ Save the checkpoint. The file is replaced atomically. """
+        data={'method':self.method,'rng_state':json.dumps(self.rng_state),'replayable':self.replayable,
+              'x':numpy.array(self.x),'cost':numpy.array(self.costs),
+              'best_x':numpy.array(self.best_x if self.best_x is not None else []),'best_cost':self.best_cost}
+        if self.chain:
+            data['chain']=numpy.array(self.chain)
+            data['chain_log_probability']=numpy.array(self.chain_log_probability)
+        temp_path=self.path+'.tmp.npz'
+        numpy.savez(temp_path, **data)
+        os.replace(temp_path, self.path)
+        self._last_save=time.time()
+
+    def _load(self, rng):
+        with numpy.load(self.path) as data:
+            if str(data['method'])!=self.method:
+                raise RuntimeError('The checkpoint {} was saved by the optimisation method {}!'.format(self.path, str(data['method'])))
+            rng.bit_generator.state=json.loads(str(data['rng_state']))
+            self.replayable=bool(data['replayable'])
+            if len(data['best_x'])>0:
+                self.best_x=data['best_x']
+                self.best_cost=float(data['best_cost'])
+            x=data['x']
+            costs=data['cost']
+        if self.replayable:
+            for i in range(len(x)):
+                self._replay.setdefault(x[i].tobytes(), []).append(float(costs[i]))
+            print('Resuming from the checkpoint {} with {} recorded evaluations.'.format(self.path, len(x)))
+        else:
+            print('Resuming from the best point of the checkpoint {}.'.format(self.path))
+
+def _get_traced_objective(function, trace=None):
+    """ Record the simulations of an objective function in a trace.
+
+    Parameters
+    ----------
+    function: callable
+        The objective function accepting experiment_costs, see objective_function.
+    trace: :obj:`_EvaluationTrace`, optional
+        The trace. Default: None
+
+    Returns
+    -------
+    callable
+        The objective function, or the trace wrapping it if trace is given.
+    """
+    if trace is None:
+        return function
+    return trace.wrap(function)
+
+class _EvaluationTrace:
+    """ A ring buffer recording the simulations of the fit experiments of a parameter estimation task:
+    the parameter values, the cost, the cost of each fit experiment, the wall time and the status of each evaluation.
+    The buffer is preallocated, so that recording an evaluation only copies a few numbers,
+    and it is saved to a npz file every flush_interval seconds and at the end of the optimisation.
+    When the buffer is full, the oldest evaluations are overwritten.
+
+    The evaluations replayed from a checkpoint or found in the objective cache are not recorded,
+    nor are the evaluations of the starts of the multi-start local optimization algorithm run in worker processes.
+
+    Attributes
+    ----------
+    path: str
+        The path of the trace file.
+    function: callable
+        The objective function, see wrap.
+    capacity: int
+        The maximum number of evaluations kept.
+    flush_interval: float
+        The minimum time in seconds between two saves.
+    number_of_evaluations: int
+        The number of evaluations recorded, including the overwritten ones.
+    """
+    # the status of an evaluation
+    SUCCESS=0
+    FAILED=1 # a simulation failed and the cost is 1e12
+    ABORTED=2 # stopped by the bound, the cost is a lower bound
+
+    def __init__(self, path, parameter_names, experiment_ids, capacity=100000, flush_interval=60):
+        self.path=path
+        self.function=None
+        self.parameter_names=parameter_names
+        self.experiment_ids=experiment_ids
+        self.capacity=capacity
+        self.flush_interval=flush_interval
+        self.number_of_evaluations=0
+        self.x=numpy.full((capacity, len(parameter_names)), numpy.nan)
+        self.cost=numpy.full(capacity, numpy.nan)
+        self.experiment_costs=numpy.full((capacity, len(experiment_ids)), numpy.nan)
+        self.wall_time=numpy.full(capacity, numpy.nan)
+        self.status=numpy.zeros(capacity, dtype=numpy.int8)
+        self.evaluation=numpy.full(capacity, -1, dtype=numpy.int64)
+        self._last_save=time.time()
+
+    def wrap(self, function):
+        """ Record the evaluations of function.
+
+        Parameters
+        ----------
+        function: callable
+            The objective function accepting experiment_costs, see objective_function.
+
+        Returns
+        -------
+        :obj:`_EvaluationTrace`
+            The trace, which is called as the objective function.
+        """
+        self.function=function
+        return self
+
+    def __call__(self, param_vals, *args, **kwargs):
+        experiment_costs=[]
+        start=time.perf_counter()
+        value=self.function(param_vals, *args, experiment_costs=experiment_costs, **kwargs)
+        self.record(param_vals, value, experiment_costs, time.perf_counter()-start)
+        return value
+
+    def record(self, param_vals, value, experiment_costs, wall_time):
+        """ Record an evaluation.
+
+        Parameters
+        ----------
+        param_vals: list
+            The values of the adjustable parameters.
+        value: float, numpy.ndarray or tuple
+            The value of the objective function, the residuals or the residuals and their Jacobian.
+        experiment_costs: list
+            The costs of the fit experiments evaluated, in the order of the fit experiments.
+        wall_time: float
+            The wall time of the evaluation in seconds.
+        """
+        i=self.number_of_evaluations%self.capacity
+        if isinstance(value, tuple):
+            value=value[0]
+        cost=float(value) if numpy.ndim(value)==0 else float(numpy.sum(numpy.square(value)))
+        self.x[i]=param_vals
+        self.cost[i]=cost
+        self.experiment_costs[i]=numpy.nan
+        self.experiment_costs[i,:len(experiment_costs)]=experiment_costs
+        self.wall_time[i]=wall_time
+        if isinstance(value, CostLowerBound):
+            self.status[i]=self.ABORTED
+        elif cost>=1e12 or any(math.isnan(experiment_cost) for experiment_cost in experiment_costs):
+            self.status[i]=self.FAILED
+        else:
+            self.status[i]=self.SUCCESS
+        self.evaluation[i]=self.number_of_evaluations
+        self.number_of_evaluations+=1
+        if time.time()-self._last_save>self.flush_interval:
+            self.save()
+
+    def save(self):
+        """ Save the recorded evaluations. The file is replaced atomically. """
+        n=min(self.number_of_evaluations, self.capacity)
+        temp_path=self.path+'.tmp.npz'
+        numpy.savez(temp_path, parameter_names=numpy.array(self.parameter_names), experiment_ids=numpy.array(self.experiment_ids),
+                    x=self.x[:n], cost=self.cost[:n], experiment_costs=self.experiment_costs[:n], 
+                    wall_time=self.wall_time[:n], status=self.status[:n], evaluation=self.evaluation[:n])
+        os.replace(temp_path, self.path)
+        self._last_save=time.time()
+
+def load_evaluation_trace(path):
+    """ Load a trace saved by a parameter estimation task, see exec_parameterEstimationTask.
+
+    Parameters
+    ----------
+    path: str
+        The path of the trace file.
+
+    Returns
+    -------
+    dict
+        The evaluations in chronological order, in the format of 
+        {'parameter_names': numpy.ndarray (component.name), 'experiment_ids': numpy.ndarray,
+        'x': numpy.ndarray (number of evaluations, number of parameters), 'cost': numpy.ndarray,
+        'experiment_costs': numpy.ndarray (number of evaluations, number of fit experiments),
+        'wall_time': numpy.ndarray, 'status': numpy.ndarray (0: success, 1: failed, 2: stopped by the bound),
+        'evaluation': numpy.ndarray (the index of the evaluation)}
+    """
+    with numpy.load(path) as data:
+        trace={key: data[key] for key in data.files}
+    order=numpy.argsort(trace['evaluation'])
+    for key in ['x','cost','experiment_costs','wall_time','status','evaluation']:
+        trace[key]=trace[key][order]
+    return trace
+
+def _get_scheduled_objective(function, schedule=None):
+    """ Evaluate an objective function with the tolerances of a schedule.
+
+    Parameters
+    ----------
+    function: callable
+        The objective function, see _get_objective.
+    schedule: :obj:`_ToleranceSchedule`, optional
+        The schedule. Default: None
+
+    Returns
+    -------
+    callable
+        The objective function, or the schedule wrapping it if schedule is given.
+    """
+    if schedule is None:
+        return function
+    return schedule.wrap(function)
+
+class _ToleranceSchedule:
+    """ Evaluate the objective function with loose tolerances first (multi-fidelity):
+    at level i, the relative and absolute tolerances of the integrators of the fit experiments 
+    are the tolerances of the task multiplied by factors[i] (the relative tolerance is at most 1e-3), 
+    and the last level is the tolerances of the task.
+    The tolerances of the solvers which are not in SCIPY_SOLVERS or SUNDIALS_SOLVERS are not changed.
+
+    The global optimisers go to the next level when the best cost has not improved by the relative improvement
+    for patience evaluations, and the best candidates are re-evaluated at the last level at the end, see finish.
+    The local optimization algorithm is run at each level in turn, see _least_squares.
+    The current tolerances are sent to the worker processes with each evaluation 
+    (see _ParallelObjective and _get_batch_objective), so that the costs of a level are computed at the same accuracy;
+    the starts of the multi-start local optimization algorithm run in worker processes use the tolerances of the task.
+
+    Attributes
+    ----------
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+    factors: list
+        The factors of the tolerances at each level, ending with 1.
+    patience: int
+        The number of evaluations without improvement before the next level.
+    improvement: float
+        The relative decrease of the best cost considered as an improvement.
+    number_of_candidates: int
+        The number of best candidates of the last level reached re-evaluated by finish.
+    level: int
+        The current level.
+    number_of_evaluations: list
+        The number of evaluations at each level.
+    """
+    # the default tolerances of the integrators
+    SCIPY_TOLERANCES={'rtol':1e-6,'atol':1e-12}
+    SUNDIALS_TOLERANCES={'rtol':1e-7,'atol':1e-7}
+    MAX_RTOL=1e-3
+
+    def __init__(self, fitExperiments, factors=(1e3,1e2,1e1), patience=100, improvement=1e-3, number_of_candidates=5):
+        self.fitExperiments=fitExperiments
+        self.factors=[float(factor) for factor in factors]
+        if not self.factors or self.factors[-1]!=1:
+            self.factors.append(1.0)
+        self.patience=patience
+        self.improvement=improvement
+        self.number_of_candidates=number_of_candidates
+        self.function=None
+        self.number_of_evaluations=[0]*len(self.factors)
+        self._base={fitid:dict(fitExperiment['sim_setting'].integrator_parameters) for fitid,fitExperiment in fitExperiments.items()}
+        self._best=math.inf
+        self._since_improvement=0
+        self._candidates=[] # the best (cost, param_vals) of the current level
+        self.set_level(0)
+
+    def set_level(self, level):
+        """ Set the tolerances of the integrators of the fit experiments to the ones of level.
+        The values cached by the objective function and the best cost of its bound are reset, 
+        since they were obtained with other tolerances.
+
+        Parameters
+        ----------
+        level: int
+            The level.
+        """
+        self.level=level
+        factor=self.factors[level]
+        for fitid,fitExperiment in self.fitExperiments.items():
+            sim_setting=fitExperiment['sim_setting']
+            integrator_parameters=dict(self._base[fitid])
+            if sim_setting.method in SCIPY_SOLVERS:
+                defaults=self.SCIPY_TOLERANCES
+            elif sim_setting.method in SUNDIALS_SOLVERS:
+                defaults=self.SUNDIALS_TOLERANCES
+            else:
+                defaults={}
+            for key, default in defaults.items():
+                tolerance=integrator_parameters.get(key, default)
+                if key=='rtol':
+                    integrator_parameters[key]=max(tolerance, min(tolerance*factor, self.MAX_RTOL))
+                else:
+                    integrator_parameters[key]=tolerance*factor
+            sim_setting.integrator_parameters=integrator_parameters
+        self._best=math.inf
+        self._since_improvement=0
+        self._candidates=[]
+        objective=self.function
+        while objective is not None:
+            if isinstance(objective,_ObjectiveCache):
+                objective.clear()
+            elif isinstance(objective,_BoundedObjective):
+                objective.best=math.inf
+            objective=getattr(objective,'function',None)
+
+    def restore(self):
+        """ Restore the integrator parameters of the task. """
+        for fitid,fitExperiment in self.fitExperiments.items():
+            fitExperiment['sim_setting'].integrator_parameters=dict(self._base[fitid])
+
+    def wrap(self, function):
+        """ Evaluate function with the tolerances of the schedule.
+
+        Parameters
+        ----------
+        function: callable
+            The objective function returning the cost, see _get_objective.
+
+        Returns
+        -------
+        :obj:`_ToleranceSchedule`
+            The schedule, which is called as the objective function.
+        """
+        self.function=function
+        return self
+
+    def __call__(self, param_vals, *args):
+        value=self.function(param_vals, *args)
+        self._update(param_vals, value)
+        return value
+
+    def wrap_map(self, map_function):
+        """ Follow the schedule with the evaluations of a function evaluating a list of points, see surrogate_minimize.
+        All the points of a list are evaluated at the current level, 
+        the map_function must send the current integrator parameters to the workers (see _get_batch_objective).
+
+        Parameters
+        ----------
+        map_function: callable
+            Evaluates a list of points and returns the list of the values.
+
+        Returns
+        -------
+        callable
+            The function evaluating a list of points.
+        """
+        def scheduled_map_function(points):
+            values=map_function(points)
+            for point, value in zip(points, values):
+                self._update(point, value)
+            return values
+        return scheduled_map_function
+
+    def _update(self, param_vals, value):
+        self.number_of_evaluations[self.level]+=1
+        if math.isinf(value):
+            # stopped by the bound, see _BoundedObjective
+            self._since_improvement+=1
+        else:
+            self._candidates.append((float(value), numpy.array(param_vals, dtype=float)))
+            if len(self._candidates)>2*self.number_of_candidates:
+                self._candidates=sorted(self._candidates, key=lambda candidate: candidate[0])[:self.number_of_candidates]
+            if value<self._best*(1-self.improvement):
+                self._best=value
+                self._since_improvement=0
+            else:
+                self._since_improvement+=1
+        if self._since_improvement>=self.patience and self.level<len(self.factors)-1:
+            candidates=self._candidates
+            self.set_level(self.level+1)
+            # the best candidates of the previous level are kept for finish
+            self._candidates=candidates
+
+    def finish(self, res, args):
+        """ Re-evaluate the solution and the best candidates of the last level reached with the tolerances of the task,
+        and set res.x and res.fun to the best of them.
+
+        Parameters
+        ----------
+        res: :obj:`scipy.optimize.OptimizeResult`
+            The result of the optimiser.
+        args: tuple
+            The extra arguments of the objective function.
+        """
+        candidates=sorted(self._candidates, key=lambda candidate: candidate[0])[:self.number_of_candidates]
+        if self.level<len(self.factors)-1:
+            self.set_level(len(self.factors)-1)
+        best_x, best_cost=None, math.inf
+        for param_vals in [numpy.atleast_1d(numpy.asarray(res.x, dtype=float))]+[candidate[1] for candidate in candidates]:
+            cost=self.function(param_vals, *args)
+            self.number_of_evaluations[self.level]+=1
+            if cost<best_cost:
+                best_x, best_cost=param_vals, cost
+        if best_x is not None:
+            res.x=best_x
+            res.fun=best_cost
@@ -1,4 +1,9 @@
 
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize, OptimizeResult
+from scipy.stats import norm, qmc
+
 # https://docs.scipy.org/doc/scipy/reference/optimize.html
 SCIPY_OPTIMIZE_LOCAL = ['Nelder-Mead','Powell','CG','BFGS','Newton-CG','L-BFGS-B','TNC','COBYLA','SLSQP','trust-constr','dogleg','trust-ncg','trust-exact','trust-krylov']
 KISAO_ALGORITHMS = {'KISAO:0000514': 'Nelder-Mead',
@@ -7,7 +12,18 @@ KISAO_ALGORITHMS = {'KISAO:0000514': 'Nelder-Mead',
                     'KISAO:0000503': 'simulated annealing',	
                     'KISAO:0000520': 'evolutionary algorithm',
                     'KISAO:0000504': 'random search',
+                    'KISAO:0000473': 'ensemble sampler', # Bayesian inference algorithm, see ensemble_sample
+                    'KISAO:0000278': 'adaptive Metropolis', # Metropolis Monte Carlo algorithm, see adaptive_metropolis
                     }
+# The algorithms without a KiSAO term, selected by using the key below as the kisaoID of the algorithm
+NON_KISAO_ALGORITHMS = {'surrogate-based optimization algorithm': 'surrogate-based optimization algorithm', # see surrogate_minimize
+                        }
+# The algorithms sampling the posterior distribution of the parameters rather than minimising the cost
+SAMPLING_ALGORITHMS = ['ensemble sampler', 'adaptive Metropolis']
+# The local optimization algorithm with a number of runs (KISAO:0000498) greater than 1
+# is started from several points, see get_KISAO_parameters_opt
+MULTI_START_ALGORITHMS = {'KISAO:0000471': 'multi-start local optimization algorithm',
+                          }
 
 def get_KISAO_parameters_opt(algorithm):
     """Get the parameters of the KISAO algorithm.
@@ -16,6 +32,7 @@ def get_KISAO_parameters_opt(algorithm):
         the format is {'kisaoID': , 'name': 'optional,Euler forward method' , 
         'listOfAlgorithmParameters':[dict_algorithmParameter] }
         dict_algorithmParameter={'kisaoID':'KISAO:0000483','value':'0.001'}
+        The kisaoID can also be a key of NON_KISAO_ALGORITHMS, e.g., 'surrogate-based optimization algorithm'.
     Returns:
         :obj:`tuple`:
             * :obj:`str` or None: the method of the optimization algorithm
@@ -33,14 +50,367 @@ def get_KISAO_parameters_opt(algorithm):
                 opt_parameters['tol'] = float(p['value'])
 
         return method, opt_parameters
-    elif algorithm['kisaoID'] in KISAO_ALGORITHMS.keys():
-        method = KISAO_ALGORITHMS[algorithm['kisaoID']]
+    elif algorithm['kisaoID'] in KISAO_ALGORITHMS.keys() or algorithm['kisaoID'] in NON_KISAO_ALGORITHMS.keys():
+        method = KISAO_ALGORITHMS.get(algorithm['kisaoID'], NON_KISAO_ALGORITHMS.get(algorithm['kisaoID']))
         for p in algorithm['listOfAlgorithmParameters']:
             if p['kisaoID'] == 'KISAO:0000486':
                 opt_parameters['maxiter'] = float(p['value'])
             elif p['kisaoID'] == 'KISAO:0000597':
                 opt_parameters['tol'] = float(p['value'])
+            elif p['kisaoID'] == 'KISAO:0000498':
+                opt_parameters['number_of_runs'] = int(p['value'])
+            elif p['kisaoID'] == 'KISAO:0000488':
+                opt_parameters['seed'] = int(p['value'])
+            elif p['kisaoID'] == 'KISAO:0000326':
+                opt_parameters['number_of_samples'] = int(p['value'])
+            elif p['kisaoID'] == 'KISAO:0000519':
+                opt_parameters['population_size'] = int(p['value'])
+            elif p['kisaoID'] == 'KISAO:0000483':
+                opt_parameters['step_size'] = float(p['value'])
+        if algorithm['kisaoID'] in MULTI_START_ALGORITHMS and opt_parameters.get('number_of_runs', 1) > 1:
+            method = MULTI_START_ALGORITHMS[algorithm['kisaoID']]
         return method, opt_parameters
     else:
         print("The algorithm {} is not supported!".format(algorithm['kisaoID']))
         return None, opt_parameters
+
+def _to_unit(x, lower, upper, log_scale):
+    """Map points within the bounds to the unit hypercube.
+    Args:
+        x (:obj:`numpy.ndarray`): the points, the shape is (number of points, number of parameters)
+        lower (:obj:`numpy.ndarray`): the lower bounds
+        upper (:obj:`numpy.ndarray`): the upper bounds
+        log_scale (:obj:`numpy.ndarray`): whether each parameter is scaled logarithmically
+    Returns:
+        :obj:`numpy.ndarray`: the points in the unit hypercube
+    """
+    x = np.where(log_scale, np.log10(np.where(log_scale, x, 1)), x)
+    lower = np.where(log_scale, np.log10(np.where(log_scale, lower, 1)), lower)
+    upper = np.where(log_scale, np.log10(np.where(log_scale, upper, 1)), upper)
+    return (x - lower) / (upper - lower)
+
+def _from_unit(u, lower, upper, log_scale):
+    """Map points of the unit hypercube to the bounds, the inverse of _to_unit.
+    Args:
+        u (:obj:`numpy.ndarray`): the points in the unit hypercube
+        lower (:obj:`numpy.ndarray`): the lower bounds
+        upper (:obj:`numpy.ndarray`): the upper bounds
+        log_scale (:obj:`numpy.ndarray`): whether each parameter is scaled logarithmically
+    Returns:
+        :obj:`numpy.ndarray`: the points within the bounds
+    """
+    lower_ = np.where(log_scale, np.log10(np.where(log_scale, lower, 1)), lower)
+    upper_ = np.where(log_scale, np.log10(np.where(log_scale, upper, 1)), upper)
+    x = lower_ + np.clip(u, 0, 1) * (upper_ - lower_)
+    return np.clip(np.where(log_scale, 10**x, x), lower, upper)
+
+class GaussianProcess:
+    """A Gaussian process with a Matern 5/2 kernel with one length scale per parameter,
+    fitted by maximising the log marginal likelihood.
+    The inputs are expected in the unit hypercube and the outputs are standardised.
+    """
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.log_length_scales = None
+        self.log_noise = np.log(1e-6)
+
+    def _kernel(self, a, b, length_scales):
+        d = np.sqrt(np.sum(((a[:, None, :] - b[None, :, :]) / length_scales)**2, axis=-1)) * np.sqrt(5)
+        return (1 + d + d**2 / 3) * np.exp(-d)
+
+    def _negative_log_likelihood(self, theta, x, y):
+        length_scales = np.exp(theta[:-1])
+        noise = np.exp(theta[-1])
+        k = self._kernel(x, x, length_scales) + (noise + 1e-10) * np.eye(len(x))
+        try:
+            factor = cho_factor(k, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e10
+        alpha = cho_solve(factor, y)
+        return 0.5 * y.dot(alpha) + np.sum(np.log(np.diag(factor[0])))
+
+    def fit(self, x, y, optimise=True):
+        """Fit the Gaussian process.
+        Args:
+            x (:obj:`numpy.ndarray`): the inputs, the shape is (number of points, number of parameters)
+            y (:obj:`numpy.ndarray`): the outputs
+            optimise (:obj:`bool`): whether to optimise the hyperparameters, 
+                otherwise the previous hyperparameters are used
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y_mean = np.mean(y)
+        self.y_std = np.std(y) if np.std(y) > 0 else 1.0
+        self.y = (np.asarray(y, dtype=float) - self.y_mean) / self.y_std
+        n_params = self.x.shape[1]
+        if optimise or self.log_length_scales is None:
+            starts = [np.append(np.log(np.full(n_params, 0.3)), np.log(1e-4))]
+            if self.log_length_scales is not None:
+                starts.append(np.append(self.log_length_scales, self.log_noise))
+            starts.append(np.append(self.rng.uniform(np.log(0.05), np.log(2), n_params), np.log(1e-3)))
+            bounds = [(np.log(1e-3), np.log(1e2))] * n_params + [(np.log(1e-10), np.log(1e-1))]
+            best = None
+            for theta0 in starts:
+                result = minimize(self._negative_log_likelihood, theta0, args=(self.x, self.y), method='L-BFGS-B', bounds=bounds)
+                if best is None or result.fun < best.fun:
+                    best = result
+            self.log_length_scales = best.x[:-1]
+            self.log_noise = best.x[-1]
+        k = self._kernel(self.x, self.x, np.exp(self.log_length_scales)) + (np.exp(self.log_noise) + 1e-10) * np.eye(len(self.x))
+        self._factor = cho_factor(k, lower=True)
+        self._alpha = cho_solve(self._factor, self.y)
+
+    def predict(self, x):
+        """Predict the mean and the standard deviation of the outputs.
+        Args:
+            x (:obj:`numpy.ndarray`): the inputs, the shape is (number of points, number of parameters)
+        Returns:
+            :obj:`tuple`:
+                * :obj:`numpy.ndarray`: the mean
+                * :obj:`numpy.ndarray`: the standard deviation
+        """
+        k = self._kernel(np.atleast_2d(x), self.x, np.exp(self.log_length_scales))
+        mean = k.dot(self._alpha)
+        v = cho_solve(self._factor, k.T)
+        variance = np.maximum(1 - np.sum(k * v.T, axis=1), 1e-12)
+        return mean * self.y_std + self.y_mean, np.sqrt(variance) * self.y_std
+
+def expected_improvement(mean, std, best):
+    """The expected improvement below best of a Gaussian prediction.
+    Args:
+        mean (:obj:`numpy.ndarray`): the predicted mean
+        std (:obj:`numpy.ndarray`): the predicted standard deviation
+        best (:obj:`float`): the best output so far
+    Returns:
+        :obj:`numpy.ndarray`: the expected improvement
+    """
+    z = (best - mean) / std
+    return (best - mean) * norm.cdf(z) + std * norm.pdf(z)
+
+def surrogate_minimize(fun, bounds, args=(), x0=None, maxfev=100, n_initial=None, batch_size=1, seed=None, map_function=None):
+    """Minimise an expensive function with a Gaussian process surrogate and the expected improvement acquisition.
+    The function is modelled on a log scale, log(f + 1e-12), since costs span several orders of magnitude.
+    The parameters with positive bounds spanning more than three orders of magnitude are searched on a log scale.
+    Args:
+        fun (:obj:`callable`): the function to minimise, called as fun(x, *args)
+        bounds (:obj:`scipy.optimize.Bounds`): the bounds of the parameters, must be finite
+        args (:obj:`tuple`): the extra arguments of fun
+        x0 (:obj:`list`, optional): a point added to the initial design
+        maxfev (:obj:`int`): the maximum number of function evaluations
+        n_initial (:obj:`int`, optional): the number of points of the initial Latin hypercube design, 
+            default is max(2*(number of parameters)+1, batch_size)
+        batch_size (:obj:`int`): the number of points proposed at each iteration, 
+            selected with the kriging believer strategy so that they can be evaluated in parallel
+        seed (:obj:`int`, optional): the seed of the random number generator
+        map_function (:obj:`callable`, optional): evaluates a list of points, called as map_function(points),
+            and returns the list of function values; default evaluates the points in sequence
+    Raises:
+        ValueError: if the bounds are not finite
+    Returns:
+        :obj:`scipy.optimize.OptimizeResult`: the result, with the attributes x, fun, nfev, nit, success, message,
+            and x_iters and func_vals, all the evaluated points and their function values
+    """
+    lower = np.asarray(bounds.lb, dtype=float)
+    upper = np.asarray(bounds.ub, dtype=float)
+    if x0 is not None:
+        lower = lower * np.ones(len(x0))
+        upper = upper * np.ones(len(x0))
+    if not (np.all(np.isfinite(lower)) and np.all(np.isfinite(upper))):
+        raise ValueError('The surrogate-based optimization algorithm requires finite bounds!')
+    n_params = len(lower)
+    log_scale = (lower > 0) & (upper > 1e3 * lower)
+    rng = np.random.default_rng(seed)
+    if map_function is None:
+        map_function = lambda points: [fun(point, *args) for point in points]
+    if n_initial is None:
+        n_initial = max(2 * n_params + 1, batch_size)
+    n_initial = min(n_initial, maxfev)
+
+    # initial design
+    u = qmc.LatinHypercube(d=n_params, seed=rng).random(n_initial)
+    if x0 is not None:
+        u[0] = _to_unit(np.asarray(x0, dtype=float)[None, :], lower, upper, log_scale)[0]
+    x_iters = [_from_unit(point, lower, upper, log_scale) for point in u]
+    func_vals = [float(value) for value in map_function(x_iters)]
+    unit_points = list(u)
+    gp = GaussianProcess(rng)
+    nit = 0
+    while len(func_vals) < maxfev:
+        nit += 1
+        y = np.log(np.asarray(func_vals) + 1e-12)
+        gp.fit(np.array(unit_points), y)
+        n_batch = min(batch_size, maxfev - len(func_vals))
+        believed_points = list(unit_points)
+        believed_y = list(y)
+        proposals = []
+        for i in range(n_batch):
+            if i > 0:
+                # kriging believer: the proposed points are added with their predicted values
+                gp.fit(np.array(believed_points), np.array(believed_y), optimise=False)
+            best = np.min(believed_y)
+            candidates = rng.random((1000 * n_params, n_params))
+            incumbent = believed_points[int(np.argmin(believed_y))]
+            local = np.clip(incumbent + rng.normal(scale=0.05, size=(100 * n_params, n_params)), 0, 1)
+            candidates = np.vstack([candidates, local])
+            mean, std = gp.predict(candidates)
+            ei = expected_improvement(mean, std, best)
+            point = candidates[int(np.argmax(ei))]
+            result = minimize(lambda v: -expected_improvement(*gp.predict(v[None, :]), best)[0], point,
+                              method='L-BFGS-B', bounds=[(0, 1)] * n_params)
+            if result.success and -result.fun >= np.max(ei):
+                point = result.x
+            proposals.append(point)
+            believed_points.append(point)
+            believed_y.append(gp.predict(point[None, :])[0][0])
+        x_proposals = [_from_unit(point, lower, upper, log_scale) for point in proposals]
+        func_vals.extend(float(value) for value in map_function(x_proposals))
+        x_iters.extend(x_proposals)
+        unit_points.extend(proposals)
+
+    i_best = int(np.argmin(func_vals))
+    return OptimizeResult(x=x_iters[i_best], fun=func_vals[i_best], nfev=len(func_vals), nit=nit, success=True,
+                          message='Maximum number of function evaluations reached.', 
+                          x_iters=np.array(x_iters), func_vals=np.array(func_vals))
+
+def _evaluate_log_probability(log_probability, points, args=(), map_function=None):
+    """Evaluate the log probability of a list of points.
+    Args:
+        log_probability (:obj:`callable`): the log probability, called as log_probability(x, *args)
+        points (:obj:`numpy.ndarray`): the points, the shape is (number of points, number of parameters)
+        args (:obj:`tuple`): the extra arguments of log_probability
+        map_function (:obj:`callable`, optional): evaluates a list of points, called as map_function(points),
+            and returns the list of log probabilities; default evaluates the points in sequence
+    Returns:
+        :obj:`numpy.ndarray`: the log probabilities
+    """
+    if map_function is None:
+        return np.array([log_probability(point, *args) for point in points], dtype=float)
+    return np.array(map_function(list(points)), dtype=float)
+
+def ensemble_sample(log_probability, x0, n_samples, args=(), a=2.0, seed=None, map_function=None, callback=None):
+    """Sample a probability distribution with the affine-invariant ensemble sampler 
+    (stretch move, Goodman and Weare 2010).
+    The walkers are split into two halves, each half is moved using the positions of the other half,
+    so that the proposals of a half can be evaluated in parallel with map_function.
+    Args:
+        log_probability (:obj:`callable`): the log probability, up to a constant, called as log_probability(x, *args)
+        x0 (:obj:`numpy.ndarray`): the initial positions of the walkers, 
+            the shape is (number of walkers, number of parameters), with at least 4 walkers
+        n_samples (:obj:`int`): the number of samples of each walker
+        args (:obj:`tuple`): the extra arguments of log_probability
+        a (:obj:`float`): the scale parameter of the stretch move
+        seed (:obj:`int` or :obj:`numpy.random.Generator`, optional): the seed of the random number generator
+        map_function (:obj:`callable`, optional): evaluates a list of points, called as map_function(points),
+            and returns the list of log probabilities; default evaluates the points in sequence
+        callback (:obj:`callable`, optional): called after each sample as callback(i, positions, log_probabilities)
+    Raises:
+        ValueError: if there are less than 4 walkers or the log probability of an initial position is not finite
+    Returns:
+        :obj:`scipy.optimize.OptimizeResult`: the result, with the attributes chain, 
+            the shape is (number of samples, number of walkers, number of parameters), 
+            log_probability, the shape is (number of samples, number of walkers), 
+            acceptance_fraction, the acceptance fraction of each walker, and nfev
+    """
+    rng = np.random.default_rng(seed)
+    x = np.array(x0, dtype=float)
+    n_walkers, n_params = x.shape
+    if n_walkers < 4:
+        raise ValueError('The ensemble sampler requires at least 4 walkers!')
+    lp = _evaluate_log_probability(log_probability, x, args, map_function)
+    if not np.all(np.isfinite(lp)):
+        raise ValueError('The log probability of the initial positions of the walkers must be finite!')
+    nfev = n_walkers
+    halves = [np.arange(n_walkers // 2), np.arange(n_walkers // 2, n_walkers)]
+    chain = np.empty((n_samples, n_walkers, n_params))
+    log_probabilities = np.empty((n_samples, n_walkers))
+    accepted = np.zeros(n_walkers)
+    for i in range(n_samples):
+        for k in range(2):
+            active, others = halves[k], halves[1 - k]
+            z = ((a - 1) * rng.random(len(active)) + 1)**2 / a
+            partners = x[others[rng.integers(len(others), size=len(active))]]
+            proposals = partners + z[:, None] * (x[active] - partners)
+            lp_proposals = _evaluate_log_probability(log_probability, proposals, args, map_function)
+            nfev += len(active)
+            log_ratio = (n_params - 1) * np.log(z) + lp_proposals - lp[active]
+            accept = np.log(rng.random(len(active))) < log_ratio
+            x[active[accept]] = proposals[accept]
+            lp[active[accept]] = lp_proposals[accept]
+            accepted[active[accept]] += 1
+        chain[i] = x
+        log_probabilities[i] = lp
+        if callback is not None:
+            callback(i, x.copy(), lp.copy())
+    return OptimizeResult(chain=chain, log_probability=log_probabilities, acceptance_fraction=accepted / max(n_samples, 1),
+                          nfev=nfev, success=True, message='Number of samples reached.')
+
+def adaptive_metropolis(log_probability, x0, n_samples, args=(), proposal_covariance=None, adapt_start=None, 
+                        seed=None, map_function=None, callback=None):
+    """Sample a probability distribution with the adaptive Metropolis algorithm (Haario et al. 2001).
+    The proposal distribution is a Gaussian centred at the current position, with the initial covariance 
+    and, after adapt_start samples, the covariance of the samples so far scaled by 2.38**2/(number of parameters).
+    Several chains can be run together, sharing the adapted covariance, 
+    so that their proposals can be evaluated in parallel with map_function.
+    Args:
+        log_probability (:obj:`callable`): the log probability, up to a constant, called as log_probability(x, *args)
+        x0 (:obj:`numpy.ndarray`): the initial positions of the chains, the shape is (number of chains, number of parameters)
+        n_samples (:obj:`int`): the number of samples of each chain
+        args (:obj:`tuple`): the extra arguments of log_probability
+        proposal_covariance (:obj:`numpy.ndarray`, optional): the initial covariance of the proposal distribution, 
+            default is 1e-4 times the identity
+        adapt_start (:obj:`int`, optional): the number of samples before the covariance is adapted, 
+            default is max(100, 10*(number of parameters))
+        seed (:obj:`int` or :obj:`numpy.random.Generator`, optional): the seed of the random number generator
+        map_function (:obj:`callable`, optional): evaluates a list of points, called as map_function(points),
+            and returns the list of log probabilities; default evaluates the points in sequence
+        callback (:obj:`callable`, optional): called after each sample as callback(i, positions, log_probabilities)
+    Raises:
+        ValueError: if the log probability of an initial position is not finite
+    Returns:
+        :obj:`scipy.optimize.OptimizeResult`: the result, see ensemble_sample
+    """
+    rng = np.random.default_rng(seed)
+    x = np.atleast_2d(np.array(x0, dtype=float))
+    n_chains, n_params = x.shape
+    if proposal_covariance is None:
+        proposal_covariance = 1e-4 * np.eye(n_params)
+    if adapt_start is None:
+        adapt_start = max(100, 10 * n_params)
+    lp = _evaluate_log_probability(log_probability, x, args, map_function)
+    if not np.all(np.isfinite(lp)):
+        raise ValueError('The log probability of the initial positions of the chains must be finite!')
+    nfev = n_chains
+    scale = 2.38**2 / n_params
+    # regularisation of the adapted covariance, relative to the initial one
+    epsilon = 1e-6 * np.diag(np.diag(proposal_covariance))
+    factor = np.linalg.cholesky(proposal_covariance)
+    # the running mean and sum of squared deviations of the samples (Welford), for the adapted covariance
+    count, mean, m2 = 0, np.zeros(n_params), np.zeros((n_params, n_params))
+    chain = np.empty((n_samples, n_chains, n_params))
+    log_probabilities = np.empty((n_samples, n_chains))
+    accepted = np.zeros(n_chains)
+    for i in range(n_samples):
+        proposals = x + rng.standard_normal((n_chains, n_params)).dot(factor.T)
+        lp_proposals = _evaluate_log_probability(log_probability, proposals, args, map_function)
+        nfev += n_chains
+        accept = np.log(rng.random(n_chains)) < lp_proposals - lp
+        x[accept] = proposals[accept]
+        lp[accept] = lp_proposals[accept]
+        accepted[accept] += 1
+        chain[i] = x
+        log_probabilities[i] = lp
+        for sample in x:
+            count += 1
+            delta = sample - mean
+            mean = mean + delta / count
+            m2 += np.outer(delta, sample - mean)
+        if i + 1 >= adapt_start:
+            covariance = m2 / max(count - 1, 1)
+            try:
+                factor = np.linalg.cholesky(scale * (covariance + epsilon))
+            except np.linalg.LinAlgError:
+                pass # keep the previous proposal covariance
+        if callback is not None:
+            callback(i, x.copy(), lp.copy())
+    return OptimizeResult(chain=chain, log_probability=log_probabilities, acceptance_fraction=accepted / max(n_samples, 1),
+                          nfev=nfev, success=True, message='Number of samples reached.')
@@ -3,9 +3,12 @@ import csv
 import sys
 import numpy as np
 import os
-import sympy
+import scipy.sparse
+import scipy.linalg
+from fractions import Fraction
+from math import gcd
 print(os.getcwd())
-def load_matrix(fmatrix,rmatrix):
+def load_matrix(fmatrix,rmatrix,sparse=False):
     """
     Load stoichiometric matrices from csv files
 
@@ -15,6 +18,10 @@ def load_matrix(fmatrix,rmatrix):
         The file path of the forward stoichiometric matrix
     rmatrix : str
         The file path of the reverse stoichiometric matrix
+    sparse : bool, optional
+        If True, the csv files are read row by row and only the nonzero entries are kept,
+        and the stoichiometric matrices are returned as scipy.sparse.csr_matrix.
+        The default is False.
 
     Returns
     -------
@@ -26,15 +33,19 @@ def load_matrix(fmatrix,rmatrix):
         A list of reaction names
     ReType : list
         A list of reaction types
-    N_f : numpy.ndarray
+    N_f : numpy.ndarray or scipy.sparse.csr_matrix
         The forward stoichiometric matrix
-    N_r : numpy.ndarray
+    N_r : numpy.ndarray or scipy.sparse.csr_matrix
         The reverse stoichiometric matrix
     """
     # * * ReType ReType
     # * * ReName ReName
     # CompType CompName 0 1 
     # CompType CompName 1 0
+    if sparse:
+        CompName, CompType, ReName, ReType, N_f = _load_sparse_matrix(fmatrix)
+        N_r = _load_sparse_matrix(rmatrix)[4]
+        return CompName, CompType, ReName, ReType, N_f, N_r
     startR=2
     startC=2
     N_f = []
@@ -68,15 +79,293 @@ def load_matrix(fmatrix,rmatrix):
     
     return CompName, CompType, ReName, ReType, np.array(N_f).astype(int), np.array(N_r).astype(int)
 
+def _load_sparse_matrix(fmatrix):
+    """
+    Stream a stoichiometric matrix from a csv file into a sparse matrix
+
+    Parameters
+    ----------
+    fmatrix : str
+        The file path of the stoichiometric matrix, in the format of load_matrix
+
+    Returns
+    -------
+    CompName : list
+        A list of component names
+    CompType : list
+        A list of component types
+    ReName : list
+        A list of reaction names
+    ReType : list
+        A list of reaction types
+    N : scipy.sparse.csr_matrix
+        The stoichiometric matrix
+    """
+    startR=2
+    startC=2
+    CompName=[]
+    CompType=[]
+    ReName=[]
+    ReType=[]
+    rows=[]
+    cols=[]
+    data=[]
+    with open(fmatrix,'r') as f:
+        reader = csv.reader(f,delimiter=',')
+        for line_count, row in enumerate(reader):
+            if line_count ==startR-2:
+                ReType=row[startC:]
+            elif line_count ==startR-1:
+                ReName=row[startC:]
+            else:
+                i=len(CompName)
+                CompName.append(row[startC-1])
+                CompType.append(row[startC-2])
+                # keep the nonzero entries of the row only
+                for j, value in enumerate(row[startC:]):
+                    value=int(value)
+                    if value!=0:
+                        rows.append(i)
+                        cols.append(j)
+                        data.append(value)
+    N=scipy.sparse.csr_matrix((np.array(data,dtype=int),(rows,cols)),shape=(len(CompName),len(ReName)))
+    return CompName, CompType, ReName, ReType, N
+
+# The limits of the exact elimination, i.e., the maximum number of bits of the entries
+# and the maximum number of entry updates, beyond which the elimination is given up,
+# and the maximum size of the matrices passed to sympy instead of the SVD when it is given up
+MAX_ENTRY_BITS = 4096
+MAX_EXACT_OPERATIONS = 5000000
+MAX_SYMPY_SIZE = 2500
+
+class _EliminationAborted(Exception):
+    pass
+
+def _integer_rows(A):
+    """
+    Convert the rows of a matrix to sparse rows of integers,
+    representing each entry by the rational number of its decimal string (as sympy.nsimplify(rational=True))
+    and scaling each row by the least common multiple of its denominators
+
+    Parameters
+    ----------
+    A : numpy.ndarray or scipy.sparse matrix
+        The matrix
+
+    Raises
+    ------
+    ValueError
+        If an entry of the matrix is not finite
+
+    Returns
+    -------
+    list
+        A list of dict {column: integer value} for the nonzero entries of each row
+    """
+    A = scipy.sparse.csr_matrix(A)
+    rows=[]
+    for i in range(A.shape[0]):
+        start, end = A.indptr[i], A.indptr[i+1]
+        row={}
+        for j, value in zip(A.indices[start:end], A.data[start:end]):
+            if not np.isfinite(value):
+                raise ValueError('The matrix must have finite entries.')
+            if value!=0:
+                row[int(j)]=Fraction(repr(float(value)))
+        denominator=1
+        for value in row.values():
+            denominator=denominator*value.denominator//gcd(denominator,value.denominator)
+        rows.append({j: int(value*denominator) for j, value in row.items()})
+    return rows
+
+def _integer_echelon(rows, n_cols):
+    """
+    Reduce sparse integer rows to a row echelon form by fraction-free Gaussian elimination
+
+    Each row is divided by the greatest common divisor of its entries after each update,
+    so that the entries stay small for stoichiometric matrices.
+    The pivot columns do not depend on the choice of the pivot rows,
+    so the pivot row of each column is chosen with the fewest nonzero entries to limit the fill-in.
+
+    Parameters
+    ----------
+    rows : list
+        A list of dict {column: integer value}, modified in place
+    n_cols : int
+        The number of columns
+
+    Raises
+    ------
+    _EliminationAborted
+        If an entry exceeds MAX_ENTRY_BITS bits or the fill-in exceeds MAX_EXACT_OPERATIONS entry updates
+
+    Returns
+    -------
+    list
+        A list of (pivot column, row) in the order of the pivot columns,
+        where each row is a dict {column: integer value} with no entries in the previous pivot columns
+    """
+    remaining=list(range(len(rows)))
+    pivots=[]
+    operations=0
+    for c in range(n_cols):
+        candidates=[i for i in remaining if c in rows[i]]
+        if not candidates:
+            continue
+        p=min(candidates, key=lambda i: len(rows[i]))
+        remaining.remove(p)
+        pivot_row=rows[p]
+        a=pivot_row[c]
+        for i in candidates:
+            if i==p:
+                continue
+            row=rows[i]
+            operations+=len(row)+len(pivot_row)
+            if operations>MAX_EXACT_OPERATIONS:
+                raise _EliminationAborted()
+            b=row[c]
+            g=gcd(a,b)
+            fa, fb = a//g, b//g
+            updated={j: fa*value for j, value in row.items()}
+            for j, value in pivot_row.items():
+                updated[j]=updated.get(j,0)-fb*value
+            updated={j: value for j, value in updated.items() if value!=0}
+            divisor=0
+            for value in updated.values():
+                divisor=gcd(divisor,value)
+            if divisor>1:
+                updated={j: value//divisor for j, value in updated.items()}
+            if any(abs(value).bit_length()>MAX_ENTRY_BITS for value in updated.values()):
+                raise _EliminationAborted()
+            rows[i]=updated
+        pivots.append((c,pivot_row))
+        if not remaining:
+            break
+    return pivots
+
+def _echelon_nullspace(pivots, n_cols):
+    """
+    Compute the nullspace basis of a row echelon form by exact back substitution,
+    with one basis vector per free column, equal to 1 at its free column and 0 at the other free columns
+
+    Parameters
+    ----------
+    pivots : list
+        The row echelon form returned by _integer_echelon
+    n_cols : int
+        The number of columns
+
+    Raises
+    ------
+    _EliminationAborted
+        If the back substitution exceeds MAX_EXACT_OPERATIONS entry updates
+
+    Returns
+    -------
+    numpy.ndarray
+        The basis vectors as columns, of shape (n_cols, nullity)
+    """
+    pivot_cols={c for c, _ in pivots}
+    free_cols=[c for c in range(n_cols) if c not in pivot_cols]
+    basis=np.zeros((n_cols,len(free_cols)))
+    operations=0
+    for k, f in enumerate(free_cols):
+        x={f: Fraction(1)}
+        for c, row in reversed(pivots):
+            operations+=len(row)
+            if operations>MAX_EXACT_OPERATIONS:
+                raise _EliminationAborted()
+            total=sum(value*x[j] for j, value in row.items() if j in x)
+            if total!=0:
+                x[c]=-total/row[c]
+        for j, value in x.items():
+            basis[j,k]=float(value)
+    return basis
+
+def _sympy_nullspace(A):
+    import sympy
+    Z = sympy.nsimplify(sympy.Matrix(A), rational=True).nullspace()
+    if not Z:
+        return np.zeros((A.shape[1],0))
+    return np.transpose(np.array(Z).astype(np.float64))[0]
+
+def nullspace(A, method='exact', rcond=None):
+    """
+    Compute a basis of the (right) nullspace of a matrix
+
+    Parameters
+    ----------
+    A : numpy.ndarray or scipy.sparse matrix
+        The matrix, e.g., a stoichiometric matrix
+    method : str, optional
+        'exact' - fraction-free integer elimination on the rational entries of A,
+        giving the same basis as sympy.nsimplify(sympy.Matrix(A), rational=True).nullspace();
+        if the elimination is given up (see MAX_ENTRY_BITS and MAX_EXACT_OPERATIONS),
+        sympy is used for small matrices and the SVD otherwise.
+        'svd' - an orthonormal basis from the singular value decomposition.
+        'sympy' - sympy.Matrix.nullspace with exact rational arithmetic.
+        The default is 'exact'.
+    rcond : float, optional
+        The relative tolerance of the singular values for the 'svd' method,
+        see scipy.linalg.null_space
+
+    Raises
+    ------
+    ValueError
+        If the method is not supported or the matrix has entries that are not finite
+
+    Returns
+    -------
+    numpy.ndarray
+        The basis vectors as columns, of shape (number of columns of A, nullity)
+    """
+    shape=A.shape
+    if method=='svd':
+        if scipy.sparse.issparse(A):
+            A=A.toarray()
+        return scipy.linalg.null_space(np.asarray(A,dtype=float), rcond=rcond)
+    elif method=='sympy':
+        if scipy.sparse.issparse(A):
+            A=A.toarray()
+        return _sympy_nullspace(A)
+    elif method!='exact':
+        raise ValueError('The nullspace method {} is not supported!'.format(method))
+    try:
+        return _echelon_nullspace(_integer_echelon(_integer_rows(A), shape[1]), shape[1])
+    except _EliminationAborted:
+        return nullspace(A, 'sympy' if shape[0]*shape[1]<=MAX_SYMPY_SIZE else 'svd', rcond)
+
+def matrix_rank(A):
+    """
+    Compute the exact rank of a matrix by fraction-free integer elimination,
+    or numerically if the elimination is given up
+
+    Parameters
+    ----------
+    A : numpy.ndarray or scipy.sparse matrix
+        The matrix, e.g., a stoichiometric matrix
+
+    Returns
+    -------
+    int
+        The rank of the matrix
+    """
+    try:
+        return len(_integer_echelon(_integer_rows(A), A.shape[1]))
+    except _EliminationAborted:
+        if scipy.sparse.issparse(A):
+            A=A.toarray()
+        return int(np.linalg.matrix_rank(np.asarray(A,dtype=float)))
+
 def kinetic2BGparams(N_f,N_r,kf,kr,K_c,N_c,Ws):
     """
     Convert kinetic parameters to BG parameters
 
     Parameters
     ----------
-    N_f : numpy.ndarray
+    N_f : numpy.ndarray or scipy.sparse matrix
         The forward stoichiometry matrix
-    N_r : numpy.ndarray
+    N_r : numpy.ndarray or scipy.sparse matrix
         The reverse stoichiometry matrix
     kf : numpy.ndarray
         The forward rate constants,
@@ -112,69 +401,195 @@ def kinetic2BGparams(N_f,N_r,kf,kr,K_c,N_c,Ws):
         The estimated zero values of the detailed balance constraints
 
     """
-    
-    N_fT=np.transpose(N_f)
-    N_rT=np.transpose(N_r)
-    N = N_r - N_f
-    num_cols = N_f.shape[1] # number of reactions, the same as the number of columns in N_f
-    num_rows = N_f.shape[0] # number of species, the same as the number of rows in N_f
-    I=np.identity(num_cols)
-    N_cT=np.transpose(N_c)
-    num_contraints = K_c.shape[0]
-    zerofill=np.zeros((num_contraints,num_cols))
-    K_eq = np.divide(kf,kr)
-    if len(K_c)!=0:
-        M=np.block([
-            [I, N_fT],
-            [I, N_rT],
-            [zerofill, N_cT]
-        ])
-        k= np.block([
-            [kf],
-            [kr],
-            [K_c]
-        ]) 
-        N_b =np.hstack([-N, N_c])
-        K_contraints = np.block([
-            [K_eq],
-            [K_c]
-        ])
-    else:
-        M=np.block([
-            [I, N_fT],
-            [I, N_rT]
-        ])
-        k= np.block([
-            [kf],
-            [kr]
-        ])
-        N_b = -N
-        K_contraints = K_eq
-    # construct W matrix
-    W=np.vstack([np.ones((num_cols,1)),Ws])   
-    # convert kinetic parameters to BG parameters
-    lambdaW= np.exp(np.matmul(np.linalg.pinv(M),np.log(k)))
-    lambda_ = np.divide(lambdaW,W)
-    kappa=lambda_[:num_cols]
-    K = lambda_[num_cols:]
-    
-    # check if the solution is valid
-    N_rref, _ = sympy.Matrix(N).rref()
-    zero_est = None
-    R_mat = np.array(sympy. nsimplify(sympy.Matrix(N), rational=True).nullspace())
-    if R_mat.size>0:
-        R_mat = np.transpose(np.array(R_mat).astype(np.float64))[0]
-        zero_est = np.matmul(R_mat.T,K_eq)
-    # Check that there is a detailed balance constraint
-    Z = sympy.nsimplify(sympy.Matrix(N_b), rational=True).nullspace() #rational_nullspace(M, 2)
-    if Z:
-        Z = np.transpose(np.array(Z).astype(np.float64))[0]
-        zero_est = np.matmul(Z.T,np.log(K_contraints))
-
-    k_est = np.exp(np.matmul(M,np.log(lambdaW)))
-    diff = np.sum(np.abs(np.divide(k_est - k,k)))
-
-    return kappa, K, K_eq, diff, zero_est
+    constrained = len(K_c)!=0
+    converter = BGParamConverter(N_f,N_r,N_c if constrained else None)
+    kappa, K, K_eq, diff, zero_est = converter.convert(np.transpose(kf),np.transpose(kr),
+                                                       np.transpose(K_c) if constrained else None,np.transpose(Ws))
+    if zero_est is not None:
+        zero_est = np.transpose(zero_est)
+
+    return np.transpose(kappa), np.transpose(K), np.transpose(K_eq), diff[0], zero_est
+
+def conserved_moieties(N):
+    """
+    Detect the conserved moieties of a network from the left nullspace of its stoichiometric matrix
+
+    Each conserved moiety k is a combination sum_i L[i,k]*q_i of the species that stays constant,
+    with one dependent species d_k, i.e., L[d_k,k]=1 and L[d_j,k]=0 for the other moieties,
+    so that q_{d_k} = total_k - sum_{i independent} L[i,k]*q_i.
+
+    Parameters
+    ----------
+    N : numpy.ndarray or scipy.sparse matrix
+        The stoichiometric matrix N_r - N_f, species x reactions
+
+    Returns
+    -------
+    L : numpy.ndarray
+        The conserved moieties as columns, of shape (number of species, number of moieties)
+    independent : numpy.ndarray
+        The indices of the independent species, in increasing order
+    dependent : numpy.ndarray
+        The indices of the dependent species, one per moiety
+    """
+    L = nullspace(scipy.sparse.csr_matrix(N).T)
+    num_species, num_moieties = L.shape
+    if num_moieties==0:
+        return L, np.arange(num_species), np.zeros(0,dtype=int)
+    # The exact basis is 1 at one species of each moiety and 0 at the species of the other moieties
+    dependent=[]
+    for k in range(num_moieties):
+        unit=np.flatnonzero((L[:,k]==1) & (np.count_nonzero(L,axis=1)==1))
+        if len(unit)==0:
+            break
+        dependent.append(unit[0])
+    if len(dependent)<num_moieties:
+        # choose the dependent species by QR with column pivoting and normalise the basis on them
+        dependent=np.sort(scipy.linalg.qr(L.T,pivoting=True)[2][:num_moieties])
+        L=np.matmul(L,np.linalg.inv(L[dependent,:]))
+        L[dependent,:]=np.identity(num_moieties)
+    dependent=np.array(dependent,dtype=int)
+    independent=np.setdiff1d(np.arange(num_species),dependent)
+    return L, independent, dependent
+
+class BGParamConverter:
+    """
+    Convert kinetic parameters to BG parameters for a given network
+
+    The pseudo-inverse of the matrix M mapping the logarithms of the BG parameters to the logarithms
+    of the kinetic parameters, and the nullspaces used to check the detailed balance constraints,
+    depend only on the stoichiometry. They are computed once, so that many sets of kinetic parameters,
+    e.g., samples for uncertainty propagation, are converted with one matrix product.
+
+    Attributes
+    ----------
+    num_reactions : int
+        The number of reactions
+    num_species : int
+        The number of species
+    num_constraints : int
+        The number of constraints, i.e., the number of columns of N_c
+    M : numpy.ndarray
+        The matrix [[I, N_f^T], [I, N_r^T], [0, N_c^T]]
+    pinv_M : numpy.ndarray
+        The pseudo-inverse of M
+    R_mat : numpy.ndarray
+        The nullspace basis of N = N_r - N_f as columns
+    Z : numpy.ndarray
+        The nullspace basis of N_b = [-N, N_c] as columns
+    """
+    def __init__(self,N_f,N_r,N_c=None):
+        """
+        Parameters
+        ----------
+        N_f : numpy.ndarray or scipy.sparse matrix
+            The forward stoichiometry matrix
+        N_r : numpy.ndarray or scipy.sparse matrix
+            The reverse stoichiometry matrix
+        N_c : numpy.ndarray, optional
+            The constraints matrix,
+            the rows of N_c is the same as the number of the species.
+            The default is None, i.e., no constraints.
+        """
+        if scipy.sparse.issparse(N_f):
+            N_f=N_f.toarray()
+        if scipy.sparse.issparse(N_r):
+            N_r=N_r.toarray()
+        N = N_r - N_f
+        self.num_reactions = N_f.shape[1] # the same as the number of columns in N_f
+        self.num_species = N_f.shape[0] # the same as the number of rows in N_f
+        I=np.identity(self.num_reactions)
+        if N_c is not None and np.size(N_c)!=0:
+            self.num_constraints = N_c.shape[1]
+            zerofill=np.zeros((self.num_constraints,self.num_reactions))
+            self.M=np.block([
+                [I, np.transpose(N_f)],
+                [I, np.transpose(N_r)],
+                [zerofill, np.transpose(N_c)]
+            ])
+            N_b =np.hstack([-N, N_c])
+        else:
+            self.num_constraints = 0
+            self.M=np.block([
+                [I, np.transpose(N_f)],
+                [I, np.transpose(N_r)]
+            ])
+            N_b = -N
+        self.pinv_M = np.linalg.pinv(self.M)
+        self.R_mat = nullspace(N)
+        self.Z = nullspace(N_b)
+
+    def convert(self,kf,kr,K_c=None,Ws=None):
+        """
+        Convert sets of kinetic parameters to BG parameters
+
+        Parameters
+        ----------
+        kf : numpy.ndarray
+            The forward rate constants, of shape (n_samples, n_reactions)
+        kr : numpy.ndarray
+            The reverse rate constants, of shape (n_samples, n_reactions)
+        K_c : numpy.ndarray, optional
+            The constraints, of shape (n_samples, n_constraints) or (n_constraints,).
+            Required if the converter has constraints.
+        Ws : numpy.ndarray, optional
+            The volumes of the species, of shape (n_samples, n_species) or (n_species,).
+            The default is None, i.e., unit volumes.
+
+        Raises
+        ------
+        ValueError
+            If the shapes of the parameters do not match the network
+
+        Returns
+        -------
+        kappa : numpy.ndarray
+            The reaction rate constants, of shape (n_samples, n_reactions)
+        K : numpy.ndarray
+            The thermodynamic constants, of shape (n_samples, n_species)
+        K_eq : numpy.ndarray
+            The equilibrium constants, of shape (n_samples, n_reactions)
+        diff : numpy.ndarray
+            The difference between the estimated and the input kinetic parameters, of shape (n_samples,)
+        zero_est : numpy.ndarray
+            The estimated zero values of the detailed balance constraints, of shape (n_samples, n_zeros),
+            or None if the network has no such constraints
+        """
+        kf=np.atleast_2d(np.asarray(kf,dtype=float))
+        kr=np.atleast_2d(np.asarray(kr,dtype=float))
+        n_samples=kf.shape[0]
+        if kf.shape!=(n_samples,self.num_reactions) or kr.shape!=kf.shape:
+            raise ValueError('kf and kr must have the shape (n_samples, {}).'.format(self.num_reactions))
+        blocks=[kf,kr]
+        if self.num_constraints>0:
+            if K_c is None:
+                raise ValueError('K_c is required for the constraints.')
+            blocks.append(np.broadcast_to(np.atleast_2d(np.asarray(K_c,dtype=float)),(n_samples,self.num_constraints)))
+        k=np.hstack(blocks)
+        if Ws is None:
+            Ws=np.ones(self.num_species)
+        W=np.hstack([np.ones((n_samples,self.num_reactions)),
+                     np.broadcast_to(np.atleast_2d(np.asarray(Ws,dtype=float)),(n_samples,self.num_species))])
+        K_eq = np.divide(kf,kr)
+        # convert kinetic parameters to BG parameters
+        lambdaW= np.exp(np.transpose(np.matmul(self.pinv_M,np.transpose(np.log(k)))))
+        lambda_ = np.divide(lambdaW,W)
+        kappa=lambda_[:,:self.num_reactions]
+        K = lambda_[:,self.num_reactions:]
+
+        # check if the solution is valid
+        zero_est = None
+        if self.R_mat.size>0:
+            zero_est = np.matmul(K_eq,self.R_mat)
+        # Check that there is a detailed balance constraint
+        if self.Z.size>0:
+            K_contraints = np.hstack([K_eq]+blocks[2:])
+            zero_est = np.matmul(np.log(K_contraints),self.Z)
+
+        k_est = np.exp(np.transpose(np.matmul(self.M,np.transpose(np.log(lambdaW)))))
+        diff = np.sum(np.abs(np.divide(k_est - k,k)),axis=1)
+
+        return kappa, K, K_eq, diff, zero_est
 
 if __name__ == "__main__":
     CompName,CompType,ReName,ReType,N_f,N_r=load_matrix('../tests/SLC2_f.csv','../tests/SLC2_r.csv')
@@ -1,4 +1,5 @@
 import requests
+import csv
 import os
 import pandas
 import tempfile
@@ -146,13 +147,13 @@ def get_models_referenced_by_task(doc,task):
     elif task.isSedRepeatedTask () :
         models = set()
         for change in task.getListOfTaskChanges ():
-            models.update(get_models_referenced_by_setValue(change))
+            models.update(get_models_referenced_by_setValue(task,change))
 
         for sub_task in task.getListOfSubTasks ():
             itask = doc.getTask(sub_task.getTask ())
-            models.update(get_models_referenced_by_task(doc,itask))
+            models.update(model.getId() for model in get_models_referenced_by_task(doc,itask))
             for change in sub_task.getListOfTaskChanges (): # newly added in Level 4
-                models.update(get_models_referenced_by_setValue(change)) 
+                models.update(get_models_referenced_by_setValue(task,change)) 
 
         if task.isSetRangeId (): # TODO: check if this is already covered by getListOfRanges
             irange = task.getRange(task.getRangeId ())
@@ -184,11 +185,12 @@ def get_models_referenced_by_range(task,range):
         :obj:`set` of :obj:`SedModel`: models
     """
     models = set()
-    if range.isSedFunctionalRange () and range.getListOfVariables ():
-        models.update(get_models_referenced_by_listOfVariables(range.getListOfVariables ()))
-    if range.isSetRange ():
-        irange=task.getRange(range.getRange ())
-        models.update(get_models_referenced_by_range(task,irange))
+    if range.isSedFunctionalRange ():
+        if range.getListOfVariables ():
+            models.update(get_models_referenced_by_listOfVariables(range.getListOfVariables ()))
+        if range.isSetRange ():
+            irange=task.getRange(range.getRange ())
+            models.update(get_models_referenced_by_range(task,irange))
     return models
 
 def get_models_referenced_by_setValue(task,setValue):
@@ -206,9 +208,9 @@ def get_models_referenced_by_setValue(task,setValue):
     models.add(setValue.getModelReference ())
     if setValue.isSetRange ():
         irange=task.getRange(setValue.getRange ())
-        models.update(get_models_referenced_by_range(irange))
+        models.update(get_models_referenced_by_range(task,irange))
     if setValue.getListOfVariables ():
-        models.update(get_models_referenced_by_listOfVariables(setValue.getListOfVariables))
+        models.update(get_models_referenced_by_listOfVariables(setValue.getListOfVariables ()))
     return models
 
 def get_models_referenced_by_computedChange(change):
@@ -223,7 +225,7 @@ def get_models_referenced_by_computedChange(change):
     """
     models = set()  
     if change.getListOfVariables ():
-        models.update(get_models_referenced_by_listOfVariables(change.getListOfVariables))
+        models.update(get_models_referenced_by_listOfVariables(change.getListOfVariables ()))
     return models
 
 def get_models_referenced_by_listOfVariables(listOfVariables):
@@ -252,10 +254,91 @@ def get_models_referenced_by_adjustableParameter(adjustableParameter):
         models.add(adjustableParameter.getModelReference ())
     return models
 
-def get_df_from_dataDescription(dataDescription, working_dir):
+class DataSourceTable:
+    """
+    Parsed content of a data source file (csv file), 
+    stored as NumPy arrays, one array per column.
+    If all the columns have the same dtype, the columns are views of a 2D block (Fortran order),
+    so that both the columns and the rows can be sliced without copying.
+    The arrays are read-only, since the table is shared by the data descriptions referring to the same file.
+
+    Attributes
+    ----------
+    columns: list
+        The names of the columns
+    arrays: dict
+        The values of the columns, in the format of {column name: numpy.ndarray}
+    block: numpy.ndarray or None
+        The 2D array of the values, None if the columns have different dtypes
     """
-    Return a pandas.DataFrame from a dataDescription.
-    Assume the data source file is a csv file.
+
+    def __init__(self, df):
+        self.columns = [str(column) for column in df.columns]
+        self.block = None
+        dtypes = set(df.dtypes)
+        if len(dtypes) == 1 and np.issubdtype(dtypes.pop(), np.number):
+            self.block = np.asfortranarray(df.to_numpy())
+            self.block.flags.writeable = False
+            self.arrays = {column: self.block[:, i] for i, column in enumerate(self.columns)}
+        else:
+            self.arrays = {}
+            for column in df.columns:
+                array = df[column].to_numpy()
+                array.flags.writeable = False
+                self.arrays[str(column)] = array
+
+    def __len__(self):
+        return len(self.arrays[self.columns[0]]) if self.columns else 0
+
+    def column(self, name, rows=slice(None)):
+        """ Return the values of a column (a view)
+
+        Parameters
+        ----------
+        name: str
+            The name of the column
+        rows: slice, optional
+            The rows to be selected. Default: all rows
+
+        Raises
+        ------
+        KeyError
+            If the column does not exist
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            1D array of the values
+        """
+        return self.arrays[name][rows]
+
+    def rows(self, rows=slice(None)):
+        """ Return the values of rows
+        (a view if the columns have the same dtype)
+
+        Parameters
+        ----------
+        rows: slice, optional
+            The rows to be selected. Default: all rows
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            2D array of the values, in the format of (rows, columns)
+        """
+        if self.block is not None:
+            return self.block[rows]
+        block = np.empty((len(self), len(self.columns)), dtype=object)
+        for i, column in enumerate(self.columns):
+            block[:, i] = self.arrays[column]
+        return block[rows]
+
+_DATA_SOURCE_CACHE = {}
+
+def _get_filename_of_dataDescription(dataDescription, working_dir):
+    """
+    Return the path of the data source file of a dataDescription,
+    remote data source files are downloaded to a temporary file.
 
     Parameters
     ----------
@@ -271,11 +354,10 @@ def get_df_from_dataDescription(dataDescription, working_dir):
 
     Returns
     -------
-    :obj:`pandas.DataFrame`
-        A pandas.DataFrame object
-    
+    tuple
+        (str, bool)
+        The path of the data source file and whether it is a downloaded temporary file
     """
-
     source = dataDescription.getSource ()
     if re.match(r'^http(s)?://', source, re.IGNORECASE):
         response = requests.get(source)
@@ -288,7 +370,7 @@ def get_df_from_dataDescription(dataDescription, working_dir):
         os.close(temp_file)
         with open(temp_data_source, 'wb') as file:
             file.write(response.content)
-        filename = temp_data_source
+        return temp_data_source, True
     else:
         if os.path.isabs(source):
             filename = source
@@ -297,11 +379,179 @@ def get_df_from_dataDescription(dataDescription, working_dir):
 
         if not os.path.isfile(os.path.join(working_dir, source)):
             raise FileNotFoundError('Data source file `{}` does not exist.'.format(source))
+        return filename, False
+
+def _read_csv(filename, usecols=None, engine=None):
+    """
+    Read a csv file.
+
+    Parameters
+    ----------
+    filename: :obj:`str`
+        The path of the csv file
+    usecols: list, optional
+        The names of the columns to be read. Default: None, all the columns are read
+    engine: str, optional
+        The parser engine of pandas.read_csv, e.g., 'c' or 'pyarrow'. 
+        The 'pyarrow' engine does not support skipinitialspace, 
+        hence the column names are stripped after reading.
+        If the engine is not available, the default engine is used.
+
+    Returns
+    -------
+    :obj:`pandas.DataFrame`
+        A pandas.DataFrame object
+    """
+    if engine == 'pyarrow':
+        try:
+            if usecols is not None:
+                # pass the names as written in the header, so that only these columns are parsed
+                with open(filename, 'r', encoding='utf-8') as file:
+                    header = next(csv.reader(file), [])
+                usecols_stripped = set(usecols)
+                usecols = [column for column in header if column.strip() in usecols_stripped]
+            df = pandas.read_csv(filename, encoding='utf-8', usecols=usecols, engine=engine)
+            df.columns = [str(column).strip() for column in df.columns]
+            return df
+        except ImportError:
+            engine = None
+            usecols = None if usecols is None else [column.strip() for column in usecols]
+    if usecols is not None:
+        # skipinitialspace does not apply to the names matched by usecols
+        usecols_stripped = set(usecols)
+        usecols = lambda column: column.strip() in usecols_stripped
+    return pandas.read_csv(filename, skipinitialspace=True, encoding='utf-8', usecols=usecols, engine=engine)
+
+def get_df_from_dataDescription(dataDescription, working_dir, usecols=None, engine=None):
+    """
+    Return a pandas.DataFrame from a dataDescription.
+    Assume the data source file is a csv file.
+
+    Parameters
+    ----------
+    dataDescription: :obj:`SedDataDescription`
+        An instance of SedDataDescription
+    working_dir: :obj:`str`
+        working directory of the SED document (path relative to which data source files are located)
+    usecols: list, optional
+        The names of the columns to be read. Default: None, all the columns are read
+    engine: str, optional
+        The parser engine of pandas.read_csv, e.g., 'c' or 'pyarrow'. Default: None, the default engine of pandas
+
+    Raises
+    ------
+    FileNotFoundError
+        If the data source file does not exist
+
+    Returns
+    -------
+    :obj:`pandas.DataFrame`
+        A pandas.DataFrame object
     
-    df = pandas.read_csv(filename, skipinitialspace=True,encoding='utf-8')
+    """
+
+    filename, is_temp = _get_filename_of_dataDescription(dataDescription, working_dir)
+    df = _read_csv(filename, usecols, engine)
+    if is_temp:
+        os.remove(filename)
 
     return df
 
+def get_table_from_dataDescription(dataDescription, working_dir, usecols=None, engine=None):
+    """
+    Return a DataSourceTable from a dataDescription.
+    Assume the data source file is a csv file.
+    The tables of local files are cached by the path and the modification time of the file 
+    (and the columns read), so that a file is only parsed once 
+    when it is referred to by several data descriptions or SED documents.
+
+    Parameters
+    ----------
+    dataDescription: :obj:`SedDataDescription`
+        An instance of SedDataDescription
+    working_dir: :obj:`str`
+        working directory of the SED document (path relative to which data source files are located)
+    usecols: list, optional
+        The names of the columns to be read. Default: None, all the columns are read
+    engine: str, optional
+        The parser engine of pandas.read_csv, e.g., 'c' or 'pyarrow'. Default: None, the default engine of pandas
+
+    Raises
+    ------
+    FileNotFoundError
+        If the data source file does not exist
+
+    Returns
+    -------
+    :obj:`DataSourceTable`
+        The parsed data source
+    """
+    filename, is_temp = _get_filename_of_dataDescription(dataDescription, working_dir)
+    if is_temp:
+        table = DataSourceTable(_read_csv(filename, usecols, engine))
+        os.remove(filename)
+        return table
+
+    key = (os.path.abspath(filename), os.path.getmtime(filename), None if usecols is None else tuple(sorted(usecols)))
+    if key not in _DATA_SOURCE_CACHE:
+        # drop the tables of outdated versions of the file
+        for old_key in [old_key for old_key in _DATA_SOURCE_CACHE if old_key[0] == key[0] and old_key[1] != key[1]]:
+            del _DATA_SOURCE_CACHE[old_key]
+        _DATA_SOURCE_CACHE[key] = DataSourceTable(_read_csv(filename, usecols, engine))
+    return _DATA_SOURCE_CACHE[key]
+
+def get_columns_of_dataDescription(dataDescription):
+    """
+    Return the names of the columns referred to by the data sources of a dataDescription.
+    Assume 2D dimensionDescription and 2D data source.
+
+    Parameters
+    ----------
+    dataDescription: :obj:`SedDataDescription`
+        An instance of SedDataDescription
+
+    Returns
+    -------
+    list or None
+        The names of the columns, 
+        None if a data source refers to whole rows, i.e., all the columns are needed
+    """
+    dim2_index = dataDescription.getDimensionDescription ().get(0).get(0).getId()
+    columns = []
+    for dataSource in dataDescription.getListOfDataSources ():
+        column = None
+        for sedSlice in dataSource.getListOfSlices ():
+            if sedSlice.getReference ()==dim2_index and sedSlice.isSetValue ():
+                column = sedSlice.getValue ()
+        if column is None:
+            return None
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+def _get_rows(startIndex=None, endIndex=None, value=None):
+    """
+    Return the slice of the rows selected by a SedSlice.
+
+    Parameters
+    ----------
+    startIndex: int, optional
+        The start index of the slice
+    endIndex: int, optional
+        The end index of the slice (inclusive)
+    value: int or str, optional
+        The index of a single row
+
+    Returns
+    -------
+    slice
+        The slice of the rows
+    """
+    if value is not None:
+        value = int(float(value))
+        return slice(value, value+1)
+    return slice(startIndex, None if endIndex is None else endIndex+1)
+
 def get_value_of_dataSource(doc, dataSourceID,dfDict):
     """
     Return a numpy.ndarray from a data source.
@@ -313,9 +563,9 @@ def get_value_of_dataSource(doc, dataSourceID,dfDict):
         An instance of SedDocument
     dataSourceID: :obj:`str`
         The id of the data source
-    dfDict: :obj:`dict` of :obj:`pandas.DataFrame`
-        A dictionary of pandas.DataFrame objects
-        The format is {dataDescription.getId(): pandas.DataFrame}
+    dfDict: :obj:`dict` of :obj:`pandas.DataFrame` or :obj:`DataSourceTable`
+        A dictionary of pandas.DataFrame or DataSourceTable objects
+        The format is {dataDescription.getId(): pandas.DataFrame or DataSourceTable}
 
     Raises
     ------
@@ -327,7 +577,8 @@ def get_value_of_dataSource(doc, dataSourceID,dfDict):
     Returns
     -------
     :obj:`numpy.ndarray`
-        A numpy.ndarray object
+        A numpy.ndarray object; 
+        a read-only view of the cached data if dfDict contains DataSourceTable objects
     """
     
     dim1_value=None
@@ -342,6 +593,12 @@ def get_value_of_dataSource(doc, dataSourceID,dfDict):
         for dataSource in dataDescription.getListOfDataSources ():
             if dataSource.getId () == dataSourceID: # expect only one data source
                 df=dfDict[dataDescription.getId()]
+                if isinstance(df, DataSourceTable):
+                    get_rows=df.rows
+                    get_column=df.column
+                else:
+                    get_rows=lambda rows: df.iloc[rows].to_numpy()
+                    get_column=lambda name, rows: df[name].iloc[rows].to_numpy()
                 dimensionDescription=dataDescription.getDimensionDescription ()
                 dim1_Description=dimensionDescription.get(0)
                 dim1_index=dim1_Description.getId() 
@@ -373,40 +630,16 @@ def get_value_of_dataSource(doc, dataSourceID,dfDict):
                     if dim1_present and (not dim2_present): 
                         # get the value(s) at index=dim1_value or all values if dim1_value is not set then subdivide the values according to startIndex and endIndex
                         # TODO: need to check if the understanding of the slice is correct   
-                        if dim1_value is not None:
-                            value=df.iloc[[dim1_value]]
-                        elif dim1_startIndex is not None and dim1_endIndex is not None:
-                            value=df.iloc[dim1_startIndex:(dim1_endIndex+1)]
-                        elif dim1_startIndex is not None and (dim1_endIndex is None):
-                            value=df.iloc[dim1_startIndex:]
-                        elif (dim1_startIndex is None) and dim1_endIndex is not None:
-                            value=df.iloc[:(dim1_endIndex+1)]
-                        else:
-                            value=df
-                        return value.to_numpy()
+                        return get_rows(_get_rows(dim1_startIndex, dim1_endIndex, dim1_value))
                     
                     elif dim2_present and (not dim1_present):
                         # get the value(s) of the column and then subdivide the values according to startIndex and endIndex
                         if dim2_value:
-                            columnName=dim2_value
-                            df_selected=df[columnName]
-                            if dim2_startIndex is not None and dim2_endIndex is not None:
-                                value=df_selected.iloc[dim2_startIndex:(dim2_endIndex+1)]
-                            elif dim2_startIndex is not None and (dim2_endIndex is None):
-                                value=df_selected.iloc[dim2_startIndex:]
-                            elif (dim2_startIndex is None) and dim2_endIndex is not None:
-                                value=df_selected.iloc[:(dim2_endIndex+1)]
-                            else:
-                                value=df_selected
-                            return value.to_numpy()
+                            return get_column(dim2_value, _get_rows(dim2_startIndex, dim2_endIndex))
                         
                     elif dim1_present and dim2_present:
                         # get a single value at index=dim1_value and column=dim2_value
-                        columnName=dim2_value
-                        df_selected=df[columnName]
-                        if dim1_value is not None:
-                            df_selected=df_selected.iloc[[float(dim1_value)]]
-                        return df_selected.to_numpy()
+                        return get_column(dim2_value, _get_rows(value=dim1_value))
                     else:
                         raise ValueError('Data source `{}` is not defined.'.format(dataSourceID))
 
@@ -620,6 +853,41 @@ def get_fit_experiments(doc,task,analyser, cellml_model,model_etree,dfDict):
 
     return fitExperiments
 
+def _resolve_fit_experiment_model(model, doc, working_dir):
+    """
+    Resolve a model of a fit experiment, apply its changes and parse it.
+
+    Parameters
+    ----------
+    model: :obj:`SedModel`
+        The model.
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    working_dir: :obj:`str`
+        working directory of the SED document (path relative to which models are located)
+
+    Raises
+    ------
+    ValueError
+    RuntimeError
+
+    Returns
+    -------
+    tuple
+        (temp_model, cellml_model, model_etree), see resolve_model_and_apply_xml_changes and parse_model.
+    """
+    try:
+        temp_model, temp_model_source, model_etree = resolve_model_and_apply_xml_changes(model, doc, working_dir) # must set save_to_file=True
+        cellml_model,parse_issues=parse_model(temp_model_source, True)
+        # cleanup modified model sources
+        os.remove(temp_model_source)
+        if not cellml_model:
+            raise RuntimeError('Model parsing failed!')
+    except ValueError as exception:
+        print('Error in resolve_model_and_apply_xml_changes or parse_model:',exception)
+        raise exception
+    return temp_model, cellml_model, model_etree
+
 def get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info={}):
     """
     Return a dictionary containing fit experiment information.
@@ -658,10 +926,17 @@ def get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info={}
     ----
     If the experimentalCondition (fitMapping) is an array, then treat it as external variable (input)
     If the experimentalCondition (fitMapping) is a scalar, then treat it as parameter with initial value equal to the scalar
+    The fit experiments with the same model and the same external variables (in the same order) 
+    share the parsed model, the analyser and the generated module, which are created once.
     """
     fitExperiments={}
+    # the resolved models, in the format of {model id: [temp_model, cellml_model or None if used by a structure, model_etree]}
+    resolved_models={}
+    # the analysed models, in the format of {(model id, external variables): (cellml_model, analyser, mtype, module)}
+    structures={}
     original_models = get_models_referenced_by_task(doc,task)
     model=original_models[0] # parameter estimation task should have only one model
+    original_source=model.getSource()
     try:
         temp_model_source=resolve_model(model, doc, working_dir)
 
@@ -673,13 +948,14 @@ def get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info={}
         if not flatModel:
             raise RuntimeError('Model flattening failed!')
         else:
-            full_path = working_dir+ model.getId()+'_flat.cellml'
-            writeCellML(flatModel, full_path)
-            model.setSource(full_path)
+            # a unique file, so that the fit experiments can be collected by several processes at the same time
+            tempfile_flat, flat_path = tempfile.mkstemp(suffix='_flat.cellml', prefix=model.getId()+'_', dir=working_dir)
+            os.close(tempfile_flat)
+            writeCellML(flatModel, flat_path)
+            model.setSource(flat_path)
 
         temp_model, temp_model_source, model_etree = resolve_model_and_apply_xml_changes(model, doc, working_dir) # must set save_to_file=True
         cellml_model,parse_issues=parse_model(temp_model_source, True)
-        os.remove(full_path)
         # cleanup modified model sources
         os.remove(temp_model_source)
         if not cellml_model:
@@ -711,16 +987,9 @@ def get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info={}
             modelReference=fitExperiment.getName ()
             model=doc.getModel(modelReference)
         fitExperiments[fitExperiment.getId()]['model']=model
-        try:
-            temp_model, temp_model_source, model_etree = resolve_model_and_apply_xml_changes(model, doc, working_dir) # must set save_to_file=True
-            cellml_model,parse_issues=parse_model(temp_model_source, True)
-            # cleanup modified model sources
-            os.remove(temp_model_source)
-            if not cellml_model:
-                raise RuntimeError('Model parsing failed!')
-        except ValueError as exception:
-            print('Error in resolve_model_and_apply_xml_changes or parse_model:',exception)
-            raise exception   
+        if model.getId() not in resolved_models:
+            resolved_models[model.getId()]=list(_resolve_fit_experiment_model(model, doc, working_dir))
+        temp_model, cellml_model, model_etree=resolved_models[model.getId()]
         sub_adjustableParameters_info={}
         adj_param_indices=[]
         for i in range(len(experimentReferences)):         
@@ -818,10 +1087,16 @@ def get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info={}
             else:
                 raise ValueError('Fit mapping type {} is not supported!'.format(fitMapping.getTypeAsString ()))
         
-        model_base_dir=os.path.dirname(temp_model.getSource())
-                         
-        analyser, issues =analyse_model_full(cellml_model,model_base_dir,external_variables_info_new)       
-        if analyser:
+        structure_key=(model.getId(), tuple((variable_id, info['component'], info['name']) for variable_id, info in external_variables_info_new.items()))
+        if structure_key not in structures:
+            if cellml_model is None: # the parsed model is used by another structure
+                temp_model, cellml_model, model_etree=_resolve_fit_experiment_model(model, doc, working_dir)
+            resolved_models[model.getId()][1]=None
+            model_base_dir=os.path.dirname(temp_model.getSource())
+                             
+            analyser, issues =analyse_model_full(cellml_model,model_base_dir,external_variables_info_new)       
+            if not analyser:
+                raise RuntimeError('Model analysis failed!')
             mtype=get_mtype(analyser)
             # write Python code to a temporary file
             # make a directory in the model_base_dir for the temporary file if it does not exist
@@ -834,10 +1109,15 @@ def get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info={}
             os.close(tempfile_py)
             # and delete temporary file
            # os.remove(full_path)
+            structures[structure_key]=(cellml_model, analyser, mtype, module)
+        cellml_model, analyser, mtype, module=structures[structure_key]
 
         fitExperiments[fitExperiment.getId()]['fitness_info']=(observables_info,observables_weight,observables_exp)
         fitExperiments[fitExperiment.getId()]['sim_setting']=sim_setting
         fitExperiments[fitExperiment.getId()].update({'cellml_model':cellml_model,'analyser':analyser, 'module':module, 'mtype':mtype,
                                                                             'external_variables_info':external_variables_info_new,
                                                                 'adj_param_indices':adj_param_indices,'parameters_values':parameters_values})      
+    # the flattened model is used by the fit experiments, cleanup after all the fit experiments are collected
+    os.remove(flat_path)
+    original_models[0].setSource(original_source)
     return fitExperiments,adjustables,adjustableParameters_info 
\ No newline at end of file
@@ -1,6 +1,8 @@
-from .sedTasker import exec_task, report_task, exec_parameterEstimationTask
+from .sedTasker import exec_task, report_task, exec_parameterEstimationTask, exec_repeated_task
+from .sedCollector import get_variables_for_task
 
-def exec_sed_doc(doc, working_dir,base_out_path, rel_out_path=None, external_variables_info={}, external_variables_values=[],ss_time={},cost_type=None):
+def exec_sed_doc(doc, working_dir,base_out_path, rel_out_path=None, external_variables_info={}, external_variables_values=[],ss_time={},cost_type=None,workers=1,
+                 fit_options=None):
     """
     Execute a SED document.
 
@@ -23,6 +25,14 @@ def exec_sed_doc(doc, working_dir,base_out_path, rel_out_path=None, external_var
         The values of the external variables to be specified [value1, value2, ...]
     ss_time: dict, optional
         The time point for steady state simulation, in the format of {fitid:time}
+    workers: int, optional
+        The number of worker processes used to execute the iterations of a repeated task
+        which resets the model, the starts of a multi-start local optimization algorithm,
+        or the batches of points of a surrogate-based optimization algorithm. 
+        Default: 1, the iterations are executed in sequence.
+    fit_options: dict, optional
+        The run options of the parameter estimation tasks, e.g., {'fit_workers': 4, 'checkpoint_dir': './checkpoints'},
+        see exec_parameterEstimationTask. Default: None, the default options (FIT_OPTIONS).
     
     """
     doc = doc.clone() # clone the document to avoid modifying the original document
@@ -46,7 +56,13 @@ def exec_sed_doc(doc, working_dir,base_out_path, rel_out_path=None, external_var
     ))
     # execute tasks
     variable_results = {}
+    range_cache = {} # the values of the ranges which do not depend on the models, shared by the repeated tasks
+    sub_task_ids = set(sub_task.getTask () for task in doc.getListOfTasks() if task.isSedRepeatedTask () 
+                       for sub_task in task.getListOfSubTasks ())
     for i_task, task in enumerate(doc.getListOfTasks()):
+        if task.getId() in sub_task_ids and len(get_variables_for_task(doc, task)) == 0:
+            # the task is only executed as a sub-task of a repeated task
+            continue
         if task.isSedTask ():
             try:
                 current_state, variable_results= exec_task(doc,task,working_dir,external_variables_info,external_variables_values,current_state=None)
@@ -56,10 +72,16 @@ def exec_sed_doc(doc, working_dir,base_out_path, rel_out_path=None, external_var
                 return           
 
         elif task.isSedRepeatedTask ():
-            raise RuntimeError('RepeatedTask not supported yet')
+            try:
+                variable_results = exec_repeated_task(doc,task,working_dir,external_variables_info,external_variables_values,workers=workers,range_cache=range_cache)
+                report_result = report_task(doc,task, variable_results, base_out_path, rel_out_path, report_formats =['csv'])
+            except Exception as exception:
+                print(exception)
+                return
         elif task.isSedParameterEstimationTask ():
             try:
-                res=exec_parameterEstimationTask(doc,task, working_dir,external_variables_info,external_variables_values,ss_time,cost_type)
+                res=exec_parameterEstimationTask(doc,task, working_dir,external_variables_info,external_variables_values,ss_time,cost_type,
+                                             workers=workers,fit_options=fit_options)
 
             except Exception as exception:
                 print(exception)
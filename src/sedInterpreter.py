@@ -350,16 +350,11 @@ def exec_repeated_task(doc,task,working_dir,external_variables_info,
             for i_sub_task, sub_task in enumerate(sub_tasks):
                 arrays.append(variable_results[var.getId()][i_main_range][i_sub_task])
 
-    padded_arrays = pad_arrays_to_consistent_shapes(arrays)
+    padded_block = pad_arrays_to_consistent_shapes(arrays, stack=True)
+    padded_block = padded_block.reshape((len(task_vars), len(main_range_values), len(sub_tasks)) + padded_block.shape[1:])
 
-    i_array = 0
-    for var in task_vars:
-        for i_main_range, _ in enumerate(main_range_values):
-            for i_sub_task, sub_task in enumerate(sub_tasks):
-                variable_results[var.getId()][i_main_range][i_sub_task] = padded_arrays[i_array]
-                i_array += 1
-
-        variable_results[var.getId()] = numpy.array(variable_results[var.getId()])
+    for i_var, var in enumerate(task_vars):
+        variable_results[var.getId()] = padded_block[i_var]
 
     # return the results of the task
     return variable_results
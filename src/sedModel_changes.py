@@ -4,7 +4,7 @@ import os
 import re
 from lxml import etree
 import enum
-from .math4sedml import compile_math, eval_math, AGGREGATE_MATH_FUNCTIONS
+from .math4sedml import compile_math, eval_math, eval_math_vectorized, AGGREGATE_MATH_FUNCTIONS
 import libsedml
 import numpy
 
@@ -567,13 +567,16 @@ def calc_data_generator_results(data_generator, variable_results):
 
     return result
 
-def resolve_range(range, model_etrees=None):
+def resolve_range(range, model_etrees=None, range_cache=None):
     """ Resolve the values of a range
 
     Args:
         range (:obj:`Range`): range
         model_etrees (:obj:`dict` of :obj:`str` to :obj:`etree._Element`): map from the ids of models to element
             trees of their sources; required to resolve variables of functional ranges
+        range_cache (:obj:`dict` of :obj:`str` to :obj:`list`, optional): map from the ids of ranges to their values,
+            e.g., shared within the execution of a SED document. Ranges which do not depend on variables of
+            the models are looked up in and added to the map, so that they are only resolved once.
 
     Returns:
         :obj:`list` of :obj:`float`: values of the range
@@ -582,22 +585,27 @@ def resolve_range(range, model_etrees=None):
         :obj:`NotImplementedError`: if range isn't an instance of :obj:`UniformRange`, :obj:`VectorRange`,
             or :obj:`FunctionalRange`.
     """
+    cacheable = range_cache is not None and not _range_depends_on_models(range)
+    if cacheable and range.getId() in range_cache:
+        return range_cache[range.getId()]
+
     if range.isSedUniformRange ():
         if range.getType() == 'linear':
-            return numpy.linspace(range.getStart(), range.getEnd(), range.getNumberofSteps() + 1).tolist()
+            values = numpy.linspace(range.getStart(), range.getEnd(), range.getNumberOfSteps() + 1).tolist()
 
         elif range.getType() == 'log':
-            return numpy.logspace(numpy.log10(range.getStart()), numpy.log10(range.getEnd()), range.getNumberofSteps() + 1).tolist()
+            values = numpy.logspace(numpy.log10(range.getStart()), numpy.log10(range.getEnd()), range.getNumberOfSteps() + 1).tolist()
 
         else:
             raise NotImplementedError('UniformRanges of type `{}` are not supported.'.format(range.getType()))
 
     elif range.isSedVectorRange ():
-        return range.getValues()
+        values = list(range.getValues())
 
     elif range.isSedFunctionalRange ():
         # compile math
-        compiled_math = compile_math(libsedml.formulaToString(range.getMath()))
+        math = libsedml.formulaToString(range.getMath())
+        compiled_math = compile_math(math)
 
         # setup workspace to evaluate math
         workspace = {}
@@ -611,16 +619,53 @@ def resolve_range(range, model_etrees=None):
                 raise NotImplementedError('Functional ranges that involve variables of non-XML-encoded models are not supported.')
             workspace[var.getId()] = get_value_of_variable_model_xml_targets(var, model_etrees)
 
-        # calculate the values of the range
-        values = []
-        for child_range_value in resolve_range(range.getRange(), model_etrees=model_etrees):
-            workspace[range.getRange().getId()] = child_range_value
-
-            value = eval_math(libsedml.formulaToString(range.getMath()), compiled_math, workspace)
-            values.append(value)
+        # calculate the values of the range; the child range is a sibling in the list of ranges of the repeated task
+        child_range = range.getParentSedObject().getParentSedObject().getRange(range.getRange())
+        child_range_values = resolve_range(child_range, model_etrees=model_etrees, range_cache=range_cache)
 
-        # return values
-        return values
+        # evaluate the math over all values of the child range at once, 
+        # fall back to evaluating value by value if the math cannot be evaluated element-wise
+        # aggregate functions and 0-d results (e.g., the math does not depend on the child range) are evaluated value by value
+        child_range_array = numpy.asarray(child_range_values, dtype=float)
+        try:
+            for aggregate_func in AGGREGATE_MATH_FUNCTIONS:
+                if re.search(r'\b' + aggregate_func + r' *\(', math):
+                    raise ValueError('Expression `{}` uses the aggregate function `{}`.'.format(math, aggregate_func))
+            values = eval_math_vectorized(math, compiled_math, dict(workspace, **{child_range.getId(): child_range_array}))
+            if values.shape != child_range_array.shape:
+                raise ValueError('Expression `{}` is not evaluated element-wise.'.format(math))
+            values = values.astype(float)
+            if not numpy.all(numpy.isfinite(values)):
+                raise ValueError('Expression `{}` has non-finite values.'.format(math))
+            values = values.tolist()
+        except ValueError:
+            values = []
+            for child_range_value in child_range_values:
+                workspace[child_range.getId()] = child_range_value
+
+                value = eval_math(math, compiled_math, workspace)
+                values.append(value)
 
     else:
-        raise NotImplementedError('Ranges of type `{}` are not supported.'.format(range.getTypeCode()))
\ No newline at end of file
+        raise NotImplementedError('Ranges of type `{}` are not supported.'.format(range.getTypeCode()))
+
+    if cacheable:
+        range_cache[range.getId()] = values
+
+    return values
+
+def _range_depends_on_models(range):
+    """ Determine whether the values of a range depend on variables of models
+
+    Args:
+        range (:obj:`Range`): range
+
+    Returns:
+        :obj:`bool`: whether the range, or the child range of a functional range, has variables
+    """
+    if range.isSedFunctionalRange ():
+        if range.getNumVariables() > 0:
+            return True
+        child_range = range.getParentSedObject().getParentSedObject().getRange(range.getRange())
+        return _range_depends_on_models(child_range)
+    return False
@@ -44,8 +44,7 @@ def writeReport(report, results, base_path, rel_path, format='csv'):
                     raise TypeError(msg)
                 data_set_data_types.append(data_set_dtype.name)
                 data_set_shapes.append(','.join(str(dim_len) for dim_len in data_set_result.shape))
-    results_array = pad_arrays_to_consistent_shapes(results_array)
-    results_array = numpy.array(results_array)
+    results_array = pad_arrays_to_consistent_shapes(results_array, stack=True)
     if format in ['csv','tsv','xlsx']:
         if results_array.ndim > 2:
             msg = 'Report has {} dimensions. Multidimensional reports cannot be exported to {}.'.format(
@@ -136,15 +135,22 @@ def readReport(report, base_path, rel_path, format='csv'):
             '\n'.join('`' + id + '`' for id in sorted(extra_data_set_ids))))
     return results
 
-def pad_arrays_to_consistent_shapes(arrays):
+def pad_arrays_to_consistent_shapes(arrays, stack=False):
     """ Pad a list of NumPy arrays to a consistent shape
 
     Args:
         arrays (:obj:`list` of :obj:`numpy.ndarray`): list of NumPy arrays
+        stack (:obj:`bool`, optional): if :obj:`True`, allocate one NaN-filled block of shape
+            ``(len(arrays),) + max_shape`` and write each array directly into its slice of the block,
+            instead of padding each array into a new array
 
     Returns:
-        :obj:`list` of :obj:`numpy.ndarray`: list of padded arrays
+        :obj:`list` of :obj:`numpy.ndarray` or :obj:`numpy.ndarray`: list of padded arrays; float64 arrays which
+            already have the consistent shape are returned without copying and may alias the inputs, other
+            arrays are converted to float64 copies. If :obj:`stack` is :obj:`True`,
+            the block whose ``i``-th entry is the ``i``-th padded array
     """
+    arrays = list(arrays)
     shapes = set()
     for array in arrays:
         if array is not None:
@@ -161,6 +167,20 @@ def pad_arrays_to_consistent_shapes(arrays):
         max_shape = max_shape + [1 if max_shape else 0] * (len(shape) - len(max_shape))
         shape = list(shape) + [1 if shape else 0] * (len(max_shape) - len(shape))
         max_shape = [max(x, y) for x, y in zip(max_shape, shape)]
+    max_shape = tuple(max_shape)
+
+    if stack:
+        padded_block = numpy.full((len(arrays),) + max_shape, numpy.nan)
+        for i_array, array in enumerate(arrays):
+            if array is None:
+                continue
+
+            shape = tuple(list(array.shape)
+                          + [1 if array.size else 0]
+                          * (len(max_shape) - array.ndim))
+            padded_block[(i_array,) + tuple(slice(0, x) for x in shape)] = array.reshape(shape)
+
+        return padded_block
 
     padded_arrays = []
     for array in arrays:
@@ -170,11 +190,10 @@ def pad_arrays_to_consistent_shapes(arrays):
         shape = tuple(list(array.shape)
                       + [1 if array.size else 0]
                       * (len(max_shape) - array.ndim))
-        array = array.astype('float64').reshape(shape)
-
-        pad_width = tuple((0, x - y) for x, y in zip(max_shape, shape))
+        array = array.astype('float64', copy=False).reshape(shape)
 
-        if pad_width:
+        if shape != max_shape:
+            pad_width = tuple((0, x - y) for x, y in zip(max_shape, shape))
             array = numpy.pad(array,
                               pad_width,
                               mode='constant',
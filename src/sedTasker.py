@@ -1,22 +1,32 @@
-from .sedCollector import get_models_referenced_by_task, get_variables_for_task, get_df_from_dataDescription, get_fit_experiments_1
-from .sedModel_changes import resolve_model_and_apply_xml_changes, get_variable_info_CellML,calc_data_generator_results,resolve_model
+from .sedCollector import get_models_referenced_by_task, get_variables_for_task, get_fit_experiments_1,\
+    get_table_from_dataDescription, get_columns_of_dataDescription
+from .sedModel_changes import resolve_model_and_apply_xml_changes, get_variable_info_CellML,calc_data_generator_results,resolve_model,\
+    resolve_range, calc_compute_model_change_new_value, get_value_of_variable_model_xml_targets, apply_changes_to_xml_model, CELLML2NAMESPACE
 from .sedEditor import get_dict_algorithm
-from .optimiser import get_KISAO_parameters_opt
+from .optimiser import get_KISAO_parameters_opt, surrogate_minimize, ensemble_sample, adaptive_metropolis, SAMPLING_ALGORITHMS
 from .analyser import analyse_model_full, get_mtype,parse_model,resolve_imports
 from .coder import writePythonCode,writeCellML
-from .simulator import getSimSettingFromSedSim, sim_UniformTimeCourse, get_observables, load_module, sim_OneStep, sim_TimeCourse,get_externals_varies
-from .sedReporter import exec_report
+from .simulator import getSimSettingFromSedSim, sim_UniformTimeCourse, get_observables, load_module, sim_OneStep, sim_TimeCourse,get_externals_varies,\
+    sim_TimeCourse_sensitivity, SCIPY_SOLVERS
+from .sedReporter import exec_report, pad_arrays_to_consistent_shapes
+from .objectives import CostLowerBound, load_evaluation_trace, _BoundedObjective, _ObjectiveCache, _ParallelObjective, _Checkpoint,\
+    _EvaluationTrace, _ToleranceSchedule, _get_bounded_objective, _get_cached_objective, _get_checkpointed_objective,\
+    _get_traced_objective, _get_scheduled_objective
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import libsedml
 import tempfile
 import os
 import sys
-from scipy.optimize import Bounds,least_squares,shgo,dual_annealing,differential_evolution,basinhopping
+from scipy.optimize import Bounds,least_squares,shgo,dual_annealing,differential_evolution,basinhopping,minimize
+from scipy.stats import qmc, chi2
 import numpy
 import copy
 import math
+import time
 
 
 
-def exec_task(doc,task,working_dir,external_variables_info={},external_variables_values=[],current_state=None):
+def exec_task(doc,task,working_dir,external_variables_info={},external_variables_values=[],current_state=None,task_vars=None):
     """ Execute a SedTask.
     The model is assumed to be in CellML format.
     The simulation type supported are UniformTimeCourse, OneStep and SteadyState.#TODO: add support for OneStep and SteadyState
@@ -36,6 +46,10 @@ def exec_task(doc,task,working_dir,external_variables_info={},external_variables
         The values of the external variables to be specified [value1, value2, ...]
     current_state: tuple, optional
         The format is (voi, states, rates, variables, current_index, sed_results)
+    task_vars: list, optional
+        The variables (SedVariable) to be recorded. 
+        Default: the variables that reference the task, 
+        a SedRepeatedTask passes its own variables to the sub-tasks it executes.
     
     Raises
     ------
@@ -52,16 +66,53 @@ def exec_task(doc,task,working_dir,external_variables_info={},external_variables
         numpy.ndarray is a 1D array of the variable values at each time point.   
     """
 
+    # get the variables recorded by the task
+    if task_vars is None:
+        task_vars = get_variables_for_task(doc, task)
+    if len(task_vars) == 0:
+        print('Task does not record any variables.')
+        raise RuntimeError('Task does not record any variables.')
+
+    prepared_task = prepare_task(doc,task,working_dir,task_vars,external_variables_info,external_variables_values)
+    return simulate_prepared_task(prepared_task, task_vars, current_state)
+
+def prepare_task(doc,task,working_dir,task_vars,external_variables_info={},external_variables_values=[]):
+    """ Prepare a SedTask for simulation, i.e., 
+    flatten the model, apply the model changes, analyse the model and load the generated Python module.
+    The prepared task can be simulated repeatedly by simulate_prepared_task.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    task: :obj:`SedTask`
+        The task to be prepared.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+    task_vars: list
+        The variables (SedVariable) to be recorded.
+    external_variables_info: dict, optional
+        The external variables to be specified, in the format of {id:{'component': , 'name': }}
+    external_variables_values: list, optional
+        The values of the external variables to be specified [value1, value2, ...]
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    dict
+        The prepared task, in the format of 
+        {'mtype': , 'module': , 'analyser': , 'cellml_model': , 'model_etree': ,
+        'observables': , 'sim_setting': , 'external_variable': }
+    """
     # get the model
     original_models = get_models_referenced_by_task(doc,task)
     if len(original_models) != 1:
         raise RuntimeError('Task must reference exactly one model.')
     
-    # get the variables recorded by the task
-    task_vars = get_variables_for_task(doc, task)
-    if len(task_vars) == 0:
-        print('Task does not record any variables.')
-        raise RuntimeError('Task does not record any variables.')
     # apply changes to the model if any
     try:
         #need to flatten the model if it is not already flat
@@ -76,7 +127,9 @@ def exec_task(doc,task,working_dir,external_variables_info={},external_variables
         if not flatModel:
             raise RuntimeError('Model flattening failed!')
         else:
-            full_path = working_dir+ sed_model.getId()+'_flat.cellml'
+            # a unique file name, so that concurrent executions (e.g., of a repeated task) do not overwrite each other
+            flat_file, full_path = tempfile.mkstemp(suffix='_flat.cellml', prefix=sed_model.getId()+"_", dir=working_dir)
+            os.close(flat_file)
             writeCellML(flatModel, full_path)
             sed_model.setSource(full_path)
 
@@ -124,15 +177,55 @@ def exec_task(doc,task,working_dir,external_variables_info={},external_variables
         print(exception)
         raise RuntimeError(exception) 
     
+    return {'mtype': mtype, 'module': module, 'analyser': analyser, 'cellml_model': cellml_model, 'model_etree': model_etree,
+            'observables': observables, 'sim_setting': sim_setting, 'external_variable': external_variable}
+
+def simulate_prepared_task(prepared_task, task_vars, current_state=None, parameters={}):
+    """ Simulate a task prepared by prepare_task.
+
+    Parameters
+    ----------
+    prepared_task: dict
+        The prepared task, in the format of 
+        {'mtype': , 'module': , 'analyser': , 'cellml_model': , 'model_etree': ,
+        'observables': , 'sim_setting': , 'external_variable': }
+    task_vars: list
+        The variables (SedVariable) to be recorded.
+    current_state: tuple, optional
+        The format is (voi, states, rates, variables, current_index, sed_results)
+    parameters: dict, optional
+        The values to override the initial values of the model variables, 
+        the format is {id:{'name': , 'component': , 'index': , 'type': , 'value': }}
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    tuple
+        (tuple, dict)
+        The current state of the simulation and the variable results of the task. 
+        The format of the current state is (voi, states, rates, variables, current_index, sed_results)
+        The format of the variable results is {sedVar_id: numpy.ndarray}
+        numpy.ndarray is a 1D array of the variable values at each time point.   
+    """
+    mtype=prepared_task['mtype']
+    module=prepared_task['module']
+    sim_setting=prepared_task['sim_setting']
+    observables=prepared_task['observables']
+    external_variable=prepared_task['external_variable']
+
     if sim_setting.type=='UniformTimeCourse':
         try:
-            current_state=sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_variable, current_state,parameters={})
+            current_state=sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_variable, current_state,parameters=parameters)
         except RuntimeError as exception:
             print(exception)
             raise RuntimeError(exception)
     elif sim_setting.type=='OneStep':
         try:
-            current_state=sim_OneStep(mtype, module, sim_setting, observables, external_variable, current_state,parameters={})
+            current_state=sim_OneStep(mtype, module, sim_setting, observables, external_variable, current_state,parameters=parameters)
         except RuntimeError as exception:
             print(exception)
             raise RuntimeError(exception)
@@ -148,6 +241,364 @@ def exec_task(doc,task,working_dir,external_variables_info={},external_variables
 
     return current_state, variable_results
 
+def exec_repeated_task(doc,task,working_dir,external_variables_info={},external_variables_values=[],task_vars=None,workers=1,range_cache=None):
+    """ Execute a SedRepeatedTask.
+    The model is assumed to be in CellML format.
+    The changes (SedSetValue) of the repeated task are applied to the models as SedChangeAttribute,
+    then the sub-tasks are executed by exec_task (or exec_repeated_task for nested repeated tasks).
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    task: :obj:`SedRepeatedTask`
+        The task to be executed.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+    external_variables_info: dict, optional
+        The external variables to be specified, in the format of {id:{'component': , 'name': }}
+    external_variables_values: list, optional
+        The values of the external variables to be specified [value1, value2, ...]
+    task_vars: list, optional
+        The variables (SedVariable) to be recorded. Default: the variables that reference the task
+    workers: int, optional
+        The number of worker processes used to execute the points of the main range.
+        Default: 1, the points are executed in sequence in the calling process.
+        The points are only executed in parallel if the repeated task resets the model (resetModel=true),
+        otherwise each point depends on the changes made by the previous points.
+        When using workers > 1, the calling script must be guarded by ``if __name__ == '__main__':``.
+    range_cache: dict, optional
+        The values of the ranges resolved within the execution of the SED document, in the format of {range_id: values}.
+        Ranges which do not depend on model variables are only resolved once, including the ranges of nested repeated tasks.
+        Default: None, a new cache is used for this task.
+        
+    Notes
+    -----
+    The changes of each sub-task (newly added in Level 4) are applied before the sub-task is executed.
+    If the changes of the repeated task and of its sub-tasks only modify the initial values of constants or states,
+    the model of each sub-task is generated once and the changes are applied as parameter overrides,
+    so that each point of the range only costs a simulation.
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed, or if the results of the sub-tasks are to be concatenated.
+
+    Returns
+    -------
+    dict
+        The variable results of the task. 
+        The format of the variable results is {sedVar_id: numpy.ndarray}
+        numpy.ndarray is an N-D array with the shape (number of main range values, number of sub-tasks, ...), 
+        the remaining dimensions are the results of the sub-tasks, padded with NaN to a consistent shape.
+    """
+    if task_vars is None:
+        task_vars = get_variables_for_task(doc, task)
+    if len(task_vars) == 0:
+        print('Task does not record any variables.')
+        raise RuntimeError('Task does not record any variables.')
+    if task.isSetConcatenate () and task.getConcatenate ():
+        print('Concatenating the results of the sub-tasks is not supported.')
+        raise RuntimeError('Concatenating the results of the sub-tasks is not supported.')
+    
+    try:
+        model_etrees = _get_model_etrees(doc, task, working_dir)
+        if range_cache is None:
+            range_cache = {}
+        range_values = {}
+        for range in task.getListOfRanges ():
+            range_values[range.getId()] = resolve_range(range, model_etrees=model_etrees, range_cache=range_cache)
+        main_range_values = range_values[task.getRangeId ()]
+    except (ValueError, NotImplementedError) as exception:
+        print(exception)
+        raise RuntimeError(exception)
+    
+    sub_tasks = sorted(task.getListOfSubTasks (), key=lambda sub_task: sub_task.getOrder ())
+    task_vars_ids = [var.getId() for var in task_vars]
+    range_points = []
+    for i_main_range, _ in enumerate(main_range_values):
+        current_range_values = {}
+        for range_id, values in range_values.items():
+            current_range_values[range_id] = values[i_main_range]
+        range_points.append(current_range_values)
+
+    if workers > 1 and task.getResetModel () and len(range_points) > 1:
+        doc_string = libsedml.writeSedMLToString(doc)
+        args = [(doc_string, task.getId(), task_vars_ids, working_dir, external_variables_info, external_variables_values, current_range_values)
+                for current_range_values in range_points]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            sub_task_results = list(executor.map(_exec_range_point_worker, args))
+    else:
+        sub_task_results = []
+        # without resetting the models, the changes of a sub-task persist to the sub-tasks of the next points,
+        # which are not covered by the parameter overrides of the prepared sub-tasks
+        if task.getResetModel () or not any(sub_task.getNumTaskChanges () for sub_task in sub_tasks):
+            prepared_sub_tasks = {}
+        else:
+            prepared_sub_tasks = None
+        iter_doc = doc.clone()
+        iter_model_etrees = copy.deepcopy(model_etrees)
+        for current_range_values in range_points:
+            # reset the models referenced by the task
+            if task.getResetModel ():
+                iter_doc = doc.clone()
+                iter_model_etrees = copy.deepcopy(model_etrees)
+            sub_task_results.append(_exec_range_point(iter_doc, task.getId(), task_vars_ids, working_dir, iter_model_etrees,
+                                                      external_variables_info, external_variables_values, current_range_values,
+                                                      prepared_sub_tasks, range_cache))
+    
+    # shape results to consistent size
+    arrays = []
+    for var_id in task_vars_ids:
+        for i_main_range, _ in enumerate(range_points):
+            for i_sub_task, _ in enumerate(sub_tasks):
+                arrays.append(sub_task_results[i_main_range][i_sub_task].get(var_id, None))
+
+    padded_block = pad_arrays_to_consistent_shapes(arrays, stack=True)
+    padded_block = padded_block.reshape((len(task_vars_ids), len(range_points), len(sub_tasks)) + padded_block.shape[1:])
+    variable_results = {}
+    for i_var, var_id in enumerate(task_vars_ids):
+        variable_results[var_id] = padded_block[i_var]
+
+    return variable_results
+
+def _get_model_etrees(doc, task, working_dir):
+    """ Get the element trees of the models referenced by a task, with the model changes applied.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    task: :obj:`SedAbstractTask`
+        The task.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+
+    Raises
+    ------
+    ValueError
+        If a model could not be resolved or modified.
+
+    Returns
+    -------
+    dict
+        The element trees of the models, in the format of {model_id: etree._ElementTree}
+    """
+    model_etrees = {}
+    for sed_model in get_models_referenced_by_task(doc, task):
+        temp_model, temp_model_source, model_etree = resolve_model_and_apply_xml_changes(sed_model, doc, working_dir, save_to_file=False)
+        model_etrees[sed_model.getId()] = model_etree
+    return model_etrees
+
+def _exec_range_point(doc, task_id, task_vars_ids, working_dir, model_etrees, external_variables_info, external_variables_values, current_range_values,
+                      prepared_sub_tasks=None, range_cache=None):
+    """ Apply the changes of a repeated task for one point of its main range and execute its sub-tasks.
+    The changes of each sub-task are applied before the sub-task is executed.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument, the changes are added to the models of this document.
+    task_id: str
+        The id of the SedRepeatedTask.
+    task_vars_ids: list
+        The ids of the variables (SedVariable) to be recorded.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+    model_etrees: dict
+        The element trees of the models, in the format of {model_id: etree._ElementTree}.
+        The changes are also applied to the element trees.
+    external_variables_info: dict
+        The external variables to be specified, in the format of {id:{'component': , 'name': }}
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    current_range_values: dict
+        The values of the ranges at this point, in the format of {range_id: value}
+    prepared_sub_tasks: dict, optional
+        The sub-tasks prepared by the previous points, in the format of {sub_task_position: (prepared_task, overrides_info)}.
+        If given, the sub-tasks whose changes only modify the initial values of constants or states 
+        are prepared once and the changes are applied as parameter overrides of the simulation,
+        instead of regenerating the model for each point. The dict is updated in place.
+        Default: None, the sub-tasks are prepared for each point.
+    range_cache: dict, optional
+        The values of the ranges resolved within the execution of the SED document, 
+        passed to the nested repeated tasks, in the format of {range_id: values}.
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    list
+        The variable results of each sub-task, in the order of the sub-tasks, 
+        in the format of [{sedVar_id: numpy.ndarray}]
+    """
+    task = doc.getTask(task_id)
+    sub_tasks = sorted(task.getListOfSubTasks (), key=lambda sub_task: sub_task.getOrder ())
+    # the changes of the sub-tasks (newly added in Level 4) are applied before each sub-task is executed 
+    # and, as the changes of the repeated task, persist until the models are reset
+    changes = [(None, i_change, change) for i_change, change in enumerate(task.getListOfTaskChanges ())]
+    new_values = _apply_set_values(doc, [change for _, _, change in changes], model_etrees, current_range_values)
+
+    sub_task_results = []
+    for i_sub_task, sub_task in enumerate(sub_tasks):
+        sub_task_changes = list(sub_task.getListOfTaskChanges ())
+        new_values.extend(_apply_set_values(doc, sub_task_changes, model_etrees, current_range_values))
+        changes.extend((i_sub_task, i_change, change) for i_change, change in enumerate(sub_task_changes))
+        # exec_task modifies the source of the model, hence execute the sub-task on a copy of the document
+        sub_doc = doc.clone()
+        itask = sub_doc.getTask(sub_task.getTask ())
+        task_vars = [var for data_generator in sub_doc.getListOfDataGenerators () 
+                     for var in data_generator.getListOfVariables () if var.getId() in task_vars_ids]
+        if itask.isSedTask () and prepared_sub_tasks is not None:
+            # the applied changes differ between the sub-tasks, hence the sub-tasks are prepared per position
+            if i_sub_task not in prepared_sub_tasks:
+                prepared_task = prepare_task(sub_doc, itask, working_dir, task_vars, external_variables_info, external_variables_values)
+                overrides_info = _get_parameter_overrides_info(prepared_task, [change for _, _, change in changes], itask.getModelReference ())
+                prepared_sub_tasks[i_sub_task] = (prepared_task, overrides_info)
+            prepared_task, overrides_info = prepared_sub_tasks[i_sub_task]
+        else:
+            overrides_info = None
+
+        if overrides_info is not None:
+            parameters = {}
+            for i_change, info in overrides_info.items():
+                parameters[changes[i_change][:2]] = dict(info, value=new_values[i_change])
+            current_state, variable_results = simulate_prepared_task(prepared_task, task_vars, current_state=None, parameters=parameters)
+        elif itask.isSedTask ():
+            current_state, variable_results = exec_task(sub_doc, itask, working_dir, external_variables_info, external_variables_values, 
+                                                        current_state=None, task_vars=task_vars)
+        elif itask.isSedRepeatedTask ():
+            variable_results = exec_repeated_task(sub_doc, itask, working_dir, external_variables_info, external_variables_values, 
+                                                  task_vars=task_vars, range_cache=range_cache)
+        else:
+            raise RuntimeError('Tasks of type {} are not supported.'.format(itask.getTypeCode ()))
+        sub_task_results.append(variable_results)
+
+    return sub_task_results
+
+def _apply_set_values(doc, changes, model_etrees, current_range_values):
+    """ Apply the changes (SedSetValue) of a repeated task or of one of its sub-tasks for one point of the main range.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument, the changes are added to the models of this document.
+    changes: list
+        The changes (SedSetValue) to be applied, in order.
+    model_etrees: dict
+        The element trees of the models, in the format of {model_id: etree._ElementTree}.
+        The changes are also applied to the element trees.
+    current_range_values: dict
+        The values of the ranges at this point, in the format of {range_id: value}
+
+    Raises
+    ------
+    RuntimeError
+        If any change could not be applied.
+
+    Returns
+    -------
+    list
+        The new values of the changes, in the order of the changes.
+    """
+    new_values = []
+    try:
+        for change in changes:
+            if change.isSetSymbol ():
+                raise NotImplementedError('Set value changes of symbols is not supported.')
+            variable_values = {}
+            for variable in change.getListOfVariables ():
+                variable_values[variable.getId()] = get_value_of_variable_model_xml_targets(variable, model_etrees)
+            new_value = calc_compute_model_change_new_value(change, variable_values=variable_values, range_values=current_range_values)
+            new_values.append(new_value)
+            if new_value == int(new_value):
+                new_value = str(int(new_value))
+            else:
+                new_value = str(new_value)
+            sed_model = doc.getModel(change.getModelReference())
+            change_attribute = sed_model.createChangeAttribute()
+            change_attribute.setTarget(change.getTarget())
+            change_attribute.setNewValue(new_value)
+            if model_etrees.get(sed_model.getId()) is not None:
+                temp_model = sed_model.clone()
+                temp_model.getListOfChanges ().clear()
+                temp_model.addChange(change_attribute)
+                apply_changes_to_xml_model(temp_model, model_etrees[sed_model.getId()])
+    except (ValueError, NotImplementedError) as exception:
+        print(exception)
+        raise RuntimeError(exception)
+    return new_values
+
+def _get_parameter_overrides_info(prepared_task, changes, model_id):
+    """ Get the information to apply the changes of a repeated task as parameter overrides of a prepared task.
+    A change can be applied as a parameter override 
+    if it targets the initial value of a constant or a state, 
+    and the variable is not used as the initial value of another variable.
+
+    Parameters
+    ----------
+    prepared_task: dict
+        The prepared task, see prepare_task.
+    changes: list
+        The changes (SedSetValue) of the repeated task and of its sub-tasks applied before the sub-task, in order.
+    model_id: str
+        The id of the model referenced by the prepared task, 
+        the changes to other models are not relevant.
+
+    Returns
+    -------
+    dict or None
+        The information of the parameter overrides, in the format of 
+        {change_index: {'name': , 'component': , 'index': , 'type': }};
+        None if any relevant change cannot be applied as a parameter override.
+    """
+    model_etree = prepared_task['model_etree']
+    initial_value_references = set(element.get('initial_value') for element in 
+                                   model_etree.xpath('//cellml:variable[@initial_value]', namespaces=CELLML2NAMESPACE))
+    overrides_info = {}
+    for i_change, change in enumerate(changes):
+        if change.getModelReference() != model_id:
+            continue
+        if change.getTarget().rpartition('/@')[-1] != 'initial_value':
+            return None
+        try:
+            variable_info = get_variable_info_CellML([change], model_etree)
+            observables = get_observables(prepared_task['analyser'], prepared_task['cellml_model'], variable_info)
+        except ValueError:
+            return None
+        info = list(observables.values())[0]
+        if info['type'] not in ['constant', 'state'] or info['name'] in initial_value_references:
+            return None
+        overrides_info[i_change] = info
+    return overrides_info
+
+_WORKER_PREPARED_SUB_TASKS = {}
+
+def _exec_range_point_worker(args):
+    """ Execute one point of the main range of a repeated task in a worker process.
+    The SED document is passed as a string, since libsedml objects cannot be pickled.
+
+    Parameters
+    ----------
+    args: tuple
+        (doc_string, task_id, task_vars_ids, working_dir, external_variables_info, external_variables_values, current_range_values)
+
+    Returns
+    -------
+    list
+        The variable results of each sub-task, in the format of [{sedVar_id: numpy.ndarray}]
+    """
+    doc_string, task_id, task_vars_ids, working_dir, external_variables_info, external_variables_values, current_range_values = args
+    doc = libsedml.readSedMLFromString(doc_string)
+    model_etrees = _get_model_etrees(doc, doc.getTask(task_id), working_dir)
+    # the sub-tasks prepared by this worker process, reused by the next points of the same repeated task
+    prepared_sub_tasks = _WORKER_PREPARED_SUB_TASKS.setdefault((hash(doc_string), task_id), {})
+    return _exec_range_point(doc, task_id, task_vars_ids, working_dir, model_etrees, external_variables_info, external_variables_values, current_range_values,
+                             prepared_sub_tasks)
+
 def report_task(doc,task, variable_results, base_out_path, rel_out_path, report_formats =['csv']):
     """ Generate the outputs of a SedTask.
 
@@ -216,7 +667,39 @@ def report_task(doc,task, variable_results, base_out_path, rel_out_path, report_
 
     return report_results
 
-def exec_parameterEstimationTask( doc,task, working_dir,external_variables_info={},external_variables_values=[],ss_time={},cost_type=None):
+# The default run options of the parameter estimation tasks, see exec_parameterEstimationTask
+FIT_OPTIONS = {'objective_cache_size': None, 'bound_slack': None, 'fit_workers': 1, 'fit_executor': 'process',
+               'checkpoint_dir': None, 'checkpoint_interval': 60, 'resume': False, 'trace_dir': None, 'trace_capacity': 100000,
+               'tolerance_factors': None, 'tolerance_patience': None, 'csv_engine': None}
+
+def _get_fit_options(fit_options=None):
+    """ Get the run options of a parameter estimation task, completed by the default options (FIT_OPTIONS).
+
+    Parameters
+    ----------
+    fit_options: dict, optional
+        The run options, see exec_parameterEstimationTask. Default: None, the default options.
+
+    Raises
+    ------
+    ValueError
+        If an option is not supported.
+
+    Returns
+    -------
+    dict
+        The run options, in the format of FIT_OPTIONS.
+    """
+    options=dict(FIT_OPTIONS)
+    if fit_options:
+        unsupported=[key for key in fit_options if key not in FIT_OPTIONS]
+        if unsupported:
+            raise ValueError('The run options {} are not supported!'.format(unsupported))
+        options.update(fit_options)
+    return options
+
+def exec_parameterEstimationTask( doc,task, working_dir,external_variables_info={},external_variables_values=[],ss_time={},cost_type=None,
+                                 workers=1,fit_options=None):
     """
     Execute a SedTask of type ParameterEstimationTask.
     The model is assumed to be in CellML format.
@@ -240,15 +723,60 @@ def exec_parameterEstimationTask( doc,task, working_dir,external_variables_info=
         The time point for steady state simulation, in the format of {fitid:time}
     cost_type: str, optional
         The cost function to be used for the optimisation. Default: None
+    workers: int, optional
+        The number of worker processes running the starts of the multi-start local optimization algorithm,
+        simulating the batches of points proposed by the surrogate-based optimization algorithm,
+        or the proposals of the walkers of the sampling algorithms.
+        Default: 1, the starts are run in sequence and the points are proposed one at a time.
+    fit_options: dict, optional
+        The run options, the missing ones take their default values in FIT_OPTIONS:
+
+        * 'objective_cache_size' (int): the maximum number of objective function values kept in a least recently used cache,
+          so that the parameter vectors revisited by the optimiser are not simulated again. Default: None, no cache is used.
+        * 'bound_slack' (float): if given, the evolutionary algorithm evaluates the objective function with a bound equal to
+          bound_slack times the best cost found so far, see objective_function. 
+          The stopped evaluations are returned to the optimiser as inf, so that they only lose the selection,
+          and the local search polishing the result evaluates the objective function completely.
+          The other algorithms use their objective function values beyond selection and always evaluate it completely.
+          The number of stopped evaluations is reported in res.number_of_aborted_evaluations. Default: None
+        * 'fit_workers' (int): the number of workers evaluating the fit experiments of one objective function call concurrently.
+          Default: 1, the fit experiments are evaluated in sequence.
+        * 'fit_executor' (str): 'process' or 'thread', the type of these workers. Default: 'process'.
+          When using process workers, the calling script must be guarded by ``if __name__ == '__main__':``.
+        * 'checkpoint_dir' (str): if given, the parameter values and the costs of the evaluations of the objective function, 
+          the best point and the state of the random number generator are saved to {checkpoint_dir}/{task id}_checkpoint.npz,
+          every checkpoint_interval seconds and at the end of the optimisation, see objectives._Checkpoint. Default: None
+        * 'checkpoint_interval' (float): the minimum time in seconds between two checkpoints. Default: 60
+        * 'resume' (bool): if True and the checkpoint file exists, the optimisation is resumed from the checkpoint. Default: False
+        * 'trace_dir' (str): if given, each simulation of the fit experiments (the parameter values, the cost, 
+          the cost of each fit experiment, the wall time and whether the simulation failed or was stopped by the bound) 
+          is recorded and saved to {trace_dir}/{task id}_trace.npz, see load_evaluation_trace. Default: None
+        * 'trace_capacity' (int): the maximum number of evaluations kept in the trace, the oldest ones are overwritten. 
+          Default: 100000
+        * 'tolerance_factors' (list): if given, e.g., [1e3, 1e2, 1e1], the candidates are first evaluated with the tolerances 
+          of the integrators multiplied by the first factor, then by the following ones and finally with the tolerances of the task, 
+          see objectives._ToleranceSchedule. Not used by the sampling algorithms and by the algorithms run in worker processes. 
+          Default: None
+        * 'tolerance_patience' (int): the number of evaluations without improvement of the best cost before the tolerances 
+          are tightened by the global optimisers. Default: None, 50 times the number of adjustable parameters
+        * 'csv_engine' (str): the parser engine of the data source files, e.g., 'c' or 'pyarrow'. 
+          Default: None, the default engine of pandas.read_csv
 
     Raises
     ------
     RuntimeError
         If any operation failed.
+    ValueError
+        If a run option is not supported.
 
     Returns
     -------
     res: scipy.optimize.OptimizeResult
+        If the objective cache is used, res.objective_cache contains the hits and misses of the cache.
+        For the multi-start local optimization algorithm, res is the result of the best start,
+        and res.minima contains the distinct minima found, ranked by their cost (see _rank_minima).
+        For the sampling algorithms (ensemble sampler and adaptive Metropolis), res.x is the maximum a posteriori sample
+        and res.chain contains the samples, see _sample_posterior.
 
     """ 	    
     # get the variables recorded by the task
@@ -256,10 +784,15 @@ def exec_parameterEstimationTask( doc,task, working_dir,external_variables_info=
     if len(task_vars) == 0:
         print('Task does not record any variables.')
         raise RuntimeError('Task does not record any variables.')   
+    options=_get_fit_options(fit_options)
+    objective_cache_size=options['objective_cache_size']
+    bound_slack=options['bound_slack']
+    trace_dir=options['trace_dir']
+    checkpoint_dir=options['checkpoint_dir']
+    tolerance_factors=options['tolerance_factors']
+    csv_engine=options['csv_engine']
     # get optimisation settings and fit experiments
-    dfDict={}
-    for dataDescription in doc.getListOfDataDescriptions() :
-        dfDict.update({dataDescription.getId():get_df_from_dataDescription(dataDescription, working_dir)})
+    dfDict=_get_dfDict(doc, working_dir, csv_engine)
     dict_algorithm=get_dict_algorithm(task.getAlgorithm())
     method, opt_parameters=get_KISAO_parameters_opt(dict_algorithm)
     if 'tol' in opt_parameters:
@@ -273,152 +806,1624 @@ def exec_parameterEstimationTask( doc,task, working_dir,external_variables_info=
     fitExperiments,adjustables,adjustableParameters_info=get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info)
     bounds=Bounds(adjustables[0],adjustables[1])
     initial_value=adjustables[2]
-    if method=='global optimization algorithm':
-        res= shgo(objective_function, bounds,args=(external_variables_values, fitExperiments, doc, ss_time,cost_type),
-                               options={'ftol': tol, 'maxiter': maxiter})
-    elif method=='simulated annealing':
-        res=dual_annealing(objective_function, bounds,args=(external_variables_values, fitExperiments, doc, ss_time,cost_type),maxiter=maxiter, x0=initial_value)
-    elif method=='evolutionary algorithm':
-        res=differential_evolution(objective_function, bounds,args=(external_variables_values, fitExperiments, doc, ss_time,cost_type),maxiter=maxiter, tol=tol,x0=initial_value)
-    elif method=='random search':
-        res=basinhopping(objective_function, initial_value,minimizer_kwargs={'args':(external_variables_values, fitExperiments, doc, ss_time,cost_type)}) # cannot use bounds
-    elif method=='local optimization algorithm':
-        res=least_squares(objective_function, initial_value, args=(external_variables_values, fitExperiments, doc, ss_time,cost_type), 
-                 bounds=bounds, ftol=tol, gtol=tol, xtol=tol, max_nfev=maxiter)
-    else:
-        raise RuntimeError('Optimisation method not supported!')
+    # the random number generator of the stochastic optimisers, its initial state is saved in the checkpoints
+    rng=numpy.random.default_rng(opt_parameters.get('seed'))
+    checkpoint=None
+    if checkpoint_dir is not None:
+        checkpoint=_Checkpoint(os.path.join(checkpoint_dir, task.getId()+'_checkpoint.npz'), method, rng, options['checkpoint_interval'], options['resume'])
+        if not checkpoint.replayable and checkpoint.best_x is not None:
+            # the residuals of least_squares are not recorded, it is restarted from the best point
+            initial_value=checkpoint.best_x
+    trace=None
+    if trace_dir is not None:
+        trace=_EvaluationTrace(os.path.join(trace_dir, task.getId()+'_trace.npz'), [parameter['component']+'.'+parameter['name'] for parameter in adjustableParameters_info.values()], 
+                               list(fitExperiments.keys()), options['trace_capacity'])
+    schedule=None
+    if tolerance_factors is not None:
+        schedule=_ToleranceSchedule(fitExperiments, tolerance_factors, 
+                                    options['tolerance_patience'] if options['tolerance_patience'] is not None else 50*len(initial_value))
+    executor=_get_fit_experiment_executor(doc, task, working_dir, external_variables_info, fitExperiments, 
+                                          options['fit_workers'], options['fit_executor'], csv_engine)
+    try:
+        if method=='global optimization algorithm':
+            objective=_get_scheduled_objective(_get_objective('cost', executor, None, trace, checkpoint, objective_cache_size), schedule)
+            res= shgo(objective, bounds,args=(external_variables_values, fitExperiments, doc, ss_time,cost_type),
+                                   options={'ftol': tol, 'maxiter': maxiter})
+        elif method=='simulated annealing':
+            objective=_get_scheduled_objective(_get_objective('cost', executor, None, trace, checkpoint, objective_cache_size), schedule)
+            res=dual_annealing(objective, bounds,args=(external_variables_values, fitExperiments, doc, ss_time,cost_type),maxiter=maxiter, x0=initial_value, seed=rng)
+        elif method=='evolutionary algorithm':
+            objective=_get_scheduled_objective(_get_objective('cost', executor, bound_slack, trace, checkpoint, objective_cache_size), schedule)
+            res=differential_evolution(objective, bounds,args=(external_variables_values, fitExperiments, doc, ss_time,cost_type),maxiter=maxiter, tol=tol,x0=initial_value, seed=rng,
+                                       polish=bound_slack is None)
+            if bound_slack is not None:
+                res=_polish(objective, res, bounds, (external_variables_values, fitExperiments, doc, ss_time,cost_type))
+        elif method=='random search':
+            objective=_get_scheduled_objective(_get_objective('cost', executor, None, trace, checkpoint, objective_cache_size), schedule)
+            res=basinhopping(objective, initial_value,minimizer_kwargs={'args':(external_variables_values, fitExperiments, doc, ss_time,cost_type)}, seed=rng) # cannot use bounds
+        elif method=='local optimization algorithm':
+            res, objective=_least_squares(initial_value, bounds, (external_variables_values, fitExperiments, doc, ss_time,cost_type),
+                                          tol, maxiter, executor, objective_cache_size, checkpoint, trace, schedule)
+        elif method=='multi-start local optimization algorithm':
+            starting_points=_get_starting_points(bounds, initial_value, opt_parameters['number_of_runs'], rng)
+            objective=None
+            if workers>1:
+                # the starts are run in worker processes, each with its own copies of the fit experiments
+                with ProcessPoolExecutor(max_workers=min(workers,len(starting_points)), initializer=_init_fit_experiment_worker,
+                                         initargs=(libsedml.writeSedMLToString(doc), task.getId(), working_dir, external_variables_info, csv_engine)) as start_executor:
+                    results=list(start_executor.map(_least_squares_worker, 
+                                                    [(x0, bounds.lb, bounds.ub, external_variables_values, ss_time, cost_type, tol, maxiter) 
+                                                     for x0 in starting_points]))
+            else:
+                results=[_least_squares(x0, bounds, (external_variables_values, fitExperiments, doc, ss_time,cost_type),
+                                        tol, maxiter, executor, objective_cache_size, checkpoint, trace, schedule)[0] for x0 in starting_points]
+            res=_rank_minima(results)
+        elif method=='surrogate-based optimization algorithm':
+            # the maximum number of iterations is the number of simulations, 100 by default
+            objective=_get_scheduled_objective(_get_objective('cost', executor, None, trace, checkpoint, objective_cache_size), schedule)
+            surrogate_parameters={'maxfev':int(opt_parameters.get('maxiter',100)),'seed':rng,'batch_size':max(workers,1)}
+            if workers>1:
+                # the batches of proposed points are simulated in worker processes
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_fit_experiment_worker,
+                                         initargs=(libsedml.writeSedMLToString(doc), task.getId(), working_dir, external_variables_info, csv_engine)) as batch_executor:
+                    map_function=_get_batch_objective(batch_executor, fitExperiments, external_variables_values, ss_time, cost_type, trace, checkpoint)
+                    if schedule is not None:
+                        map_function=schedule.wrap_map(map_function)
+                    res=surrogate_minimize(objective, bounds, (external_variables_values, fitExperiments, doc, ss_time,cost_type), 
+                                           x0=initial_value, map_function=map_function, **surrogate_parameters)
+            else:
+                res=surrogate_minimize(objective, bounds, (external_variables_values, fitExperiments, doc, ss_time,cost_type), 
+                                       x0=initial_value, **surrogate_parameters)
+        elif method in SAMPLING_ALGORITHMS:
+            objective=_get_objective('cost', executor, None, trace, checkpoint, objective_cache_size)
+            log_posterior=_LogPosterior(objective, bounds, fitExperiments, (external_variables_values, fitExperiments, doc, ss_time,cost_type), cost_type)
+            if workers>1:
+                # the proposals of the walkers are simulated in worker processes
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_fit_experiment_worker,
+                                         initargs=(libsedml.writeSedMLToString(doc), task.getId(), working_dir, external_variables_info, csv_engine)) as batch_executor:
+                    log_posterior.map_function=_get_batch_objective(batch_executor, fitExperiments, external_variables_values, ss_time, cost_type, trace, checkpoint)
+                    res=_sample_posterior(method, log_posterior, bounds, initial_value, opt_parameters, maxiter, rng, workers, checkpoint)
+            else:
+                res=_sample_posterior(method, log_posterior, bounds, initial_value, opt_parameters, maxiter, rng, workers, checkpoint)
+        else:
+            raise RuntimeError('Optimisation method not supported!')
+        if isinstance(objective,_ToleranceSchedule):
+            objective.finish(res, (external_variables_values, fitExperiments, doc, ss_time,cost_type))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if checkpoint is not None:
+            checkpoint.save()
+        if trace is not None:
+            trace.save()
+        if schedule is not None:
+            schedule.restore()
     
+    if schedule is not None:
+        res.number_of_evaluations_per_tolerance=schedule.number_of_evaluations
+    if isinstance(objective,_ToleranceSchedule):
+        objective=objective.function
+    if isinstance(objective,_ObjectiveCache):
+        res.objective_cache=objective.info()
+        objective=objective.function
+    if isinstance(objective,_Checkpoint):
+        objective=objective.function
+    if checkpoint is not None:
+        res.checkpoint=checkpoint.path
+        res.number_of_replayed_evaluations=checkpoint.number_of_replayed_evaluations
+    if isinstance(objective,_BoundedObjective):
+        res.number_of_aborted_evaluations=objective.number_of_aborted_evaluations
+        objective=objective.function
+    if isinstance(objective,_EvaluationTrace):
+        objective=objective.function
+    if trace is not None:
+        res.trace=trace.path
     i=0
     for parameter in adjustableParameters_info.values():
         print('The estimated value for variable {} in component {} is:'.format(parameter['name'],parameter['component']))
         print(res.x[i])
         i+=1
-    print('Values of objective function at the solution: {}'.format(res.fun))
+    if method=='local optimization algorithm' or method=='multi-start local optimization algorithm':
+        print('Values of objective function at the solution: {}'.format(numpy.sum(res.fun**2)))
+    elif method in SAMPLING_ALGORITHMS:
+        print('Values of objective function at the maximum a posteriori sample: {}'.format(res.fun))
+        print('The posterior mean and standard deviation are: {}, {}'.format(res.posterior_mean, res.posterior_std))
+    else:
+        print('Values of objective function at the solution: {}'.format(res.fun))
     print('The full optimization result is:')
     print(res)
     return res
 
-def objective_function(param_vals, external_variables_values, fitExperiments, doc, ss_time,cost_type=None):
-    """ Objective function for parameter estimation task.
-    The model is assumed to be in CellML format.
+def exec_profileLikelihood(doc, task, working_dir, external_variables_info={}, external_variables_values=[], ss_time={}, cost_type=None,
+                           optimum=None, number_of_points=21, confidence_level=0.95, workers=1, fit_options=None):
+    """
+    Profile the likelihood of each adjustable parameter of a SedTask of type ParameterEstimationTask:
+    the parameter is fixed at each point of a grid within its bounds and the other adjustable parameters are re-optimised
+    by the local optimization algorithm (see _least_squares), starting from the solution at the neighbouring grid point.
+    The fit experiments are collected once, the profiles are computed from the optimum upwards and downwards,
+    and these sweeps are spread over worker processes.
+    The likelihood is the one of the sampling algorithms (see _LogPosterior), 
+    so that the confidence threshold of the cost is cost(optimum)*exp(chi2(1).ppf(confidence_level)/n) for 'MSE',
+    where n is the number of data points (2n for the other costs).
+    For 'MSE', this likelihood assumes that the noise variance of a data point is proportional to n_k/weight,
+    where n_k is the number of data points of its data generator (see _LogPosterior).
 
     Parameters
     ----------
-    param_vals: list
-        The values of the adjustable parameters to be specified [value1, value2, ...]
-    external_variables_values: list
-        The values of the external variables to be specified [value1, value2, ...]
-    fitExperiments: dict
-        The fit experiments to be specified, 
-        in the format of {fitid:{'external_variables_info': , 'cellml_model': , 'analyser': , 
-        'mtype': , 'module': , 'fitness_info': , 'parameters': , 'parameters_values': , 
-        'adj_param_indices': , 'type': , 'sim_setting': }}
     doc: :obj:`SedDocument`
         An instance of SedDocument
-    ss_time: dict
+    task: :obj:`SedParameterEstimationTask `
+        The parameter estimation task.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+    external_variables_info: dict, optional
+        The external variables to be specified, in the format of {id:{'component': , 'name': }}
+    external_variables_values: list, optional
+        The values of the external variables to be specified [value1, value2, ...]
+    ss_time: dict, optional
         The time point for steady state simulation, in the format of {fitid:time}
+    cost_type: str, optional
+        The cost function to be used. Default: None
+    optimum: list, optional
+        The estimated values of the adjustable parameters. 
+        Default: None, the parameters are estimated by the local optimization algorithm from their initial values.
+    number_of_points: int, optional
+        The number of grid points of each parameter, in addition to the optimum. 
+        The grid is logarithmic for the parameters with positive bounds spanning more than three orders of magnitude. Default: 21
+    confidence_level: float, optional
+        The confidence level of the threshold. Default: 0.95
+    workers: int, optional
+        The number of worker processes computing the profiles. Default: 1
+    fit_options: dict, optional
+        The run options, see exec_parameterEstimationTask. Only 'fit_workers' (used when workers is 1), 
+        'fit_executor' and 'csv_engine' are used. Default: None, the default options.
 
     Raises
     ------
     RuntimeError
         If any operation failed.
+    ValueError
+        If a run option is not supported.
 
     Returns
     -------
-    float
-        The sum of residuals of all fit experiments.
+    dict
+        The profiles, in the format of {'component.name': {'values': numpy.ndarray, 'cost': numpy.ndarray, 
+        'x': numpy.ndarray (number of grid points, number of adjustable parameters), 'threshold': float, 
+        'confidence_interval': (float, float)}}, sorted by the values of the parameter.
+        The ends of the confidence interval are nan if the profile does not cross the threshold within the bounds,
+        i.e., if the parameter is not identifiable on that side.
     """
-    residuals_sum=0
-    sed_results={}
-    for fitid,fitExperiment in fitExperiments.items():
-        sub_param_vals=[]
-        external_variables_info=fitExperiment['external_variables_info']
-        cellml_model=fitExperiment['cellml_model']
-        analyser=fitExperiment['analyser']
-        mtype=fitExperiment['mtype']
-        module=fitExperiment['module']
-        fitness_info=fitExperiment['fitness_info']
-        parameters_info=fitExperiment['parameters']
-        parameters_values=fitExperiment['parameters_values']         
-        for param_index in fitExperiment['adj_param_indices']:
-            sub_param_vals.append(param_vals[param_index])
-        simulation_type=fitExperiment['type']
-        sim_setting=fitExperiment['sim_setting']
-        observables_info=fitness_info[0]
-        observables=get_observables(analyser,cellml_model,observables_info)
-        parameters=get_observables(analyser,cellml_model,parameters_info)
-        observables_weight=fitness_info[1]
-        observables_exp=fitness_info[2]       
-        if simulation_type=='timeCourse':
-            external_variables_values_extends=external_variables_values+sub_param_vals+parameters_values    
-            try:
-                external_module=get_externals_varies(analyser, cellml_model, external_variables_info, external_variables_values_extends)
-            except ValueError as exception:
-                print(exception)
-                raise RuntimeError(exception)
-            try:
-                current_state=sim_TimeCourse(mtype, module, sim_setting, observables, external_module,current_state=None,parameters=parameters)
-                sed_results = copy.deepcopy(current_state[-1])
-            except RuntimeError as exception:
-                print(exception)
-                return 1e12
-
-        elif simulation_type=='steadyState':
-            observable_exp_temp=observables_exp[list(observables_exp.keys())[0]]
-            for i in range(len(observable_exp_temp)): # assume all observables and experimental conditions have the same number of data points
-                sim_setting.step=ss_time[fitid]
-                sim_setting.output_start_time=sim_setting.step 
-                sim_setting.output_end_time=sim_setting.step
-                sim_setting.number_of_steps=0
-                parameters_value=[]
-                for parameter in parameters_values:
-                    parameters_value.append(parameter[i])
-                external_variables_values_extends=external_variables_values+sub_param_vals+parameters_value
-                try:
-                    external_module=get_externals_varies(analyser, cellml_model, external_variables_info, external_variables_values_extends)
-                except ValueError as exception:
-                    print(exception)
-                    raise RuntimeError(exception)
-                if i==0:
-                    try:
-                        #current_state=sim_OneStep(mtype, module, sim_setting, observables, external_module,current_state=None,parameters=parameters)
-                        current_state=sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_module,current_state=None,parameters=parameters)
-                        sed_results = copy.deepcopy(current_state[-1])
-                    except RuntimeError as exception:
-                        print(exception)
-                        return 1e12
-                else:
-                    try:
-                      #  current_state=sim_OneStep(mtype, module, sim_setting, observables, external_module,current_state=current_state,parameters=parameters)
-                        current_state=sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_module,current_state=current_state,parameters=parameters)
-                        for key, value in current_state[-1].items():
-                            sed_results[key]=numpy.append(sed_results[key],value)
-                    except RuntimeError as exception:
-                        print(exception)
-                        return 1e12
+    options=_get_fit_options(fit_options)
+    csv_engine=options['csv_engine']
+    dfDict=_get_dfDict(doc, working_dir, csv_engine)
+    dict_algorithm=get_dict_algorithm(task.getAlgorithm())
+    method, opt_parameters=get_KISAO_parameters_opt(dict_algorithm)
+    tol=opt_parameters.get('tol', 1e-8)
+    maxiter=int(opt_parameters.get('maxiter', 1000))
+    fitExperiments,adjustables,adjustableParameters_info=get_fit_experiments_1(doc,task,working_dir,dfDict,external_variables_info)
+    bounds=Bounds(adjustables[0],adjustables[1])
+    args=(external_variables_values, fitExperiments, doc, ss_time, cost_type)
+    executor=_get_fit_experiment_executor(doc, task, working_dir, external_variables_info, fitExperiments, 
+                                          options['fit_workers'] if workers<=1 else 1, options['fit_executor'], csv_engine)
+    try:
+        if optimum is None:
+            optimum=_least_squares(adjustables[2], bounds, args, tol, maxiter, executor)[0].x
+        optimum=numpy.asarray(optimum, dtype=float)
+        optimal_cost=numpy.sum(_get_parallel_objective('residuals',executor)(list(optimum), *args)**2)
+        sweeps=[]
+        for index in range(len(optimum)):
+            grid=_get_profile_grid(bounds.lb[index], bounds.ub[index], optimum[index], number_of_points)
+            center=int(numpy.searchsorted(grid, optimum[index]))
+            sweeps.append((index, grid[center:]))
+            sweeps.append((index, grid[center::-1]))
+        if workers>1:
+            with ProcessPoolExecutor(max_workers=min(workers,len(sweeps)), initializer=_init_fit_experiment_worker,
+                                     initargs=(libsedml.writeSedMLToString(doc), task.getId(), working_dir, external_variables_info, csv_engine)) as sweep_executor:
+                results=list(sweep_executor.map(_profile_sweep_worker, 
+                                                [(index, values, optimum, bounds.lb, bounds.ub, external_variables_values, ss_time, cost_type, tol, maxiter)
+                                                 for index, values in sweeps]))
         else:
-            raise RuntimeError('Simulation type not supported!')
-        
-        residuals={}
-        for key, exp_value in observables_exp.items():
-            dataGenerator=doc.getDataGenerator(key)
-            sim_value=calc_data_generator_results(dataGenerator, sed_results)
-            if cost_type=='AE':
-                residuals[key]=abs(sim_value-exp_value)
-                residuals_sum+=numpy.sum(residuals[key]*observables_weight[key])
-            elif cost_type=='MIN-MAX':
-                residuals[key]=abs(sim_value-exp_value)/(max(exp_value)-min(exp_value))
-                residuals_sum+=numpy.sum(residuals[key]*observables_weight[key])
-            elif cost_type=='Z-SCORE':
-                residuals[key]=abs(sim_value-exp_value)/numpy.std(exp_value)
-                residuals_sum+=numpy.sum(residuals[key]*observables_weight[key])
-            elif cost_type is None or cost_type=='MSE':
-                # MSE is the default cost function
-                residuals[key]=(sim_value-exp_value)**2
-                residuals_sum+=numpy.sum(residuals[key]*observables_weight[key])/len(exp_value)              
-            else:
-                raise RuntimeError('Cost type not supported!')
-                
-        if math.isnan(residuals_sum):
-            return 1e12
-    return residuals_sum
\ No newline at end of file
+            results=[_profile_sweep(index, values, optimum, bounds, args, tol, maxiter, executor) for index, values in sweeps]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    n_residuals=len(_get_failed_residuals(fitExperiments))
+    exponent=n_residuals/2 if cost_type is None or cost_type=='MSE' else n_residuals
+    threshold=optimal_cost*numpy.exp(chi2(1).ppf(confidence_level)/(2*exponent))
+    profiles={}
+    for index, parameter in enumerate(adjustableParameters_info.values()):
+        # the upward sweep and the downward sweep without the optimum
+        up, down=results[2*index], results[2*index+1]
+        values=numpy.concatenate([down[0][:0:-1], up[0]])
+        cost=numpy.concatenate([down[1][:0:-1], up[1]])
+        x=numpy.concatenate([down[2][:0:-1], up[2]])
+        profiles[parameter['component']+'.'+parameter['name']]={'values':values,'cost':cost,'x':x,'threshold':threshold,
+                                                                 'confidence_interval':_get_confidence_interval(values, cost, optimum[index], threshold)}
+    return profiles
+
+def _get_profile_grid(lower_bound, upper_bound, value, number_of_points):
+    """ Get the grid of a profile: number_of_points points within the bounds and the optimal value, sorted.
+
+    Parameters
+    ----------
+    lower_bound: float
+        The lower bound of the parameter.
+    upper_bound: float
+        The upper bound of the parameter.
+    value: float
+        The optimal value of the parameter.
+    number_of_points: int
+        The number of points within the bounds.
+
+    Returns
+    -------
+    numpy.ndarray
+        The grid.
+    """
+    if lower_bound>0 and upper_bound>1e3*lower_bound:
+        grid=numpy.geomspace(lower_bound, upper_bound, number_of_points)
+    else:
+        grid=numpy.linspace(lower_bound, upper_bound, number_of_points)
+    return numpy.unique(numpy.append(grid, value))
+
+def _get_confidence_interval(values, cost, value, threshold):
+    """ Get the confidence interval of a parameter from its profile, 
+    where the profile crosses the threshold on each side of the optimum, by linear interpolation.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        The grid of the parameter, sorted.
+    cost: numpy.ndarray
+        The profile.
+    value: float
+        The optimal value of the parameter.
+    threshold: float
+        The confidence threshold of the cost.
+
+    Returns
+    -------
+    tuple
+        (float, float) the ends of the interval, nan if the profile does not cross the threshold.
+    """
+    ends=[]
+    for side in [values<=value, values>=value]:
+        side_values, side_cost=values[side], cost[side]
+        if side_values[0]<value: # the lower end, from the optimum downwards
+            side_values, side_cost=side_values[::-1], side_cost[::-1]
+        above=numpy.nonzero(side_cost>threshold)[0]
+        if len(above)==0 or above[0]==0:
+            ends.append(numpy.nan)
+            continue
+        i=above[0]
+        ends.append(numpy.interp(threshold, [side_cost[i-1], side_cost[i]], [side_values[i-1], side_values[i]]))
+    return tuple(ends)
+
+def _profile_sweep(index, values, optimum, bounds, args, tol, maxiter, executor=None):
+    """ Profile a parameter along a sweep of its values, starting from the optimum.
+    At each value, the other parameters are re-optimised from their values at the previous point.
+
+    Parameters
+    ----------
+    index: int
+        The index of the profiled parameter.
+    values: numpy.ndarray
+        The values of the parameter, starting from the optimal value.
+    optimum: numpy.ndarray
+        The estimated values of the adjustable parameters.
+    bounds: :obj:`scipy.optimize.Bounds`
+        The bounds of the adjustable parameters.
+    args: tuple
+        (external_variables_values, fitExperiments, doc, ss_time, cost_type), see objective_function.
+    tol: float
+        The tolerance for termination.
+    maxiter: int
+        The maximum number of function evaluations of each re-optimisation.
+    executor: :obj:`concurrent.futures.Executor`, optional
+        The executor evaluating the fit experiments, see _get_fit_experiment_executor. Default: None
+
+    Returns
+    -------
+    tuple
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray) the values, the profile and the re-optimised parameters.
+    """
+    fitExperiments=args[1]
+    kind='sensitivity' if _supports_sensitivity(fitExperiments) else 'residuals'
+    objective=_get_parallel_objective(kind, executor)
+    free=numpy.delete(numpy.arange(len(optimum)), index)
+    free_bounds=Bounds(numpy.delete(numpy.broadcast_to(bounds.lb, optimum.shape), index), 
+                       numpy.delete(numpy.broadcast_to(bounds.ub, optimum.shape), index))
+    x_free=numpy.clip(optimum[free], free_bounds.lb, free_bounds.ub)
+    cost=[]
+    x=[]
+    for value in values:
+        fixed_objective=_FixedParameterObjective(objective, index, value, len(optimum))
+        if len(free)==0:
+            residuals=fixed_objective.fun(x_free, *args)
+        else:
+            res=least_squares(fixed_objective.fun, x_free, jac=fixed_objective.jac if kind=='sensitivity' else '2-point', args=args,
+                              bounds=free_bounds, ftol=tol, gtol=tol, xtol=tol, max_nfev=maxiter)
+            x_free, residuals=res.x, res.fun
+        cost.append(numpy.sum(residuals**2))
+        x.append(numpy.insert(x_free, index, value))
+    return numpy.asarray(values), numpy.array(cost), numpy.array(x)
+
+def _profile_sweep_worker(args):
+    """ Compute a sweep of a profile in a worker process initialised by _init_fit_experiment_worker.
+
+    Parameters
+    ----------
+    args: tuple
+        (index, values, optimum, lower_bound, upper_bound, external_variables_values, ss_time, cost_type, tol, maxiter),
+        see _profile_sweep.
+
+    Returns
+    -------
+    tuple
+        See _profile_sweep.
+    """
+    index, values, optimum, lower_bound, upper_bound, external_variables_values, ss_time, cost_type, tol, maxiter = args
+    return _profile_sweep(index, values, optimum, Bounds(lower_bound, upper_bound), 
+                          (external_variables_values, _WORKER_FIT_EXPERIMENTS['fitExperiments'], _WORKER_FIT_EXPERIMENTS['doc'], ss_time, cost_type),
+                          tol, maxiter)
+
+class _FixedParameterObjective:
+    """ The residuals (and their Jacobian) as a function of the adjustable parameters except one, which is fixed.
+
+    Attributes
+    ----------
+    function: callable
+        objective_function_residuals or objective_function_sensitivity, see _get_parallel_objective.
+    index: int
+        The index of the fixed parameter.
+    value: float
+        The value of the fixed parameter.
+    """
+
+    def __init__(self, function, index, value, n_params):
+        self.function=function
+        self.index=index
+        self.value=value
+        self._free=numpy.delete(numpy.arange(n_params), index)
+        self._sensitivity_objective=_SensitivityObjective(self._evaluate)
+
+    def _evaluate(self, free_vals, *args):
+        value=self.function(list(numpy.insert(numpy.asarray(free_vals, dtype=float), self.index, self.value)), *args)
+        if isinstance(value, tuple):
+            return value[0], value[1][:, self._free]
+        return value, None
+
+    def fun(self, free_vals, *args):
+        return self._sensitivity_objective.fun(free_vals, *args)
+
+    def jac(self, free_vals, *args):
+        return self._sensitivity_objective.jac(free_vals, *args)
+
+def _least_squares(initial_value, bounds, args, tol, maxiter, executor=None, objective_cache_size=None, checkpoint=None, trace=None,
+                   schedule=None):
+    """ Run least_squares on the weighted residuals of the fit experiments.
+    The Jacobian is calculated by forward sensitivity analysis if supported, see _supports_sensitivity.
+
+    Parameters
+    ----------
+    initial_value: list
+        The starting point.
+    bounds: :obj:`scipy.optimize.Bounds`
+        The bounds of the adjustable parameters.
+    args: tuple
+        (external_variables_values, fitExperiments, doc, ss_time, cost_type), see objective_function.
+    tol: float
+        The tolerance for termination.
+    maxiter: int
+        The maximum number of function evaluations.
+    executor: :obj:`concurrent.futures.Executor`, optional
+        The executor evaluating the fit experiments, see _get_fit_experiment_executor. Default: None
+    objective_cache_size: int, optional
+        The size of the objective cache, see _get_cached_objective. Default: None
+    checkpoint: :obj:`_Checkpoint`, optional
+        The checkpoint recording the evaluations, see _get_checkpointed_objective. Default: None
+    trace: :obj:`_EvaluationTrace`, optional
+        The trace recording the simulations, see _get_traced_objective. Default: None
+    schedule: :obj:`_ToleranceSchedule`, optional
+        If given, least_squares is run at each level of the schedule, from loose to tight tolerances,
+        each run starting from the solution of the previous one. Default: None
+
+    Returns
+    -------
+    tuple
+        (:obj:`scipy.optimize.OptimizeResult`, callable) the result and the objective function used.
+    """
+    nfev=0
+    if schedule is not None:
+        for level in range(len(schedule.factors)-1):
+            schedule.set_level(level)
+            res=_least_squares(initial_value, bounds, args, tol, maxiter, executor, None, checkpoint, trace)[0]
+            schedule.number_of_evaluations[level]+=res.nfev
+            nfev+=res.nfev
+            initial_value=res.x
+        schedule.set_level(len(schedule.factors)-1)
+    fitExperiments=args[1]
+    # least_squares is given the vector of the weighted residuals rather than their sum
+    if _supports_sensitivity(fitExperiments):
+        # the Jacobian is calculated by forward sensitivity analysis, in the same simulation as the objective
+        objective=_get_objective('sensitivity', executor, None, trace, checkpoint, objective_cache_size)
+        sensitivity_objective=_SensitivityObjective(objective)
+        res=least_squares(sensitivity_objective.fun, initial_value, jac=sensitivity_objective.jac, args=args,
+                          bounds=bounds, ftol=tol, gtol=tol, xtol=tol, max_nfev=maxiter)
+    else:
+        objective=_get_objective('residuals', executor, None, trace, checkpoint, objective_cache_size)
+        res=least_squares(objective, initial_value, args=args, 
+                          bounds=bounds, ftol=tol, gtol=tol, xtol=tol, max_nfev=maxiter)
+    if schedule is not None:
+        schedule.number_of_evaluations[-1]+=res.nfev
+        res.nfev+=nfev
+    return res, objective
+
+def _objective_worker(args):
+    """ Evaluate objective_function in a worker process initialised by _init_fit_experiment_worker.
+
+    Parameters
+    ----------
+    args: tuple
+        (param_vals, external_variables_values, ss_time, cost_type, integrator_parameters), see objective_function;
+        integrator_parameters are the parameters of the integrators of the fit experiments, in the format of {fitid:parameters}.
+
+    Returns
+    -------
+    tuple
+        (float, list, float) the value of objective_function, the costs of the fit experiments and the wall time.
+    """
+    param_vals, external_variables_values, ss_time, cost_type, integrator_parameters = args
+    for fitid, parameters in integrator_parameters.items():
+        _WORKER_FIT_EXPERIMENTS['fitExperiments'][fitid]['sim_setting'].integrator_parameters = parameters
+    experiment_costs=[]
+    start=time.perf_counter()
+    value=objective_function(param_vals, external_variables_values, _WORKER_FIT_EXPERIMENTS['fitExperiments'], 
+                             _WORKER_FIT_EXPERIMENTS['doc'], ss_time, cost_type, experiment_costs=experiment_costs)
+    return value, experiment_costs, time.perf_counter()-start
+
+def _get_batch_objective(batch_executor, fitExperiments, external_variables_values, ss_time, cost_type=None, trace=None, checkpoint=None):
+    """ Get a function evaluating objective_function at a list of points in worker processes.
+
+    Parameters
+    ----------
+    batch_executor: :obj:`concurrent.futures.ProcessPoolExecutor`
+        The worker processes initialised by _init_fit_experiment_worker.
+    fitExperiments: dict
+        The fit experiments of the main process, see objective_function.
+        Their current integrator parameters, which may be changed by _ToleranceSchedule, are sent with the points.
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    ss_time: dict
+        The time point for steady state simulation, in the format of {fitid:time}
+    cost_type: str, optional
+        The cost function to be used for the optimisation. Default: None
+    trace: :obj:`_EvaluationTrace`, optional
+        The trace recording the simulations. Default: None
+    checkpoint: :obj:`_Checkpoint`, optional
+        The checkpoint recording the evaluations, see _Checkpoint.wrap_map. Default: None
+
+    Returns
+    -------
+    callable
+        Called as map_function(points), returns the list of the values of objective_function.
+    """
+    def map_function(points):
+        integrator_parameters={fitid:fitExperiment['sim_setting'].integrator_parameters for fitid,fitExperiment in fitExperiments.items()}
+        evaluations=list(batch_executor.map(_objective_worker, 
+                                            [(point, external_variables_values, ss_time, cost_type, integrator_parameters) for point in points]))
+        if trace is not None:
+            for point, (value, experiment_costs, wall_time) in zip(points, evaluations):
+                trace.record(point, value, experiment_costs, wall_time)
+        return [evaluation[0] for evaluation in evaluations]
+    if checkpoint is not None:
+        map_function=checkpoint.wrap_map(map_function)
+    return map_function
+
+class _LogPosterior:
+    """ The log posterior probability of the adjustable parameters, up to a constant,
+    with a uniform prior within the bounds and a likelihood given by the cost of the fit experiments.
+    The scale of the noise is marginalised with a Jeffreys prior, so that no noise level has to be specified:
+    log p = -n/2*log(cost) for 'MSE' and -n*log(cost) for the other costs, where n is the number of data points.
+    The likelihood treats the residuals of the cost (see _get_residuals) as independent noise with a common scale,
+    Gaussian for 'MSE' and Laplace for the other costs.
+    Since the residuals of 'MSE' are sqrt(weight/n_k)*(sim-exp), where n_k is the number of data points of the data generator,
+    this assumes that the variance of the noise of a data point is proportional to n_k/weight, 
+    i.e., a single noise variance only if all data generators have the same number of data points and weight.
+
+    Attributes
+    ----------
+    function: callable
+        The objective function, see objective_function.
+    args: tuple
+        (external_variables_values, fitExperiments, doc, ss_time, cost_type), see objective_function.
+    exponent: float
+        n/2 or n.
+    map_function: callable
+        If not None, evaluates the objective function at a list of points, see _get_batch_objective.
+    """
+
+    def __init__(self, function, bounds, fitExperiments, args, cost_type=None):
+        self.function=function
+        self.lower_bound=numpy.asarray(bounds.lb, dtype=float)
+        self.upper_bound=numpy.asarray(bounds.ub, dtype=float)
+        self.args=args
+        n_residuals=len(_get_failed_residuals(fitExperiments))
+        self.exponent=n_residuals/2 if cost_type is None or cost_type=='MSE' else n_residuals
+        self.map_function=None
+
+    def in_bounds(self, param_vals):
+        return numpy.all(param_vals>=self.lower_bound) and numpy.all(param_vals<=self.upper_bound)
+
+    def from_cost(self, cost):
+        if not numpy.isfinite(cost) or cost>=1e12:
+            return -numpy.inf
+        return -self.exponent*numpy.log(max(cost, 1e-300))
+
+    def to_cost(self, log_probability):
+        return numpy.exp(-log_probability/self.exponent)
+
+    def __call__(self, param_vals):
+        if not self.in_bounds(param_vals):
+            return -numpy.inf
+        return self.from_cost(self.function(param_vals, *self.args))
+
+    def map(self, points):
+        """ Evaluate the log posterior at a list of points, the points outside the bounds are not simulated. """
+        inside=[i for i, point in enumerate(points) if self.in_bounds(point)]
+        log_probabilities=[-numpy.inf]*len(points)
+        for i, cost in zip(inside, self.map_function([points[i] for i in inside]) if inside else []):
+            log_probabilities[i]=self.from_cost(cost)
+        return log_probabilities
+
+def _sample_posterior(method, log_posterior, bounds, initial_value, opt_parameters, maxiter, rng, workers=1, checkpoint=None):
+    """ Sample the posterior distribution of the adjustable parameters.
+    The walkers (ensemble sampler) or chains (adaptive Metropolis) start in a small ball around the initial value.
+
+    Parameters
+    ----------
+    method: str
+        'ensemble sampler' or 'adaptive Metropolis', see ensemble_sample and adaptive_metropolis.
+    log_posterior: :obj:`_LogPosterior`
+        The log posterior.
+    bounds: :obj:`scipy.optimize.Bounds`
+        The bounds of the adjustable parameters.
+    initial_value: list
+        The initial value of the adjustable parameters.
+    opt_parameters: dict
+        The parameters of the algorithm: number_of_samples (per walker, default: maxiter), 
+        population_size (the number of walkers, default: max(2*(number of parameters+1), 8); 
+        the number of chains, default: workers) and step_size 
+        (the initial standard deviation of the proposal of adaptive Metropolis relative to the bounds, default: 0.01).
+    maxiter: int
+        The default number of samples.
+    rng: :obj:`numpy.random.Generator`
+        The random number generator.
+    workers: int, optional
+        The number of worker processes. Default: 1
+    checkpoint: :obj:`_Checkpoint`, optional
+        The checkpoint recording the chains. Default: None
+
+    Returns
+    -------
+    :obj:`scipy.optimize.OptimizeResult`
+        The result of ensemble_sample or adaptive_metropolis, with x and fun, the maximum a posteriori sample and its cost,
+        and posterior_mean and posterior_std, the mean and the standard deviation of the second half of the samples.
+    """
+    n_params=len(initial_value)
+    n_samples=opt_parameters.get('number_of_samples', maxiter)
+    span=numpy.asarray(bounds.ub, dtype=float)-numpy.asarray(bounds.lb, dtype=float)
+    span=numpy.where(numpy.isfinite(span), span, numpy.maximum(numpy.abs(initial_value), 1.0))
+    if method=='ensemble sampler':
+        n_walkers=opt_parameters.get('population_size', max(2*(n_params+1), 8))
+        x0=_get_initial_walkers(log_posterior, initial_value, 1e-3*span, n_walkers, rng)
+    else:
+        n_walkers=opt_parameters.get('population_size', max(workers,1))
+        x0=_get_initial_walkers(log_posterior, initial_value, numpy.zeros(n_params), n_walkers, rng)
+    map_function=log_posterior.map if log_posterior.map_function is not None else None
+    callback=checkpoint.sample_callback if checkpoint is not None else None
+    if method=='ensemble sampler':
+        res=ensemble_sample(log_posterior, x0, n_samples, seed=rng, map_function=map_function, callback=callback)
+    else:
+        proposal_covariance=numpy.diag((opt_parameters.get('step_size', 0.01)*span)**2)
+        res=adaptive_metropolis(log_posterior, x0, n_samples, proposal_covariance=proposal_covariance, 
+                                seed=rng, map_function=map_function, callback=callback)
+    i_best=numpy.unravel_index(numpy.argmax(res.log_probability), res.log_probability.shape)
+    res.x=res.chain[i_best]
+    res.fun=log_posterior.to_cost(res.log_probability[i_best])
+    samples=res.chain[n_samples//2:].reshape(-1, n_params)
+    res.posterior_mean=numpy.mean(samples, axis=0)
+    res.posterior_std=numpy.std(samples, axis=0)
+    return res
+
+def _get_initial_walkers(log_posterior, initial_value, scale, n_walkers, rng):
+    """ Get the initial positions of the walkers, the initial value perturbed by a Gaussian of standard deviation scale,
+    clipped to the bounds.
+
+    Parameters
+    ----------
+    log_posterior: :obj:`_LogPosterior`
+        The log posterior, which holds the bounds.
+    initial_value: list
+        The initial value of the adjustable parameters.
+    scale: numpy.ndarray
+        The standard deviation of the perturbation of each parameter.
+    n_walkers: int
+        The number of walkers.
+    rng: :obj:`numpy.random.Generator`
+        The random number generator.
+
+    Returns
+    -------
+    numpy.ndarray
+        The initial positions, the shape is (number of walkers, number of parameters).
+    """
+    x0=numpy.asarray(initial_value, dtype=float)+scale*rng.standard_normal((n_walkers, len(initial_value)))
+    return numpy.clip(x0, log_posterior.lower_bound, log_posterior.upper_bound)
+
+def _least_squares_worker(args):
+    """ Run least_squares from one starting point in a worker process initialised by _init_fit_experiment_worker.
+
+    Parameters
+    ----------
+    args: tuple
+        (initial_value, lower_bound, upper_bound, external_variables_values, ss_time, cost_type, tol, maxiter)
+
+    Returns
+    -------
+    :obj:`scipy.optimize.OptimizeResult`
+        The result of least_squares.
+    """
+    initial_value, lower_bound, upper_bound, external_variables_values, ss_time, cost_type, tol, maxiter = args
+    fitExperiments=_WORKER_FIT_EXPERIMENTS['fitExperiments']
+    doc=_WORKER_FIT_EXPERIMENTS['doc']
+    return _least_squares(initial_value, Bounds(lower_bound, upper_bound), (external_variables_values, fitExperiments, doc, ss_time, cost_type), 
+                          tol, maxiter)[0]
+
+def _get_starting_points(bounds, initial_value, number_of_runs, seed=None):
+    """ Get the starting points of the multi-start local optimization algorithm:
+    the initial value followed by a Latin hypercube sample within the bounds.
+    The parameters with positive bounds spanning more than three orders of magnitude are sampled on a log scale.
+
+    Parameters
+    ----------
+    bounds: :obj:`scipy.optimize.Bounds`
+        The bounds of the adjustable parameters.
+    initial_value: list
+        The initial value of the adjustable parameters.
+    number_of_runs: int
+        The number of starting points.
+    seed: int or :obj:`numpy.random.Generator`, optional
+        The seed of the sample. Default: None
+
+    Raises
+    ------
+    RuntimeError
+        If the bounds are not finite.
+
+    Returns
+    -------
+    list
+        The starting points.
+    """
+    lower_bound=numpy.asarray(bounds.lb, dtype=float)*numpy.ones(len(initial_value))
+    upper_bound=numpy.asarray(bounds.ub, dtype=float)*numpy.ones(len(initial_value))
+    if not (numpy.all(numpy.isfinite(lower_bound)) and numpy.all(numpy.isfinite(upper_bound))):
+        raise RuntimeError('The multi-start local optimization algorithm requires finite bounds!')
+    log_scale=(lower_bound>0) & (upper_bound>1e3*lower_bound)
+    lower=numpy.where(log_scale, numpy.log10(numpy.where(log_scale, lower_bound, 1)), lower_bound)
+    upper=numpy.where(log_scale, numpy.log10(numpy.where(log_scale, upper_bound, 1)), upper_bound)
+    sample=qmc.scale(qmc.LatinHypercube(d=len(initial_value), seed=seed).random(number_of_runs-1), lower, upper)
+    sample=numpy.where(log_scale, 10**sample, sample)
+    return [numpy.asarray(initial_value, dtype=float)]+list(sample)
+
+def _rank_minima(results, rtol=1e-4, atol=1e-8):
+    """ Rank the results of the starts of the multi-start local optimization algorithm by their cost,
+    merging the results which converged to the same minimum.
+
+    Parameters
+    ----------
+    results: list
+        The results of least_squares, :obj:`scipy.optimize.OptimizeResult`.
+    rtol: float, optional
+        The relative tolerance for two minima to be the same. Default: 1e-4
+    atol: float, optional
+        The absolute tolerance for two minima to be the same. Default: 1e-8
+
+    Returns
+    -------
+    :obj:`scipy.optimize.OptimizeResult`
+        The result of the best start, with the additional attributes
+        minima: list of dict, [{'x': , 'cost': , 'success': , 'count': }], the distinct minima ranked by their cost,
+        where count is the number of starts which converged to the minimum;
+        number_of_runs: the number of starts; 
+        nfev: the number of function evaluations of all the starts.
+    """
+    results=sorted(results, key=lambda result: result.cost)
+    minima=[]
+    for result in results:
+        for minimum in minima:
+            if numpy.allclose(result.x, minimum['x'], rtol=rtol, atol=atol):
+                minimum['count']+=1
+                break
+        else:
+            minima.append({'x':result.x,'cost':result.cost,'success':result.success,'count':1})
+    res=results[0]
+    res.minima=minima
+    res.number_of_runs=len(results)
+    res.nfev=sum(result.nfev for result in results)
+    return res
+
+def _get_dfDict(doc, working_dir, engine=None):
+    """ Get the data of the data descriptions of a SED document.
+    The parsed data source files are cached, only the columns referred to by the data sources are read.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    working_dir: str
+        working directory of the SED document (path relative to which data files are located)
+    engine: str, optional
+        The parser engine of pandas.read_csv, e.g., 'c' or 'pyarrow'. Default: None, the default engine of pandas
+
+    Returns
+    -------
+    dict
+        The data, in the format of {dataDescriptionId: DataSourceTable}
+    """
+    dfDict={}
+    for dataDescription in doc.getListOfDataDescriptions() :
+        dfDict.update({dataDescription.getId():get_table_from_dataDescription(dataDescription, working_dir, 
+                                                                               usecols=get_columns_of_dataDescription(dataDescription),
+                                                                               engine=engine)})
+    return dfDict
+
+def objective_function(param_vals, external_variables_values, fitExperiments, doc, ss_time,cost_type=None,bound=None,experiment_costs=None):
+    """ Objective function for parameter estimation task.
+    The model is assumed to be in CellML format.
+    If bound is given, the cost is accumulated fit experiment by fit experiment 
+    (and condition by condition for steady state fit experiments),
+    and the evaluation stops as soon as the accumulated cost exceeds bound.
+
+    Parameters
+    ----------
+    param_vals: list
+        The values of the adjustable parameters to be specified [value1, value2, ...]
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    fitExperiments: dict
+        The fit experiments to be specified, 
+        in the format of {fitid:{'external_variables_info': , 'cellml_model': , 'analyser': , 
+        'mtype': , 'module': , 'fitness_info': , 'parameters': , 'parameters_values': , 
+        'adj_param_indices': , 'type': , 'sim_setting': }}
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    ss_time: dict
+        The time point for steady state simulation, in the format of {fitid:time}
+    cost_type: str, optional
+        The cost function to be used for the optimisation. Default: None
+    bound: float, optional
+        The cost above which the evaluation is stopped. Default: None, all the fit experiments are evaluated.
+    experiment_costs: list, optional
+        If given, the costs of the fit experiments evaluated are appended to it, nan if the simulation failed.
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    float or CostLowerBound
+        The sum of residuals of all fit experiments.
+        If the evaluation was stopped, a CostLowerBound, i.e., the accumulated cost which is a lower bound of the sum.
+    """
+    residuals_sum=0
+    for fitid,fitExperiment in fitExperiments.items():
+        fitness_info=fitExperiment['fitness_info']
+        if bound is None:
+            abort=None
+        else:
+            def abort(partial_results):
+                return residuals_sum+_get_cost(doc, fitness_info[2], fitness_info[1], partial_results, cost_type)[0]>bound
+        sed_results=_simulate_fit_experiment(param_vals, external_variables_values, fitid, fitExperiment, ss_time, abort)
+        if sed_results is None:
+            if experiment_costs is not None:
+                experiment_costs.append(math.nan)
+            return 1e12
+        experiment_cost=_get_cost(doc, fitness_info[2], fitness_info[1], sed_results, cost_type)[0]
+        if experiment_costs is not None:
+            experiment_costs.append(experiment_cost)
+        residuals_sum+=experiment_cost
+                
+        if math.isnan(residuals_sum):
+            return 1e12
+        if bound is not None and residuals_sum>bound:
+            return CostLowerBound(residuals_sum)
+    return residuals_sum
+
+def _polish(objective, res, bounds, args):
+    """ Polish the result of differential_evolution with L-BFGS-B, as differential_evolution(..., polish=True),
+    but with the bound of the objective function turned off, 
+    so that the finite differences of the local search only see complete evaluations.
+
+    Parameters
+    ----------
+    objective: callable
+        The objective function, wrapping an instance of _BoundedObjective.
+    res: :obj:`scipy.optimize.OptimizeResult`
+        The result of differential_evolution(..., polish=False).
+    bounds: :obj:`scipy.optimize.Bounds`
+        The bounds of the adjustable parameters.
+    args: tuple
+        The extra arguments of the objective function.
+
+    Returns
+    -------
+    :obj:`scipy.optimize.OptimizeResult`
+        The result, updated with the polished solution if it is better.
+    """
+    function=objective
+    while function is not None and not isinstance(function,_BoundedObjective):
+        function=getattr(function,'function',None)
+    if function is not None:
+        function.slack=math.inf
+    polished=minimize(objective, numpy.copy(res.x), args=args, method='L-BFGS-B', bounds=bounds)
+    res.nfev+=polished.nfev
+    if polished.fun<res.fun:
+        res.x=polished.x
+        res.fun=polished.fun
+        if 'jac' in polished:
+            res.jac=polished.jac
+    return res
+
+def objective_function_residuals(param_vals, external_variables_values, fitExperiments, doc, ss_time,cost_type=None, experiment_costs=None):
+    """ Objective function for parameter estimation task, 
+    returning the weighted residuals instead of their sum, for least squares optimisers.
+    The sum of squares of the residuals is the value of objective_function.
+
+    Parameters
+    ----------
+    param_vals: list
+        The values of the adjustable parameters to be specified [value1, value2, ...]
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    fitExperiments: dict
+        The fit experiments to be specified, see objective_function.
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    ss_time: dict
+        The time point for steady state simulation, in the format of {fitid:time}
+    cost_type: str, optional
+        The cost function to be used for the optimisation. Default: None
+    experiment_costs: list, optional
+        If given, the costs of the fit experiments are appended to it, see objective_function.
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    numpy.ndarray
+        The residuals of all fit experiments and data generators, concatenated in the order of the fit experiments.
+    """
+    results=[_evaluate_fit_experiment('residuals', param_vals, external_variables_values, fitid, fitExperiment, doc, ss_time, cost_type)
+             for fitid,fitExperiment in fitExperiments.items()]
+    return _combine_fit_experiment_results('residuals', results, fitExperiments, len(param_vals), experiment_costs)
+
+def _evaluate_fit_experiment(kind, param_vals, external_variables_values, fitid, fitExperiment, doc, ss_time, cost_type=None):
+    """ Evaluate the cost, the residuals or the residuals and their Jacobian of one fit experiment.
+
+    Parameters
+    ----------
+    kind: str
+        'cost' (see objective_function), 'residuals' (see objective_function_residuals) 
+        or 'sensitivity' (see objective_function_sensitivity)
+    param_vals: list
+        The values of the adjustable parameters to be specified [value1, value2, ...]
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    fitid: str
+        The id of the fit experiment.
+    fitExperiment: dict
+        The fit experiment, see objective_function.
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    ss_time: dict
+        The time point for steady state simulation, in the format of {fitid:time}
+    cost_type: str, optional
+        The cost function to be used for the optimisation. Default: None
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    float, numpy.ndarray, tuple or None
+        The cost, the residuals or the residuals and their Jacobian 
+        with respect to all the adjustable parameters of the fit experiment.
+        None if the simulation failed.
+    """
+    fitness_info=fitExperiment['fitness_info']
+    if kind=='sensitivity':
+        result=_simulate_fit_experiment_sensitivity(param_vals, external_variables_values, fitExperiment)
+        if result is None:
+            return None
+        sed_results, sensitivities=result
+        residuals, sub_jacobian=_get_residuals(doc, fitness_info[2], fitness_info[1], sed_results, cost_type, sensitivities)
+        jacobian=numpy.zeros((len(residuals), len(param_vals)))
+        jacobian[:,fitExperiment['adj_param_indices']]=sub_jacobian
+        return residuals, jacobian
+    sed_results=_simulate_fit_experiment(param_vals, external_variables_values, fitid, fitExperiment, ss_time)
+    if sed_results is None:
+        return None
+    if kind=='cost':
+        return _get_cost(doc, fitness_info[2], fitness_info[1], sed_results, cost_type)[0]
+    elif kind=='residuals':
+        return _get_residuals(doc, fitness_info[2], fitness_info[1], sed_results, cost_type)[0]
+    else:
+        raise RuntimeError('The evaluation {} is not supported!'.format(kind))
+
+def _get_experiment_costs(kind, results):
+    """ Get the costs of the fit experiments from the results of _evaluate_fit_experiment.
+
+    Parameters
+    ----------
+    kind: str
+        'cost', 'residuals' or 'sensitivity', see _evaluate_fit_experiment.
+    results: list
+        The results of _evaluate_fit_experiment, in the order of the fit experiments.
+
+    Returns
+    -------
+    list
+        The costs of the fit experiments, nan if the simulation failed.
+    """
+    if kind=='cost':
+        return [math.nan if result is None else result for result in results]
+    if kind=='sensitivity':
+        results=[None if result is None else result[0] for result in results]
+    return [math.nan if result is None else float(numpy.sum(result**2)) for result in results]
+
+def _reduce_fit_experiment_results(kind, results, fitExperiments, n_params):
+    """ Combine the results of _evaluate_fit_experiment over the fit experiments.
+
+    Parameters
+    ----------
+    kind: str
+        'cost', 'residuals' or 'sensitivity', see _evaluate_fit_experiment.
+    results: list
+        The results of _evaluate_fit_experiment, in the order of the fit experiments.
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+    n_params: int
+        The number of adjustable parameters.
+
+    Returns
+    -------
+    float, numpy.ndarray or tuple
+        The sum of the costs, the concatenated residuals, or the concatenated residuals and Jacobians.
+        If any simulation failed, 1e12 or the residuals of _get_failed_residuals (with a nan Jacobian).
+    """
+    if kind=='cost':
+        if any(result is None for result in results):
+            return 1e12
+        residuals_sum=sum(results)
+        if math.isnan(residuals_sum):
+            return 1e12
+        return residuals_sum
+    failed_residuals=_get_failed_residuals(fitExperiments)
+    if kind=='residuals':
+        if any(result is None for result in results):
+            return failed_residuals
+        residuals=numpy.concatenate(results)
+        if numpy.any(numpy.isnan(residuals)):
+            return failed_residuals
+        return residuals
+    # a zero Jacobian would look like a stationary point to least_squares
+    failed_jacobian=numpy.full((len(failed_residuals), n_params), numpy.nan)
+    if any(result is None for result in results):
+        return failed_residuals, failed_jacobian
+    residuals=numpy.concatenate([result[0] for result in results])
+    jacobian=numpy.concatenate([result[1] for result in results])
+    if numpy.any(numpy.isnan(residuals)) or numpy.any(numpy.isnan(jacobian)):
+        return failed_residuals, failed_jacobian
+    return residuals, jacobian
+
+def _combine_fit_experiment_results(kind, results, fitExperiments, n_params, experiment_costs=None):
+    """ Combine the results of _evaluate_fit_experiment over the fit experiments and record their costs.
+
+    Parameters
+    ----------
+    kind: str
+        'cost', 'residuals' or 'sensitivity', see _evaluate_fit_experiment.
+    results: list
+        The results of _evaluate_fit_experiment, in the order of the fit experiments.
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+    n_params: int
+        The number of adjustable parameters.
+    experiment_costs: list, optional
+        If given, the costs of the fit experiments are appended to it, see _get_experiment_costs.
+
+    Returns
+    -------
+    float, numpy.ndarray or tuple
+        See _reduce_fit_experiment_results.
+    """
+    if experiment_costs is not None:
+        experiment_costs.extend(_get_experiment_costs(kind, results))
+    return _reduce_fit_experiment_results(kind, results, fitExperiments, n_params)
+
+def _simulate_fit_experiment(param_vals, external_variables_values, fitid, fitExperiment, ss_time, abort=None):
+    """ Simulate a fit experiment.
+
+    Parameters
+    ----------
+    param_vals: list
+        The values of the adjustable parameters to be specified [value1, value2, ...]
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    fitid: str
+        The id of the fit experiment.
+    fitExperiment: dict
+        The fit experiment, see objective_function.
+    ss_time: dict
+        The time point for steady state simulation, in the format of {fitid:time}
+    abort: callable, optional
+        Called with the results of the conditions simulated so far of a steady state fit experiment,
+        the remaining conditions are not simulated if it returns True. Default: None
+
+    Raises
+    ------
+    RuntimeError
+        If the external variables cannot be specified or the simulation type is not supported.
+
+    Returns
+    -------
+    dict or None
+        The simulation results of the observables, in the format of {id: numpy.ndarray}.
+        None if the simulation failed.
+    """
+    sub_param_vals=[]
+    external_variables_info=fitExperiment['external_variables_info']
+    cellml_model=fitExperiment['cellml_model']
+    analyser=fitExperiment['analyser']
+    mtype=fitExperiment['mtype']
+    module=fitExperiment['module']
+    fitness_info=fitExperiment['fitness_info']
+    parameters_info=fitExperiment['parameters']
+    parameters_values=fitExperiment['parameters_values']         
+    for param_index in fitExperiment['adj_param_indices']:
+        sub_param_vals.append(param_vals[param_index])
+    simulation_type=fitExperiment['type']
+    sim_setting=fitExperiment['sim_setting']
+    observables_info=fitness_info[0]
+    observables=get_observables(analyser,cellml_model,observables_info)
+    parameters=get_observables(analyser,cellml_model,parameters_info)
+    observables_exp=fitness_info[2]       
+    if simulation_type=='timeCourse':
+        external_variables_values_extends=external_variables_values+sub_param_vals+parameters_values    
+        try:
+            external_module=get_externals_varies(analyser, cellml_model, external_variables_info, external_variables_values_extends)
+        except ValueError as exception:
+            print(exception)
+            raise RuntimeError(exception)
+        try:
+            current_state=sim_TimeCourse(mtype, module, sim_setting, observables, external_module,current_state=None,parameters=parameters)
+            sed_results = copy.deepcopy(current_state[-1])
+        except RuntimeError as exception:
+            print(exception)
+            return None
+
+    elif simulation_type=='steadyState':
+        observable_exp_temp=observables_exp[list(observables_exp.keys())[0]]
+        for i in range(len(observable_exp_temp)): # assume all observables and experimental conditions have the same number of data points
+            sim_setting.step=ss_time[fitid]
+            sim_setting.output_start_time=sim_setting.step 
+            sim_setting.output_end_time=sim_setting.step
+            sim_setting.number_of_steps=0
+            parameters_value=[]
+            for parameter in parameters_values:
+                parameters_value.append(parameter[i])
+            external_variables_values_extends=external_variables_values+sub_param_vals+parameters_value
+            try:
+                external_module=get_externals_varies(analyser, cellml_model, external_variables_info, external_variables_values_extends)
+            except ValueError as exception:
+                print(exception)
+                raise RuntimeError(exception)
+            if i==0:
+                try:
+                    #current_state=sim_OneStep(mtype, module, sim_setting, observables, external_module,current_state=None,parameters=parameters)
+                    current_state=sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_module,current_state=None,parameters=parameters)
+                    sed_results = copy.deepcopy(current_state[-1])
+                except RuntimeError as exception:
+                    print(exception)
+                    return None
+            else:
+                try:
+                  #  current_state=sim_OneStep(mtype, module, sim_setting, observables, external_module,current_state=current_state,parameters=parameters)
+                    current_state=sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_module,current_state=current_state,parameters=parameters)
+                    for key, value in current_state[-1].items():
+                        sed_results[key]=numpy.append(sed_results[key],value)
+                except RuntimeError as exception:
+                    print(exception)
+                    return None
+            if abort is not None and i<len(observable_exp_temp)-1 and abort(sed_results):
+                break
+    else:
+        raise RuntimeError('Simulation type not supported!')
+    return sed_results
+
+def _get_failed_residuals(fitExperiments, cost=1e12):
+    """ Get the residuals returned when a simulation failed,
+    with the same length as the residuals of the fit experiments and a sum of squares equal to cost.
+
+    Parameters
+    ----------
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+    cost: float, optional
+        The sum of squares of the residuals. Default: 1e12
+
+    Returns
+    -------
+    numpy.ndarray
+        The residuals.
+    """
+    n_residuals=sum(len(exp_value) for fitExperiment in fitExperiments.values() for exp_value in fitExperiment['fitness_info'][2].values())
+    return numpy.full(n_residuals, numpy.sqrt(cost/n_residuals))
+
+def _get_residuals(doc, observables_exp, observables_weight, sed_results, cost_type=None, sensitivities=None):
+    """ Calculate the weighted residuals of a fit experiment and optionally their Jacobian.
+    The residuals are scaled such that the sum of their squares is the cost of the fit experiment:
+    for 'MSE', r = sqrt(weight/n)*(sim-exp); 
+    for 'AE', 'MIN-MAX' and 'Z-SCORE', r = sign(sim-exp)*sqrt(weight*scale*abs(sim-exp)),
+    where scale is 1, 1/(max(exp)-min(exp)) and 1/std(exp), respectively.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    observables_exp: dict
+        The experimental values of the data generators, in the format of {dataGeneratorId: numpy.ndarray}
+    observables_weight: dict
+        The weights of the data generators, in the format of {dataGeneratorId: numpy.ndarray}
+    sed_results: dict
+        The simulation results of the observables, in the format of {id: numpy.ndarray}
+    cost_type: str, optional
+        The cost function to be used, 'AE', 'MIN-MAX', 'Z-SCORE' or 'MSE' (None). Default: None
+    sensitivities: dict, optional
+        The sensitivities of the observables, in the format of {id: numpy.ndarray}, 
+        where numpy.ndarray has the shape (number of time points, number of parameters).
+        If given, the Jacobian of the residuals is calculated.
+
+    Raises
+    ------
+    RuntimeError
+        If the cost type is not supported.
+
+    Returns
+    -------
+    tuple
+        (numpy.ndarray, numpy.ndarray or None)
+        The residuals, concatenated in the order of the data generators, 
+        and the Jacobian of the residuals with respect to the parameters of the sensitivities.
+    """
+    residuals=[]
+    jacobian=[]
+    for key, exp_value in observables_exp.items():
+        dataGenerator=doc.getDataGenerator(key)
+        sim_value=calc_data_generator_results(dataGenerator, sed_results)
+        if cost_type=='AE':
+            scale=numpy.ones(len(exp_value))
+        elif cost_type=='MIN-MAX':
+            scale=numpy.full(len(exp_value),1/(max(exp_value)-min(exp_value)))
+        elif cost_type=='Z-SCORE':
+            scale=numpy.full(len(exp_value),1/numpy.std(exp_value))
+        elif cost_type is None or cost_type=='MSE':
+            # MSE is the default cost function
+            scale=None
+        else:
+            raise RuntimeError('Cost type not supported!')
+
+        # the simulation results may cover only the first data points (see objective_function with bound),
+        # the normalisation is the one of the complete data
+        n_points=len(sim_value)
+        diff=sim_value-exp_value[:n_points]
+        weight=numpy.broadcast_to(observables_weight[key],exp_value.shape)[:n_points]
+        if scale is None:
+            factor=numpy.sqrt(weight/len(exp_value))
+            residuals.append(factor*diff)
+        else:
+            factor=weight*scale[:n_points]
+            residuals.append(numpy.sign(diff)*numpy.sqrt(factor*abs(diff)))
+
+        if sensitivities is not None:
+            n_params=list(sensitivities.values())[0].shape[1]
+            dresiduals=numpy.zeros((n_points,n_params))
+            for j in range(n_params):
+                dsim_value=_get_data_generator_sensitivity(dataGenerator, sed_results, sim_value, sensitivities, j)
+                if scale is None:
+                    dresiduals[:,j]=factor*dsim_value
+                else:
+                    # d(sign(d)*sqrt(a*|d|)) = a/(2*sqrt(a*|d|)) dd, bounded where the residual vanishes
+                    dresiduals[:,j]=factor*dsim_value/numpy.maximum(2*abs(residuals[-1]),numpy.sqrt(numpy.finfo(float).eps))
+            jacobian.append(dresiduals)
+    if sensitivities is None:
+        return numpy.concatenate(residuals), None
+    return numpy.concatenate(residuals), numpy.concatenate(jacobian)
+
+def _get_cost(doc, observables_exp, observables_weight, sed_results, cost_type=None, sensitivities=None):
+    """ Calculate the cost of a fit experiment and optionally its gradient.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    observables_exp: dict
+        The experimental values of the data generators, in the format of {dataGeneratorId: numpy.ndarray}
+    observables_weight: dict
+        The weights of the data generators, in the format of {dataGeneratorId: numpy.ndarray}
+    sed_results: dict
+        The simulation results of the observables, in the format of {id: numpy.ndarray}
+    cost_type: str, optional
+        The cost function to be used, 'AE', 'MIN-MAX', 'Z-SCORE' or 'MSE' (None). Default: None
+    sensitivities: dict, optional
+        The sensitivities of the observables, in the format of {id: numpy.ndarray}, 
+        where numpy.ndarray has the shape (number of time points, number of parameters).
+        If given, the gradient of the cost is calculated.
+
+    Raises
+    ------
+    RuntimeError
+        If the cost type is not supported.
+
+    Returns
+    -------
+    tuple
+        (float, numpy.ndarray or None)
+        The cost and the gradient of the cost with respect to the parameters of the sensitivities.
+    """
+    residuals, jacobian=_get_residuals(doc, observables_exp, observables_weight, sed_results, cost_type, sensitivities)
+    if jacobian is None:
+        return numpy.sum(residuals**2), None
+    return numpy.sum(residuals**2), 2*jacobian.T.dot(residuals)
+
+def _get_data_generator_sensitivity(dataGenerator, sed_results, sim_value, sensitivities, j, step=1e-7):
+    """ Calculate the sensitivity of a data generator with respect to a parameter,
+    by a directional finite difference along the sensitivities of its variables.
+
+    Parameters
+    ----------
+    dataGenerator: :obj:`SedDataGenerator`
+        The data generator.
+    sed_results: dict
+        The simulation results of the observables, in the format of {id: numpy.ndarray}
+    sim_value: numpy.ndarray
+        The results of the data generator.
+    sensitivities: dict
+        The sensitivities of the observables, in the format of {id: numpy.ndarray}
+    j: int
+        The index of the parameter.
+    step: float, optional
+        The step of the finite difference. Default: 1e-7
+
+    Returns
+    -------
+    numpy.ndarray
+        The sensitivity of the results of the data generator.
+    """
+    perturbed_results={}
+    for id, value in sed_results.items():
+        perturbed_results[id]=value+step*sensitivities[id][:,j]
+    return (calc_data_generator_results(dataGenerator, perturbed_results)-sim_value)/step
+
+def _supports_sensitivity(fitExperiments):
+    """ Determine whether the Jacobian of the objective function can be calculated by forward sensitivity analysis.
+
+    Parameters
+    ----------
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+
+    Returns
+    -------
+    bool
+        True if all the fit experiments are time courses of ODE models solved by a scipy solver.
+    """
+    for fitExperiment in fitExperiments.values():
+        if fitExperiment['type']!='timeCourse' or fitExperiment['mtype']!='ode' or fitExperiment['sim_setting'].method not in SCIPY_SOLVERS:
+            return False
+    return True
+
+def objective_function_sensitivity(param_vals, external_variables_values, fitExperiments, doc, ss_time, cost_type=None, experiment_costs=None):
+    """ Residuals of the fit experiments (see objective_function_residuals) and their Jacobian,
+    calculated by forward sensitivity analysis.
+    Only time course fit experiments of ODE models solved by a scipy solver are supported.
+
+    Parameters
+    ----------
+    param_vals: list
+        The values of the adjustable parameters to be specified [value1, value2, ...]
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    fitExperiments: dict
+        The fit experiments to be specified, see objective_function.
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    ss_time: dict
+        The time point for steady state simulation, in the format of {fitid:time}
+    cost_type: str, optional
+        The cost function to be used for the optimisation. Default: None
+    experiment_costs: list, optional
+        If given, the costs of the fit experiments are appended to it, see objective_function.
+
+    Raises
+    ------
+    RuntimeError
+        If any operation failed.
+
+    Returns
+    -------
+    tuple
+        (numpy.ndarray, numpy.ndarray)
+        The residuals of all fit experiments and their Jacobian with respect to the adjustable parameters,
+        with the shape (number of residuals, number of adjustable parameters).
+    """
+    results=[_evaluate_fit_experiment('sensitivity', param_vals, external_variables_values, fitid, fitExperiment, doc, ss_time, cost_type)
+             for fitid,fitExperiment in fitExperiments.items()]
+    return _combine_fit_experiment_results('sensitivity', results, fitExperiments, len(param_vals), experiment_costs)
+
+def _simulate_fit_experiment_sensitivity(param_vals, external_variables_values, fitExperiment):
+    """ Simulate a time course fit experiment together with the sensitivities of the observables
+    to the adjustable parameters of the fit experiment.
+
+    Parameters
+    ----------
+    param_vals: list
+        The values of the adjustable parameters to be specified [value1, value2, ...]
+    external_variables_values: list
+        The values of the external variables to be specified [value1, value2, ...]
+    fitExperiment: dict
+        The fit experiment, see objective_function.
+
+    Raises
+    ------
+    RuntimeError
+        If the external variables cannot be specified.
+
+    Returns
+    -------
+    tuple or None
+        (sed_results, sensitivities), see sim_TimeCourse_sensitivity. None if the simulation failed.
+    """
+    external_variables_info=fitExperiment['external_variables_info']
+    cellml_model=fitExperiment['cellml_model']
+    analyser=fitExperiment['analyser']
+    module=fitExperiment['module']
+    fitness_info=fitExperiment['fitness_info']
+    adj_param_indices=fitExperiment['adj_param_indices']
+    sub_param_vals=[param_vals[param_index] for param_index in adj_param_indices]
+    sim_setting=fitExperiment['sim_setting']
+    observables=get_observables(analyser,cellml_model,fitness_info[0])
+    parameters=get_observables(analyser,cellml_model,fitExperiment['parameters'])
+    external_variables_values_extends=external_variables_values+sub_param_vals+fitExperiment['parameters_values']
+    # the positions of the adjustable parameters in the values of the external variables
+    sens_param_positions=[len(external_variables_values)+i for i in range(len(sub_param_vals))]
+    try:
+        external_module=get_externals_varies(analyser, cellml_model, external_variables_info, external_variables_values_extends)
+    except ValueError as exception:
+        print(exception)
+        raise RuntimeError(exception)
+    try:
+        current_state, sensitivities=sim_TimeCourse_sensitivity(fitExperiment['mtype'], module, sim_setting, observables, 
+                                                                external_module, sens_param_positions, parameters=parameters)
+    except RuntimeError as exception:
+        print(exception)
+        return None
+    return copy.deepcopy(current_state[-1]), sensitivities
+
+class _SensitivityObjective:
+    """ The residuals and their Jacobian for least_squares, 
+    calculated by the same simulation (objective_function_sensitivity).
+    The result of the last evaluation is kept, 
+    since least_squares evaluates the Jacobian at the point where the objective function was evaluated.
+    A failed simulation only rejects a trial point, least_squares requires the Jacobian 
+    at the starting point and the accepted points only, so jac raises a RuntimeError if the simulation failed there.
+    """
+
+    def __init__(self, function=objective_function_sensitivity):
+        self.function=function
+        self._x=None
+        self._residuals=None
+        self._jacobian=None
+
+    def _evaluate(self, param_vals, *args):
+        x=numpy.array(param_vals, dtype=float)
+        if self._x is None or not numpy.array_equal(x, self._x):
+            self._residuals, self._jacobian=self.function(list(x), *args)
+            self._x=x
+
+    def fun(self, param_vals, *args):
+        self._evaluate(param_vals, *args)
+        return self._residuals
+
+    def jac(self, param_vals, *args):
+        self._evaluate(param_vals, *args)
+        if numpy.any(numpy.isnan(self._jacobian)):
+            raise RuntimeError('The simulation failed at {}, the Jacobian is not available!'.format(list(self._x)))
+        return self._jacobian
+
+def _get_objective(kind, executor=None, bound_slack=None, trace=None, checkpoint=None, objective_cache_size=None):
+    """ Get the objective function of a parameter estimation task, 
+    i.e., the evaluation of the fit experiments wrapped, from the inside out, 
+    by the trace, the bound, the checkpoint and the cache.
+
+    Parameters
+    ----------
+    kind: str
+        'cost', 'residuals' or 'sensitivity', see _evaluate_fit_experiment.
+    executor: :obj:`concurrent.futures.Executor`, optional
+        The executor evaluating the fit experiments, see _get_parallel_objective. Default: None
+    bound_slack: float, optional
+        See _get_bounded_objective. Only used for 'cost'. Default: None
+    trace: :obj:`_EvaluationTrace`, optional
+        See _get_traced_objective. Default: None
+    checkpoint: :obj:`_Checkpoint`, optional
+        See _get_checkpointed_objective. Default: None
+    objective_cache_size: int, optional
+        See _get_cached_objective. Default: None
+
+    Returns
+    -------
+    callable
+        The objective function.
+    """
+    objective=_get_traced_objective(_get_parallel_objective(kind,executor),trace)
+    if kind=='cost':
+        objective=_get_bounded_objective(objective,bound_slack)
+    return _get_cached_objective(_get_checkpointed_objective(objective,checkpoint),objective_cache_size)
+
+# the fit experiments collected by a worker process, see _init_fit_experiment_worker
+_WORKER_FIT_EXPERIMENTS = {}
+# the scipy integrators which cannot be used by several threads at the same time
+NON_REENTRANT_SOLVERS = ['VODE', 'LSODA']
+
+def _init_fit_experiment_worker(doc_string, task_id, working_dir, external_variables_info, csv_engine=None):
+    """ Collect the fit experiments of a parameter estimation task in a worker process,
+    so that each worker process has its own copies of the modules of the fit experiments.
+    The SED document is passed as a string, since libsedml objects cannot be pickled.
+
+    Parameters
+    ----------
+    doc_string: str
+        The SED document.
+    task_id: str
+        The id of the parameter estimation task.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+    external_variables_info: dict
+        The external variables to be specified, in the format of {id:{'component': , 'name': }}
+    csv_engine: str, optional
+        The parser engine of the data source files, see _get_dfDict. Default: None
+    """
+    doc = libsedml.readSedMLFromString(doc_string)
+    task = doc.getTask(task_id)
+    fitExperiments = get_fit_experiments_1(doc, task, working_dir, _get_dfDict(doc, working_dir, csv_engine), external_variables_info)[0]
+    _WORKER_FIT_EXPERIMENTS.update({'doc': doc, 'fitExperiments': fitExperiments})
+
+def _evaluate_fit_experiment_worker(args):
+    """ Evaluate one fit experiment in a worker process initialised by _init_fit_experiment_worker.
+
+    Parameters
+    ----------
+    args: tuple
+        (kind, param_vals, external_variables_values, fitid, ss_time, cost_type, integrator_parameters), 
+        see _evaluate_fit_experiment; integrator_parameters are the parameters of the integrator of the fit experiment.
+
+    Returns
+    -------
+    float, numpy.ndarray, tuple or None
+        See _evaluate_fit_experiment.
+    """
+    kind, param_vals, external_variables_values, fitid, ss_time, cost_type, integrator_parameters = args
+    fitExperiment = _WORKER_FIT_EXPERIMENTS['fitExperiments'][fitid]
+    fitExperiment['sim_setting'].integrator_parameters = integrator_parameters
+    return _evaluate_fit_experiment(kind, param_vals, external_variables_values, fitid, fitExperiment, 
+                                    _WORKER_FIT_EXPERIMENTS['doc'], ss_time, cost_type)
+
+def _get_fit_experiment_executor(doc, task, working_dir, external_variables_info, fitExperiments, workers=1, executor='process',
+                                 csv_engine=None):
+    """ Get an executor to evaluate the fit experiments of a parameter estimation task concurrently.
+
+    Parameters
+    ----------
+    doc: :obj:`SedDocument`
+        An instance of SedDocument
+    task: :obj:`SedParameterEstimationTask`
+        The parameter estimation task.
+    working_dir: str
+        working directory of the SED document (path relative to which models are located)
+    external_variables_info: dict
+        The external variables to be specified, in the format of {id:{'component': , 'name': }}
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+    workers: int, optional
+        The number of workers. Default: 1
+    executor: str, optional
+        'process' or 'thread'. Default: 'process'
+    csv_engine: str, optional
+        The parser engine of the data source files read by the worker processes, see _get_dfDict. Default: None
+
+    Raises
+    ------
+    RuntimeError
+        If the executor is not supported.
+
+    Returns
+    -------
+    :obj:`concurrent.futures.Executor` or None
+        None if workers is 1 or there is only one fit experiment.
+    """
+    if workers<=1 or len(fitExperiments)<=1:
+        return None
+    workers=min(workers, len(fitExperiments))
+    if executor=='thread' and any(fitExperiment['sim_setting'].method in NON_REENTRANT_SOLVERS for fitExperiment in fitExperiments.values()):
+        print('The solvers {} can solve only a single problem at a time, process workers are used instead of thread workers.'.format(NON_REENTRANT_SOLVERS))
+        executor='process'
+    elif executor=='thread' and _shares_module_with_ida(fitExperiments):
+        print('IDA modifies the module while solving and the fit experiments share a module, process workers are used instead of thread workers.')
+        executor='process'
+    if executor=='process':
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_fit_experiment_worker,
+                                   initargs=(libsedml.writeSedMLToString(doc), task.getId(), working_dir, external_variables_info, csv_engine))
+    elif executor=='thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise RuntimeError('The executor {} is not supported!'.format(executor))
+
+def _shares_module_with_ida(fitExperiments):
+    """ Whether a module solved by IDA is shared by several fit experiments, see get_fit_experiments_1. 
+    IDA replaces the functions find_root_N of the module while solving, 
+    so that such a module cannot be solved by several threads at the same time.
+
+    Parameters
+    ----------
+    fitExperiments: dict
+        The fit experiments, see objective_function.
+
+    Returns
+    -------
+    bool
+        True if a module solved by IDA is shared.
+    """
+    modules=[id(fitExperiment['module']) for fitExperiment in fitExperiments.values() if fitExperiment['sim_setting'].method=='IDA']
+    return any([id(fitExperiment['module']) for fitExperiment in fitExperiments.values()].count(module)>1 for module in modules)
+
+def _get_parallel_objective(kind, executor=None):
+    """ Get the objective function evaluating the fit experiments with an executor.
+
+    Parameters
+    ----------
+    kind: str
+        'cost', 'residuals' or 'sensitivity', see _evaluate_fit_experiment.
+    executor: :obj:`concurrent.futures.Executor`, optional
+        The executor returned by _get_fit_experiment_executor. Default: None
+
+    Returns
+    -------
+    callable
+        objective_function, objective_function_residuals or objective_function_sensitivity if executor is None,
+        otherwise an instance of _ParallelObjective.
+    """
+    if executor is None:
+        return {'cost':objective_function,'residuals':objective_function_residuals,'sensitivity':objective_function_sensitivity}[kind]
+    return _ParallelObjective(kind, executor, _evaluate_fit_experiment, _evaluate_fit_experiment_worker, _combine_fit_experiment_results)
@@ -1,4 +1,4 @@
-from .solver import solve_euler, solve_scipy, algebra_evaluation, initialize_module
+from .solver import solve_euler, solve_scipy, algebra_evaluation, initialize_module, solve_scipy_sensitivity
 from .sedEditor import get_dict_simulation
 from libcellml import AnalyserVariable
 from pathlib import PurePath
@@ -6,6 +6,14 @@ import importlib.util
 import os
 import types
 import numpy
+try:
+    from .cvodesolver import solve_cvode
+except ImportError: # the SUNDIALS Python bindings are not installed
+    solve_cvode = None
+try:
+    from .idasolver import solve_ida
+except ImportError:
+    solve_ida = None
 
 """
 ====================
@@ -21,6 +29,7 @@ The module defines the following functions:
     * load_module - load a module from a file.
     * sim_UniformTimeCourse - simulate the model with UniformTimeCourse setting
     * sim_TimeCourse - simulate the model with TimeCourse setting
+    * sim_TimeCourse_sensitivity - simulate the model with TimeCourse setting and forward sensitivity analysis
     * get_KISAO_parameters - get the parameters of the KISAO algorithm
     * get_externals - get the external variable function for the model.
     * get_observables - get the observables information for the simulation.
@@ -30,11 +39,15 @@ The module defines the following functions:
 
 # https://docs.scipy.org/doc/scipy/reference/generated/scipy.integrate.ode.html
 SCIPY_SOLVERS = ['dopri5', 'dop853', 'VODE', 'LSODA']
+# https://computing.llnl.gov/projects/sundials
+SUNDIALS_SOLVERS = ['CVODE', 'IDA']
 KISAO_ALGORITHMS = {'KISAO:0000030': 'Euler forward method',
                     'KISAO:0000535': 'VODE',
                     'KISAO:0000088': 'LSODA',
                     'KISAO:0000087': 'dopri5',
                     'KISAO:0000436': 'dop853',
+                    'KISAO:0000019': 'CVODE',
+                    'KISAO:0000283': 'IDA',
                     }
 class SimSettings():
 
@@ -61,6 +74,8 @@ class SimSettings():
         The method of the integration
     integrator_parameters : dict
         The parameters of the integrator
+    solver_stats : dict
+        The statistics of the integrator, accumulated over the simulations (CVODE and IDA only)
     """  
 
     def __init__(self):
@@ -72,7 +87,8 @@ class SimSettings():
         self.step=0.1
         self.tspan=[]
         self.method='Euler forward method' 
-        self.integrator_parameters={}       
+        self.integrator_parameters={}
+        self.solver_stats={}       
 
 def getSimSettingFromDict(dict_simulation):
     """Get the simulation settings from the dictionary of the simulation.
@@ -240,6 +256,9 @@ def sim_UniformTimeCourse(mtype, module, sim_setting, observables, external_modu
                                           sim_setting.method,sim_setting.integrator_parameters,external_module)
             except Exception as e:
                 raise RuntimeError(str(e)) from e 
+        elif sim_setting.method in SUNDIALS_SOLVERS:
+            output_times=numpy.linspace(sim_setting.output_start_time, sim_setting.output_end_time, sim_setting.number_of_steps+1)
+            current_state=_solve_sundials(module, current_state, observables, output_times, sim_setting, external_module)
         else:
             print('The method {} is not supported!'.format(sim_setting.method))
             raise RuntimeError('The method {} is not supported!'.format(sim_setting.method))
@@ -322,6 +341,8 @@ def sim_OneStep(mtype, module, sim_setting, observables, external_module, curren
                                           sim_setting.method,sim_setting.integrator_parameters,external_module)
             except Exception as e:
                 raise RuntimeError(str(e)) from e 
+        elif sim_setting.method in SUNDIALS_SOLVERS:
+            current_state=_solve_sundials(module, current_state, observables, [output_start_time], sim_setting, external_module)
         else:
             print('The method {} is not supported!'.format(sim_setting.method))
             raise RuntimeError('The method {} is not supported!'.format(sim_setting.method))
@@ -419,6 +440,9 @@ def sim_TimeCourse(mtype, module, sim_setting, observables, external_module,curr
                                               sim_setting.method,sim_setting.integrator_parameters,external_module)
                 except Exception as e:
                     raise e from e
+        elif sim_setting.method in SUNDIALS_SOLVERS:
+            # all the time points at once, so that the CVODE memory is kept alive
+            current_state=_solve_sundials(module, current_state, observables, sim_setting.tspan, sim_setting, external_module)
         else:
             print('The method {} is not supported!'.format(sim_setting.method))
             raise RuntimeError('The method {} is not supported!'.format(sim_setting.method))
@@ -431,6 +455,65 @@ def sim_TimeCourse(mtype, module, sim_setting, observables, external_module,curr
     
     return current_state
 
+def sim_TimeCourse_sensitivity(mtype, module, sim_setting, observables, external_module, sens_param_positions, parameters={}):
+    """Simulate the model with TimeCourse setting and forward sensitivity analysis.
+    The sensitivities of the observables are calculated with respect to 
+    external variables of the model, e.g., the adjustable parameters of a parameter estimation task.
+
+    Parameters
+    ----------
+    mtype : str
+        The type of the model, only 'ode' is supported
+    module : module
+        The module containing the Python code
+    sim_setting : SimSettings
+        The simulation settings, the method should be one of SCIPY_SOLVERS
+    observables : dict
+        The observables of the simulation, the format is {id:{'name': , 'component': , 'index': , 'type': }}
+    external_module : object
+        The External_module_varies object instance for the model
+    sens_param_positions : list
+        The positions of the parameters in external_module.param_vals
+    parameters : dict
+        The parameters of the model
+        The format is {id:{'name':'variable name','component':'component name',
+        'type':'state','value':value,'index':index}}
+
+    Raises
+    ------
+    RuntimeError
+        If the model type or the method is not supported
+        If initialize_module fails
+        If solve_scipy_sensitivity fails
+
+    Returns
+    -------
+    tuple
+        (tuple, dict)
+        The current state of the model and the sensitivities of the observables.
+        The format of the current state is (voi, states, rates, variables, current_index, sed_results)
+        The format of the sensitivities is {id: numpy.ndarray}, 
+        where numpy.ndarray has the shape (number of time points, number of parameters).
+    """
+    if mtype!='ode' or sim_setting.method not in SCIPY_SOLVERS:
+        raise RuntimeError('The sensitivity analysis is not supported for the model type {} and the method {}!'.format(mtype, sim_setting.method))
+
+    number_of_steps=len(sim_setting.tspan)-1
+    if number_of_steps<0:
+        raise RuntimeError('The time points should be greater than 0!')
+    try:
+        current_state=initialize_module(mtype,observables,number_of_steps,module,
+                                        0,external_module,parameters)
+    except ValueError as e:
+        raise RuntimeError(str(e)) from e
+    try:
+        current_state, sensitivities=solve_scipy_sensitivity(module,current_state,observables,sim_setting.tspan,
+                                                             sim_setting.method,sim_setting.integrator_parameters,
+                                                             external_module,sens_param_positions)
+    except Exception as e:
+        raise RuntimeError(str(e)) from e
+    return current_state, sensitivities
+
 def sim_SteadyState(mtype, module, sim_setting, observables, external_module, current_state=None,parameters={}):
     """Simulate the model with UniformTimeCourse setting.
     
@@ -499,6 +582,9 @@ def sim_SteadyState(mtype, module, sim_setting, observables, external_module, cu
                                               sim_setting.method,sim_setting.integrator_parameters,external_module)
                 except RuntimeError as e:
                     raise e from e
+            elif sim_setting.method in SUNDIALS_SOLVERS:
+                output_times=numpy.linspace(t0, tf, sim_setting.number_of_steps+1)
+                current_state=_solve_sundials(module, current_state, observables, output_times, sim_setting, external_module)
             else:
                 print('The method {} is not supported!'.format(sim_setting.method))
                 raise RuntimeError('The method {} is not supported!'.format(sim_setting.method))
@@ -516,6 +602,52 @@ def sim_SteadyState(mtype, module, sim_setting, observables, external_module, cu
     
     return current_state
 
+def _solve_sundials(module, current_state, observables, output_times, sim_setting, external_module):
+    """Integrate the model with CVODE or IDA and accumulate the solver statistics in the simulation settings.
+    IDA integrates the unknowns of the algebraic loops (mtype 'dae') together with the states,
+    instead of solving the non-linear systems at each evaluation of the rates.
+    
+    Parameters
+    ----------
+    module : module
+        The module containing the Python code
+    current_state : tuple
+        The current state of the model.
+        The format is (voi, states, rates, variables, current_index, sed_results)
+    observables : dict
+        The observables of the simulation, the format is 
+        {id:{'name': , 'component': , 'index': , 'type': }}
+    output_times : list
+        The output time points
+    sim_setting : SimSettings
+        The simulation settings
+    external_module : object
+        The External_module_varies object instance for the model
+
+    Raises
+    ------
+    RuntimeError
+        If the SUNDIALS Python bindings are not installed
+        If solve_cvode or solve_ida fails
+
+    Returns
+    -------
+    current_state : tuple
+        The current state of the model.
+        The format is (voi, states, rates, variables, current_index, sed_results)
+    """
+    if sim_setting.method=='CVODE':
+        solve=solve_cvode
+    else:
+        solve=solve_ida
+    if solve is None:
+        raise RuntimeError('The method {} requires the SUNDIALS Python bindings (sundials)!'.format(sim_setting.method))
+    try:
+        return solve(module, current_state, observables, output_times,
+                     sim_setting.integrator_parameters, external_module, sim_setting.solver_stats)
+    except Exception as e:
+        raise RuntimeError(str(e)) from e
+
 def get_KISAO_parameters(algorithm):
     """Get the parameters of the KISAO algorithm.
     
@@ -534,7 +666,7 @@ def get_KISAO_parameters(algorithm):
     -------
     method : str
         The method of the integration. 
-        Now the supported methods are 'Euler forward method', 'VODE', 'LSODA', 'dopri5' and 'dop853'.
+        Now the supported methods are 'Euler forward method', 'VODE', 'LSODA', 'dopri5', 'dop853', 'CVODE' and 'IDA'.
         None if the method is not supported.
     integrator_parameters : dict
         The parameters of the integrator
@@ -613,6 +745,48 @@ def get_KISAO_parameters(algorithm):
                     integrator_parameters['max_step'] = float(p['value'])
                 elif p['kisaoID'] == 'KISAO:0000541':
                     integrator_parameters['beta'] = float(p['value'])
+    elif algorithm['kisaoID'] == 'KISAO:0000019':
+        # CVODE
+        if 'listOfAlgorithmParameters' in algorithm:
+            for p in algorithm['listOfAlgorithmParameters']:
+                if p['kisaoID'] == 'KISAO:0000209':
+                    integrator_parameters['rtol'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000211':
+                    integrator_parameters['atol'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000475':
+                    integrator_parameters['method'] = p['value'] # 'BDF' or 'Adams'
+                elif p['kisaoID'] == 'KISAO:0000415':
+                    integrator_parameters['nsteps'] = int(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000467':
+                    integrator_parameters['max_step'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000485':
+                    integrator_parameters['min_step'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000484':
+                    integrator_parameters['order'] = int(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000477':
+                    # linear solver, 'dense' (KISAO:0000625) or 'band' (KISAO:0000626)
+                    if 'band' in p['value'].lower() or p['value'] == 'KISAO:0000626':
+                        integrator_parameters['linear_solver'] = 'band'
+                    else:
+                        integrator_parameters['linear_solver'] = 'dense'
+                elif p['kisaoID'] == 'KISAO:0000479':
+                    integrator_parameters['upper_bandwidth'] = int(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000480':
+                    integrator_parameters['lower_bandwidth'] = int(p['value'])
+    elif algorithm['kisaoID'] == 'KISAO:0000283':
+        # IDA
+        if 'listOfAlgorithmParameters' in algorithm:
+            for p in algorithm['listOfAlgorithmParameters']:
+                if p['kisaoID'] == 'KISAO:0000209':
+                    integrator_parameters['rtol'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000211':
+                    integrator_parameters['atol'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000415':
+                    integrator_parameters['nsteps'] = int(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000467':
+                    integrator_parameters['max_step'] = float(p['value'])
+                elif p['kisaoID'] == 'KISAO:0000484':
+                    integrator_parameters['order'] = int(p['value'])
     else:
         print("The algorithm {} is not supported!".format(algorithm['kisaoID']))
         raise ValueError("The algorithm {} is not supported!".format(algorithm['kisaoID']))
@@ -19,6 +19,7 @@ The solver module provides the following functions:
     * initialize_module - initialize a module based on the given model type and parameters.
     * solve_euler - Euler method solver.
     * solve_scipy - scipy supported solvers.
+    * solve_scipy_sensitivity - scipy supported solvers with forward sensitivity analysis.
     * algebra_evaluation - algebraic evaluation.
 """
 
@@ -98,8 +99,12 @@ def _initialize_module_ode(module, voi, external_variable=None, parameters={}):
     
     module.compute_computed_constants(variables)
     module.compute_computed_constants(variables) # Need to call it twice to update the computed constants;TODO: need to discuss with the libCellML team
-    module.compute_rates(voi, states, rates, variables)
-    module.compute_variables(voi, states, rates, variables)
+    if external_variable:
+        module.compute_rates(voi, states, rates, variables,external_variable)
+        module.compute_variables(voi, states, rates, variables,external_variable)
+    else:
+        module.compute_rates(voi, states, rates, variables)
+        module.compute_variables(voi, states, rates, variables)
 
     return states, rates, variables
 
@@ -238,6 +243,28 @@ def _update_rates(voi, states, rates, variables, module, external_variable=None)
         _update_variables(voi, states, rates, variables, module)
     return rates    
 
+def _update_jacobian(voi, states, variables, module):
+    """ Evaluate the Jacobian of the rates of a module that provides compute_jacobian,
+    e.g., a BGModule object.
+
+    Parameters
+    ----------
+    voi : float
+        The current value of the independent variable.
+    states : list
+        The current state of the system.
+    variables : list
+        The current variables of the system.
+    module : object
+        The module providing compute_jacobian(voi, states, variables).
+
+    Returns
+    -------
+    numpy.ndarray
+        The Jacobian of the rates with respect to the states.
+    """
+    return module.compute_jacobian(voi, states, variables)
+
 def _update_variables(voi, states, rates, variables, module, external_variable=None):
     """ Update the variables of the module.
     
@@ -469,7 +496,11 @@ def solve_scipy(module, current_state, observables, output_start_time, output_en
             external_variable=functools.partial(external_module.external_variable_ode,result_index=current_index) 
     
     # Set the initial conditions and parameters
-    solver = ode(_update_rates)
+    if hasattr(module, 'compute_jacobian'):
+        solver = ode(_update_rates, _update_jacobian)
+        solver.set_jac_params(variables, module)
+    else:
+        solver = ode(_update_rates)
     solver.set_initial_value(states, voi)
     solver.set_f_params(rates, variables, module, external_variable)
     solver.set_integrator(method, **integrator_parameters)
@@ -523,6 +554,182 @@ def solve_scipy(module, current_state, observables, output_start_time, output_en
         current_state = (solver.t, solver.y, rates, variables, current_index, sed_results)
     return current_state
 
+def _get_observable_values(observables, voi, states, variables):
+    """ Get the current values of the observables.
+
+    Parameters
+    ----------
+    observables : dict
+        The dictionary of the observables.
+    voi : float
+        The current value of the independent variable.
+    states : list
+        The current state of the system.
+    variables : list
+        The current variables of the system.
+
+    Returns
+    -------
+    numpy.ndarray
+        The values of the observables, in the order of the observables.
+    """
+    values = np.empty(len(observables))
+    for i, v in enumerate(observables.values()):
+        if v['type'] == 'variable_of_integration':
+            values[i] = voi
+        elif v['type'] == 'state':
+            values[i] = states[v['index']]
+        else:
+            values[i] = variables[v['index']]
+    return values
+
+def solve_scipy_sensitivity(module, current_state, observables, output_times, method, integrator_parameters,
+                            external_module, sens_param_positions, step=1e-7):
+    """ Scipy supported solvers with forward sensitivity analysis.
+    The sensitivities S = dx/dp of the states x with respect to the parameters p 
+    are integrated together with the states, using the augmented system
+    dS/dt = df/dx S + df/dp.
+    Each column of df/dx S + df/dp is evaluated as one directional finite difference of the rates,
+    so that the cost of the right-hand side is (number of parameters + 1) evaluations of compute_rates.
+    The stiff integrators are given the block diagonal Jacobian diag(df/dx, df/dx, ..., df/dx)
+    of the augmented system, as in the simultaneous corrector method of CVODES,
+    so that the cost of a Jacobian is (number of states + 1) evaluations of compute_rates
+    instead of a finite difference of the whole augmented system.
+    The parameters are the external variables of the module given as scalars,
+    the initial states are assumed to be independent of the parameters.
+
+    Parameters
+    ----------
+    module : object
+        The module to solve.
+    current_state : tuple
+        The current state of the module.
+        The format is (voi, states, rates, variables, current_index, sed_results).
+    observables : dict
+        The dictionary of the observables.
+    output_times : list
+        The output time points, in increasing order.
+        The results at output_times[0] are saved at current_index,
+        the results at the following time points are saved at the following indices.
+    method : str
+        The name of the integrator.
+    integrator_parameters : dict
+        The parameters of the integrator.
+    external_module : object
+        The External_module_varies object instance for the model.
+    sens_param_positions : list
+        The positions of the parameters in external_module.param_vals.
+    step : float, optional
+        The relative step of the finite differences. Default is 1e-7.
+
+    Raises
+    ------
+    RuntimeError
+        If the scipy.integrate.ode failed, a RuntimeError will be raised.
+    ValueError
+        If output_times is not valid or a parameter is not a scalar.
+
+    Returns
+    -------
+    tuple
+        (tuple, dict)
+        The current state of the module and the sensitivities of the observables.
+        The format of the current state is (voi, states, rates, variables, current_index, sed_results).
+        The format of the sensitivities is {id: numpy.ndarray}, 
+        where numpy.ndarray has the shape (number of output times, number of parameters).
+    """
+    voi, states, rates, variables, current_index, sed_results = current_state
+    output_times = np.asarray(output_times, dtype=float)
+    if output_times.ndim != 1 or len(output_times) == 0:
+        raise ValueError('output_times must be a non-empty 1D array.')
+    if voi > output_times[0]:
+        raise ValueError('The current value of the independent variable is greater than output_start_time.')
+
+    param_vals = external_module.param_vals
+    p0 = []
+    for pos in sens_param_positions:
+        if not isinstance(param_vals[pos], (int, float, np.integer, np.floating)):
+            raise ValueError('The sensitivity parameters must be scalars.')
+        p0.append(float(param_vals[pos]))
+    p0 = np.array(p0)
+    h = step*np.maximum(1.0, np.abs(p0))
+    n_states = len(states)
+    n_params = len(sens_param_positions)
+    first_index = current_index
+    result_index = [current_index]
+
+    def evaluate(t, x, j=None, observe=False):
+        # evaluate the rates (or the observables) with the parameter j perturbed (None: unperturbed)
+        if j is not None:
+            param_vals[sens_param_positions[j]] = p0[j] + h[j]
+        try:
+            external_variable = functools.partial(external_module.external_variable_ode, result_index=result_index[0])
+            _update_rates(t, x, rates, variables, module, external_variable)
+            if observe:
+                return _get_observable_values(observables, t, x, variables)
+            return np.array(rates, dtype=float)
+        finally:
+            if j is not None:
+                param_vals[sens_param_positions[j]] = p0[j]
+
+    def augmented_rates(t, z):
+        x = z[:n_states]
+        S = z[n_states:].reshape(n_states, n_params)
+        f0 = evaluate(t, list(x))
+        dz = np.empty_like(z)
+        dz[:n_states] = f0
+        dS = dz[n_states:].reshape(n_states, n_params)
+        for j in range(n_params):
+            dS[:, j] = (evaluate(t, list(x + h[j]*S[:, j]), j) - f0)/h[j]
+        return dz
+
+    def augmented_jacobian(t, z):
+        # df/dx by forward differences, the derivatives of df/dx S with respect to x are neglected
+        x = z[:n_states]
+        f0 = evaluate(t, list(x))
+        J = np.empty((n_states, n_states))
+        for i in range(n_states):
+            dx = step*max(1.0, abs(x[i]))
+            x_i = np.array(x)
+            x_i[i] = x_i[i] + dx
+            J[:, i] = (evaluate(t, list(x_i)) - f0)/dx
+        jacobian = np.zeros((len(z), len(z)))
+        jacobian[:n_states, :n_states] = J
+        # S is stored row by row, so the block of the sensitivities is kron(df/dx, I)
+        jacobian[n_states:, n_states:] = np.kron(J, np.identity(n_params))
+        return jacobian
+
+    def record(t, z, index):
+        x = z[:n_states]
+        S = z[n_states:].reshape(n_states, n_params)
+        y0 = evaluate(t, list(x), observe=True)
+        for j in range(n_params):
+            dy = (evaluate(t, list(x + h[j]*S[:, j]), j, observe=True) - y0)/h[j]
+            for i, id in enumerate(observables.keys()):
+                sensitivities[id][index - first_index, j] = dy[i]
+        evaluate(t, list(x)) # the variables at the unperturbed point
+        _append_current_results(sed_results, index, observables, t, list(x), variables)
+
+    sensitivities = {id: np.zeros((len(output_times), n_params)) for id in observables.keys()}
+    z0 = np.concatenate([np.array(states, dtype=float), np.zeros(n_states*n_params)])
+    solver = ode(augmented_rates, augmented_jacobian)
+    solver.set_initial_value(z0, voi)
+    solver.set_integrator(method, **integrator_parameters)
+
+    for i, output_time in enumerate(output_times):
+        if i > 0:
+            current_index = current_index + 1
+            result_index[0] = current_index
+        if output_time > solver.t:
+            solver.integrate(output_time)
+            if not solver.successful():
+                raise RuntimeError('scipy.integrate.ode failed.')
+        record(solver.t, solver.y, current_index)
+
+    states = list(solver.y[:n_states])
+    current_state = (solver.t, states, rates, variables, current_index, sed_results)
+    return current_state, sensitivities
+
 def algebra_evaluation(module, current_state, observables, number_of_steps, external_module=None):
     """ Algebraic evaluation.
     
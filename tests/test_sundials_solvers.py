@@ -0,0 +1,201 @@
+import importlib.util
+import os
+import sys
+import types
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'src')) # the generated code imports nla_solve from nlasolver
+
+from libcellml import Analyser, Parser
+from src.coder import writePythonCode
+from src.simulator import load_module, get_observables, get_KISAO_parameters, _solve_sundials, SimSettings
+from src.solver import initialize_module
+from src.daesystem import get_nla_systems, _DaeResiduals
+
+requires_sundials = pytest.mark.skipif(importlib.util.find_spec('sundials') is None,
+                                       reason='the SUNDIALS Python bindings (sundials) are not installed')
+
+# dx/dt = -k*x
+DECAY = """<?xml version="1.0" encoding="UTF-8"?>
+<model xmlns="http://www.cellml.org/cellml/2.0#" name="decay">
+  <component name="main">
+    <variable name="t" units="dimensionless"/>
+    <variable name="x" units="dimensionless" initial_value="1"/>
+    <variable name="k" units="dimensionless" initial_value="2"/>
+    <math xmlns="http://www.w3.org/1998/Math/MathML">
+      <apply><eq/><apply><diff/><bvar><ci>t</ci></bvar><ci>x</ci></apply>
+        <apply><times/><apply><minus/><ci>k</ci></apply><ci>x</ci></apply></apply>
+    </math>
+  </component>
+</model>
+"""
+
+# dx/dt = -k*y, y + y^3 = x
+DAE = """<?xml version="1.0" encoding="UTF-8"?>
+<model xmlns="http://www.cellml.org/cellml/2.0#" xmlns:cellml="http://www.cellml.org/cellml/2.0#" name="dae">
+  <component name="main">
+    <variable name="t" units="dimensionless"/>
+    <variable name="x" units="dimensionless" initial_value="1"/>
+    <variable name="y" units="dimensionless" initial_value="0.5"/>
+    <variable name="k" units="dimensionless" initial_value="1"/>
+    <math xmlns="http://www.w3.org/1998/Math/MathML">
+      <apply><eq/><apply><diff/><bvar><ci>t</ci></bvar><ci>x</ci></apply>
+        <apply><times/><apply><minus/><ci>k</ci></apply><ci>y</ci></apply></apply>
+      <apply><eq/><apply><plus/><ci>y</ci><apply><power/><ci>y</ci><cn cellml:units="dimensionless">3</cn></apply></apply><ci>x</ci></apply>
+    </math>
+  </component>
+</model>
+"""
+
+def _generate(cellml, tmp_path, name):
+    model = Parser(False).parseModel(cellml)
+    analyser = Analyser()
+    analyser.analyseModel(model)
+    assert analyser.issueCount() == 0
+    full_path = str(tmp_path / '{}.py'.format(name))
+    writePythonCode(analyser, full_path)
+    variables_info = {'x': {'component': 'main', 'name': 'x'}}
+    if name == 'dae':
+        variables_info['y'] = {'component': 'main', 'name': 'y'}
+    return full_path, get_observables(analyser, model, variables_info)
+
+def _load(cellml, tmp_path, name):
+    full_path, observables = _generate(cellml, tmp_path, name)
+    return load_module(full_path), observables
+
+def _source_module(full_path):
+    # get_nla_systems only reads the source, the generated code is not executed,
+    # since it imports nla_solve, which requires the SUNDIALS bindings
+    module = types.ModuleType(os.path.splitext(os.path.basename(full_path))[0])
+    module.__file__ = full_path
+    return module
+
+def _dae_module():
+    # the functions of the generated code of DAE, with x as the state and k, y as the variables
+    module = types.ModuleType('dae')
+    def objective_function_0(u, f, data):
+        voi, states, rates, variables = data
+        variables[1] = u[0]
+        f[0] = variables[1]+pow(variables[1], 3.0)-states[0]
+    def find_root_0(voi, states, rates, variables):
+        raise AssertionError('the non-linear system is solved by the integrator')
+    def compute_rates(voi, states, rates, variables):
+        module.find_root_0(voi, states, rates, variables)
+        rates[0] = -variables[0]*variables[1]
+    def compute_variables(voi, states, rates, variables):
+        module.find_root_0(voi, states, rates, variables)
+    module.objective_function_0 = objective_function_0
+    module.find_root_0 = find_root_0
+    module.compute_rates = compute_rates
+    module.compute_variables = compute_variables
+    return module
+
+def test_get_nla_systems(tmp_path):
+    full_path, observables = _generate(DAE, tmp_path, 'dae')
+    assert get_nla_systems(_source_module(full_path)) == {0: [observables['y']['index']]}
+    full_path, observables = _generate(DECAY, tmp_path, 'decay')
+    assert get_nla_systems(_source_module(full_path)) == {}
+
+def test_get_nla_systems_skips_computed_constants(tmp_path):
+    full_path, observables = _generate(DAE, tmp_path, 'dae')
+    with open(full_path) as f:
+        source = f.read()
+    source = source.replace('def compute_computed_constants(variables):\n    pass',
+                            'def compute_computed_constants(variables):\n    find_root_0(0.0, None, None, variables)')
+    source = source.replace('    find_root_0(voi, states, rates, variables)\n', '    pass\n')
+    full_path = str(tmp_path / 'dae_constant_loop.py')
+    with open(full_path, 'w') as f:
+        f.write(source)
+    assert get_nla_systems(_source_module(full_path)) == {}
+
+def test_get_nla_systems_without_source():
+    with pytest.raises(ValueError):
+        get_nla_systems(types.ModuleType('dae'))
+
+def test_dae_residuals():
+    module = _dae_module()
+    find_root = module.find_root_0
+    rates = [0.0]
+    variables = [2.0, np.nan]
+    with _DaeResiduals(module, {0: [1]}, 1, rates, variables) as dae:
+        assert module.find_root_0 is not find_root
+        yy, yp, rr = [1.0, 0.5], [-0.9, 0.0], [np.nan, np.nan]
+        dae.compute(0.0, yy, yp, rr)
+        # the unknown is taken from yy, the residuals are [y'[states] - rates, y + y^3 - x]
+        assert dae.get_unknowns() == [0.5]
+        assert rates == [-1.0]
+        assert np.allclose(rr, [-0.9 + 1.0, 0.5 + 0.125 - 1.0])
+    assert module.find_root_0 is find_root
+
+def test_dae_residuals_restores_find_root_on_error():
+    module = _dae_module()
+    find_root = module.find_root_0
+    with pytest.raises(ZeroDivisionError):
+        with _DaeResiduals(module, {0: [1]}, 1, [0.0], [2.0, np.nan]):
+            raise ZeroDivisionError()
+    assert module.find_root_0 is find_root
+
+def test_get_KISAO_parameters_cvode_band():
+    algorithm = {'kisaoID': 'KISAO:0000019',
+                 'listOfAlgorithmParameters': [{'kisaoID': 'KISAO:0000477', 'value': 'KISAO:0000626'},
+                                               {'kisaoID': 'KISAO:0000479', 'value': '1'},
+                                               {'kisaoID': 'KISAO:0000480', 'value': '2'},
+                                               {'kisaoID': 'KISAO:0000475', 'value': 'Adams'}]}
+    method, integrator_parameters = get_KISAO_parameters(algorithm)
+    assert method == 'CVODE'
+    assert integrator_parameters == {'linear_solver': 'band', 'upper_bandwidth': 1, 'lower_bandwidth': 2, 'method': 'Adams'}
+
+@pytest.mark.skipif(importlib.util.find_spec('sundials') is not None, reason='the SUNDIALS Python bindings are installed')
+def test_solve_sundials_without_bindings():
+    sim_setting = SimSettings()
+    for method in ('CVODE', 'IDA'):
+        sim_setting.method = method
+        with pytest.raises(RuntimeError, match='SUNDIALS'):
+            _solve_sundials(None, None, {}, [0.0], sim_setting, None)
+
+@requires_sundials
+def test_solve_cvode(tmp_path):
+    from src.cvodesolver import solve_cvode
+    module, observables = _load(DECAY, tmp_path, 'decay')
+    output_times = np.linspace(0, 1, 11)
+    current_state = initialize_module('ode', observables, len(output_times) - 1, module)
+    stats = {}
+    current_state = solve_cvode(module, current_state, observables, output_times,
+                                {'rtol': 1e-8, 'atol': 1e-10}, stats=stats)
+    sed_results = current_state[-1]
+    assert np.allclose(sed_results['x'], np.exp(-2*output_times), rtol=1e-5)
+    assert stats['number_of_steps'] > 0
+
+@requires_sundials
+def test_solve_cvode_band(tmp_path):
+    from src.cvodesolver import solve_cvode
+    module, observables = _load(DECAY, tmp_path, 'decay')
+    output_times = np.linspace(0, 1, 11)
+    current_state = initialize_module('ode', observables, len(output_times) - 1, module)
+    current_state = solve_cvode(module, current_state, observables, output_times,
+                                {'rtol': 1e-8, 'atol': 1e-10, 'linear_solver': 'band',
+                                 'upper_bandwidth': 0, 'lower_bandwidth': 0})
+    assert np.allclose(current_state[-1]['x'], np.exp(-2*output_times), rtol=1e-5)
+
+@requires_sundials
+def test_solve_ida(tmp_path):
+    from src.idasolver import solve_ida
+    module, observables = _load(DAE, tmp_path, 'dae')
+    assert get_nla_systems(module) == {0: [observables['y']['index']]}
+    output_times = np.linspace(0, 1, 11)
+    current_state = initialize_module('dae', observables, len(output_times) - 1, module)
+    stats = {}
+    current_state = solve_ida(module, current_state, observables, output_times,
+                              {'rtol': 1e-8, 'atol': 1e-10}, stats=stats)
+    sed_results = current_state[-1]
+    x, y = sed_results['x'], sed_results['y']
+    assert np.allclose(y + y**3, x, atol=1e-6)
+    # x(t) is implicitly given by ln(y) + 3/2*y^2 = ln(y0) + 3/2*y0^2 - k*t
+    y0 = y[0]
+    assert np.allclose(np.log(y) + 1.5*y**2, np.log(y0) + 1.5*y0**2 - output_times, atol=1e-5)
+    assert stats['number_of_residual_evaluations'] > 0
+    # the find_root_N functions of the module are restored
+    assert module.find_root_0.__name__ == 'find_root_0'